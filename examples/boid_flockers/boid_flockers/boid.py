@@ -61,21 +61,20 @@ class Boid(mesa.Agent):
         """
         cohere = np.zeros(2)
         if neighbors:
-            for neighbor in neighbors:
-                cohere += self.model.space.get_heading(self.pos, neighbor.pos)
-            cohere /= len(neighbors)
+            them = np.array([n.pos for n in neighbors])
+            cohere = self.model.space.get_heading_batch(self.pos, them).mean(axis=0)
         return cohere
 
     def separate(self, neighbors):
         """
         Return a vector away from any neighbors closer than separation dist.
         """
-        me = self.pos
-        them = (n.pos for n in neighbors)
         separation_vector = np.zeros(2)
-        for other in them:
-            if self.model.space.get_distance(me, other) < self.separation:
-                separation_vector -= self.model.space.get_heading(me, other)
+        if neighbors:
+            them = np.array([n.pos for n in neighbors])
+            headings = self.model.space.get_heading_batch(self.pos, them)
+            distances = self.model.space.get_distance_batch(self.pos, them)
+            separation_vector -= headings[distances < self.separation].sum(axis=0)
         return separation_vector
 
     def match_heading(self, neighbors):
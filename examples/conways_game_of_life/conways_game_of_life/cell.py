@@ -1,53 +1,14 @@
-import mesa
-
-
-class Cell(mesa.Agent):
-    """Represents a single ALIVE or DEAD cell in the simulation."""
-
-    DEAD = 0
-    ALIVE = 1
-
-    def __init__(self, pos, model, init_state=DEAD):
-        """
-        Create a cell, in the given state, at the given x, y position.
-        """
-        super().__init__(pos, model)
-        self.x, self.y = pos
-        self.state = init_state
-        self._nextState = None
-
-    @property
-    def isAlive(self):
-        return self.state == self.ALIVE
-
-    @property
-    def neighbors(self):
-        return self.model.grid.iter_neighbors((self.x, self.y), True)
-
-    def step(self):
-        """
-        Compute if the cell will be dead or alive at the next tick.  This is
-        based on the number of alive or dead neighbors.  The state is not
-        changed here, but is just computed and stored in self._nextState,
-        because our current state may still be necessary for our neighbors
-        to calculate their next state.
-        """
-
-        # Get the neighbors and apply the rules on whether to be alive or dead
-        # at the next tick.
-        live_neighbors = sum(neighbor.isAlive for neighbor in self.neighbors)
-
-        # Assume nextState is unchanged, unless changed below.
-        self._nextState = self.state
-        if self.isAlive:
-            if live_neighbors < 2 or live_neighbors > 3:
-                self._nextState = self.DEAD
-        else:
-            if live_neighbors == 3:
-                self._nextState = self.ALIVE
-
-    def advance(self):
-        """
-        Set the state to the new computed state -- computed in step().
-        """
-        self.state = self._nextState
+"""
+The states of a cell, and the rule deciding each cell's next state.
+"""
+
+DEAD = 0
+ALIVE = 1
+
+# Next state of a cell, indexed by [state, number of alive neighbors]: an alive
+# cell stays alive with 2 or 3 alive neighbors, and a dead cell comes alive
+# with exactly 3.
+RULE = [
+    [DEAD, DEAD, DEAD, ALIVE, DEAD, DEAD, DEAD, DEAD, DEAD],
+    [DEAD, DEAD, ALIVE, ALIVE, DEAD, DEAD, DEAD, DEAD, DEAD],
+]
@@ -1,6 +1,6 @@
 import mesa
 
-from .cell import Cell
+from .cell import ALIVE, RULE
 
 
 class ConwaysGameOfLife(mesa.Model):
@@ -14,30 +14,23 @@ class ConwaysGameOfLife(mesa.Model):
         Create a new playing area of (width, height) cells.
         """
 
-        # Set up the grid and schedule.
+        # Set up the grid.
 
-        # Use SimultaneousActivation which simulates all the cells
-        # computing their next state simultaneously.  This needs to
-        # be done because each cell's next state depends on the current
-        # state of all its neighbors -- before they've changed.
-        self.schedule = mesa.time.SimultaneousActivation(self)
+        # Use a cellular automaton, which computes the next state of all the
+        # cells simultaneously.  This needs to be done because each cell's
+        # next state depends on the current state of all its neighbors --
+        # before they've changed.  Edges wrap around.
+        self.grid = mesa.space.CellularAutomaton(width, height, torus=True, rule=RULE)
 
-        # Use a simple grid, where edges wrap around.
-        self.grid = mesa.space.Grid(width, height, torus=True)
-
-        # Place a cell at each location, with some initialized to
-        # ALIVE and some to DEAD.
-        for (contents, x, y) in self.grid.coord_iter():
-            cell = Cell((x, y), self)
+        # Initialize some cells to ALIVE, the others stay DEAD.
+        for (cell, x, y) in self.grid.coord_iter():
             if self.random.random() < 0.1:
-                cell.state = cell.ALIVE
-            self.grid.place_agent(cell, (x, y))
-            self.schedule.add(cell)
+                cell.state = ALIVE
 
         self.running = True
 
     def step(self):
         """
-        Have the scheduler advance each cell by one step
+        Advance all the cells by one step
         """
-        self.schedule.step()
+        self.grid.step()
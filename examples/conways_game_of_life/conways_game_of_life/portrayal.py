@@ -1,3 +1,6 @@
+from .cell import ALIVE
+
+
 def portrayCell(cell):
     """
     This function is registered with the visualization server to be called
@@ -7,13 +10,14 @@ def portrayCell(cell):
     """
     if cell is None:
         raise AssertionError
+    x, y = cell.pos
     return {
         "Shape": "rect",
         "w": 1,
         "h": 1,
         "Filled": "true",
         "Layer": 0,
-        "x": cell.x,
-        "y": cell.y,
-        "Color": "black" if cell.isAlive else "white",
+        "x": x,
+        "y": y,
+        "Color": "black" if cell.state == ALIVE else "white",
     }
@@ -84,7 +84,7 @@ class EpsteinCivilViolence(mesa.Model):
             if self.random.random() < self.cop_density:
                 cop = Cop(unique_id, self, (x, y), vision=self.cop_vision)
                 unique_id += 1
-                self.grid[x][y] = cop
+                self.grid.place_agent(cop, (x, y))
                 self.schedule.add(cop)
             elif self.random.random() < (self.cop_density + self.citizen_density):
                 citizen = Citizen(
@@ -98,7 +98,7 @@ class EpsteinCivilViolence(mesa.Model):
                     vision=self.citizen_vision,
                 )
                 unique_id += 1
-                self.grid[x][y] = citizen
+                self.grid.place_agent(citizen, (x, y))
                 self.schedule.add(citizen)
 
         self.running = True
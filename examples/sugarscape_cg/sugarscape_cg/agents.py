@@ -29,14 +29,10 @@ class SsAgent(mesa.Agent):
         self.vision = vision
 
     def get_sugar(self, pos):
-        this_cell = self.model.grid.get_cell_list_contents([pos])
-        for agent in this_cell:
-            if type(agent) is Sugar:
-                return agent
+        return self.model.grid.layers[Sugar][pos]
 
     def is_occupied(self, pos):
-        this_cell = self.model.grid.get_cell_list_contents([pos])
-        return any(isinstance(agent, SsAgent) for agent in this_cell)
+        return not self.model.grid.is_cell_empty(pos, SsAgent)
 
     def move(self):
         # Get neighborhood within vision
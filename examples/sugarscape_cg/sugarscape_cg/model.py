@@ -35,7 +35,14 @@ class SugarscapeCg(mesa.Model):
         self.initial_population = initial_population
 
         self.schedule = mesa.time.RandomActivationByType(self)
-        self.grid = mesa.space.MultiGrid(self.width, self.height, torus=False)
+        # Sugar patches and ants live on separate layers, so that ants can
+        # check for other ants without looking at the sugar
+        self.grid = mesa.space.LayeredGrid(
+            self.width,
+            self.height,
+            torus=False,
+            layers={Sugar: mesa.space.SingleGrid, SsAgent: mesa.space.MultiGrid},
+        )
         self.datacollector = mesa.DataCollector(
             {"SsAgent": lambda m: m.schedule.get_type_count(SsAgent)}
         )
@@ -4,7 +4,7 @@ Mesa Space Module
 
 Objects used to add a spatial component to a model.
 
-Grid: base grid, a simple list-of-lists.
+Grid: base grid, with cells stored in one flat list.
 SingleGrid: grid which strictly enforces one object per cell.
 MultiGrid: extension to Grid where each cell is a set of objects.
 
@@ -17,8 +17,10 @@ MultiGrid: extension to Grid where each cell is a set of objects.
 # Remove this __future__ import once the oldest supported Python is 3.10
 from __future__ import annotations
 
+import functools
 import itertools
 import math
+from collections import OrderedDict
 from warnings import warn
 
 import numpy as np
@@ -26,6 +28,7 @@ import numpy as np
 from typing import (
     Any,
     Callable,
+    Dict,
     List,
     Iterable,
     Iterator,
@@ -65,11 +68,11 @@ def accept_tuple_argument(wrapped_function: F) -> F:
     to also handle a single position, by automatically wrapping tuple in
     single-item list rather than forcing user to do it."""
 
-    def wrapper(*args: Any) -> Any:
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
         if isinstance(args[1], tuple) and len(args[1]) == 2:
-            return wrapped_function(args[0], [args[1]])
+            return wrapped_function(args[0], [args[1]], *args[2:], **kwargs)
         else:
-            return wrapped_function(*args)
+            return wrapped_function(*args, **kwargs)
 
     return cast(F, wrapper)
 
@@ -79,6 +82,724 @@ def is_integer(x: Real) -> bool:
     return isinstance(x, (int, np.integer))
 
 
+class _GridColumn(Sequence):
+    """One column of a grid, as a view of the grid's flat list of cells.
+
+    Grid.grid holds one such column per x, so that grid.grid[x][y] reads and
+    writes the cell with id x * height + y. Writes go through the grid, to
+    keep its occupancy and empty cells in sync.
+    """
+
+    __slots__ = ("_grid", "_cells", "_start", "_height")
+
+    def __init__(self, grid: Grid, start: int, height: int) -> None:
+        self._grid = grid
+        self._cells = grid._cells
+        self._start = start
+        self._height = height
+
+    def __len__(self) -> int:
+        return self._height
+
+    def _cell(self, y: int) -> int:
+        if y < 0:
+            y += self._height
+        if not 0 <= y < self._height:
+            raise IndexError("Grid column index out of range")
+        return self._start + y
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return [self._cells[self._start + i] for i in range(*y.indices(len(self)))]
+        return self._cells[self._cell(y)]
+
+    def __setitem__(self, y: int, value: Any) -> None:
+        self._grid._set_cell(self._cell(y), value)
+
+    def __iter__(self) -> Iterator[Any]:
+        if isinstance(self._cells, list):
+            return iter(self._cells[self._start : self._start + self._height])
+        return (self._cells[self._start + y] for y in range(self._height))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, _GridColumn)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class _CellAgents(Sequence):
+    """The agents in one MultiGrid cell, in insertion order.
+
+    Backed by a dict, so that adding, removing and membership tests take
+    O(1) time however crowded the cell is, while iteration stays in
+    placement order. Otherwise it reads like a list.
+    """
+
+    __slots__ = ("_agents",)
+
+    def __init__(self, agents: Iterable[Agent] = ()) -> None:
+        self._agents: dict[Agent, None] = dict.fromkeys(agents)
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def __contains__(self, agent: object) -> bool:
+        return agent in self._agents
+
+    def __iter__(self) -> Iterator[Agent]:
+        return iter(self._agents)
+
+    def __reversed__(self) -> Iterator[Agent]:
+        return reversed(self._agents)
+
+    def __getitem__(self, index):
+        if index == 0 and self._agents:
+            return next(iter(self._agents))
+        return list(self._agents)[index]
+
+    def append(self, agent: Agent) -> None:
+        """Add an agent at the end of the cell."""
+        self._agents[agent] = None
+
+    def remove(self, agent: Agent) -> None:
+        """Remove an agent from the cell; raise ValueError if it is absent."""
+        try:
+            del self._agents[agent]
+        except KeyError:
+            raise ValueError(f"{agent!r} is not in the cell") from None
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, _CellAgents)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+# Number of distance maps a grid keeps cached
+_DISTANCE_MAP_CACHE_SIZE = 32
+
+# Default bound on the number of coordinates kept in a grid's neighborhood cache
+_NEIGHBORHOOD_CACHE_SIZE = 2**20
+
+
+@functools.lru_cache(maxsize=None)
+def _square_offsets(
+    moore: bool, include_center: bool, radius: int
+) -> tuple[Coordinate, ...]:
+    """Return the sorted (dx, dy) offsets of a Moore or Von Neumann
+    neighborhood, shared by all grids and cells."""
+    offsets = []
+    for dx in range(-radius, radius + 1):
+        for dy in range(-radius, radius + 1):
+            if dx == 0 and dy == 0 and not include_center:
+                continue
+            # Skip offsets that are outside manhattan distance
+            if not moore and abs(dx) + abs(dy) > radius:
+                continue
+            offsets.append((dx, dy))
+    return tuple(offsets)
+
+
+def _hex_adjacent(pos: Coordinate) -> list[Coordinate]:
+    """Return the six cells adjacent to pos, following odd-q rules."""
+    x, y = pos
+    # Both: (0,-), (0,+)
+    # Even: (-,+), (-,0), (+,+), (+,0)
+    # Odd:  (-,0), (-,-), (+,0), (+,-)
+    if x % 2 == 0:
+        return [
+            (x, y - 1),
+            (x, y + 1),
+            (x - 1, y + 1),
+            (x - 1, y),
+            (x + 1, y + 1),
+            (x + 1, y),
+        ]
+    return [
+        (x, y - 1),
+        (x, y + 1),
+        (x - 1, y),
+        (x - 1, y - 1),
+        (x + 1, y),
+        (x + 1, y - 1),
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _hex_offsets(
+    odd_column: bool, include_center: bool, radius: int
+) -> tuple[Coordinate, ...]:
+    """Return the sorted (dx, dy) offsets of a hexagonal neighborhood around a
+    cell in an even or odd column, found by expanding one ring at a time."""
+    center = (int(odd_column), 0)
+    reached = {center}
+    ring = [center]
+    for _ in range(radius):
+        ring = list({cell for pos in ring for cell in _hex_adjacent(pos)} - reached)
+        reached.update(ring)
+    if not include_center:
+        reached.remove(center)
+    return tuple(sorted((x - center[0], y) for x, y in reached))
+
+
+@functools.lru_cache(maxsize=None)
+def _flat_square_offsets(
+    moore: bool, include_center: bool, radius: int, height: int
+) -> np.ndarray:
+    """Return the sorted cell id offsets of a Moore or Von Neumann
+    neighborhood, on a grid of the given height."""
+    offsets = np.array(
+        [dx * height + dy for dx, dy in _square_offsets(moore, include_center, radius)],
+        dtype=np.int64,
+    )
+    offsets.setflags(write=False)
+    return offsets
+
+
+class _NeighborhoodCache:
+    """LRU cache of neighborhoods.
+
+    The cache is bounded by the total number of coordinates it holds, rather
+    than by its number of entries, so that large radii cannot blow up memory.
+    The least recently used neighborhoods are evicted first.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self._neighborhoods: OrderedDict[Any, list[Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._neighborhoods)
+
+    def get(self, key: Any) -> list[Any] | None:
+        neighborhood = self._neighborhoods.get(key)
+        if neighborhood is not None:
+            self._neighborhoods.move_to_end(key)
+        return neighborhood
+
+    def put(self, key: Any, neighborhood: list[Any]) -> None:
+        if len(neighborhood) > self.max_size:
+            return
+        self._neighborhoods[key] = neighborhood
+        self.size += len(neighborhood)
+        while self.size > self.max_size:
+            _, evicted = self._neighborhoods.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self) -> None:
+        self._neighborhoods.clear()
+        self.size = 0
+
+
+class _EmptyCells:
+    """Set-like, read-only view of the empty cells of a grid.
+
+    All flat cell ids (x * height + y) are kept in a dense array, the empty
+    cells first and the occupied ones after them, together with the position
+    of each cell in that array. A cell changes side by swapping it with the
+    cell at the boundary, so updates and uniform random sampling are O(1),
+    and the occupied cells can be listed in time proportional to their
+    number. Iteration yields the empty cells in sorted order.
+    """
+
+    def __init__(self, grid: Grid) -> None:
+        self._grid = grid
+        num_cells = grid.width * grid.height
+        # Both arrays hold one entry per cell, so use 32 bits when ids fit
+        dtype = np.int32 if num_cells < 2**31 else np.int64
+        self._cells = np.arange(num_cells, dtype=dtype)
+        self._slots = np.arange(num_cells, dtype=dtype)
+        self._size = num_cells
+
+    def _swap(self, cell: int, slot: int) -> None:
+        """Move cell to slot, and the cell there to the old slot of cell."""
+        other = self._cells[slot]
+        old_slot = self._slots[cell]
+        self._cells[old_slot] = other
+        self._slots[other] = old_slot
+        self._cells[slot] = cell
+        self._slots[cell] = slot
+
+    def _add(self, cell: int) -> None:
+        self._swap(cell, self._size)
+        self._size += 1
+
+    def _remove(self, cell: int) -> None:
+        self._size -= 1
+        self._swap(cell, self._size)
+
+    def _add_batch(self, cells: np.ndarray) -> None:
+        """Add many distinct flat cell ids, none of which may be empty already."""
+        self._move_batch(cells, self._size, self._size + len(cells))
+        self._size += len(cells)
+
+    def _remove_batch(self, cells: np.ndarray) -> None:
+        """Remove many distinct flat cell ids, all of which must be empty."""
+        self._move_batch(cells, self._size - len(cells), self._size)
+        self._size -= len(cells)
+
+    def _move_batch(self, cells: np.ndarray, start: int, stop: int) -> None:
+        """Move cells to the slots start:stop, next to the boundary, moving
+        the other cells there to the slots the batch leaves."""
+        slots = self._slots[cells]
+        inside = (slots >= start) & (slots < stop)
+        holes = np.sort(slots[~inside])
+        kept = np.ones(stop - start, dtype=bool)
+        kept[slots[inside] - start] = False
+        moved = self._cells[start:stop][kept]
+        self._cells[holes] = moved
+        self._slots[moved] = holes
+        self._cells[start:stop] = cells
+        self._slots[cells] = np.arange(start, stop)
+
+    def sample(self, rng: Any) -> Coordinate:
+        """Pick an empty cell uniformly at random.
+
+        Args:
+            rng: A random.Random instance (or the random module) used to draw
+                 the cell, e.g. agent.random, so runs stay reproducible.
+        """
+        if self._size == 0:
+            raise Exception("ERROR: No empty cells")
+        cell = int(self._cells[rng.randrange(self._size)])
+        return divmod(cell, self._grid.height)
+
+    def choice(self, rng: Any) -> Coordinate:
+        """Pick the empty cell that rng.choice(sorted(empties)) would pick,
+        drawing the same random numbers, in time linear in the number of
+        empty cells. Unlike sample, this keeps seeded runs identical to
+        those of earlier versions.
+        """
+        if self._size == 0:
+            raise Exception("ERROR: No empty cells")
+        k = rng.choice(range(self._size))
+        cell = int(np.partition(self._cells[: self._size], k)[k])
+        return divmod(cell, self._grid.height)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, pos: object) -> bool:
+        grid = self._grid
+        try:
+            x, y = pos
+        except (TypeError, ValueError):
+            return False
+        if not (is_integer(x) and is_integer(y)) or grid.out_of_bounds((x, y)):
+            return False
+        return not grid._flat_occupancy[x * grid.height + y]
+
+    def __iter__(self) -> Iterator[Coordinate]:
+        xs, ys = np.divmod(self.ids(), self._grid.height)
+        return zip(xs.tolist(), ys.tolist())
+
+    def ids(self) -> np.ndarray:
+        """Return the sorted array of the flat ids of the empty cells."""
+        return np.sort(self._cells[: self._size]).astype(np.int64, copy=False)
+
+    def _occupied_ids(self) -> np.ndarray:
+        """Return the sorted array of the flat ids of the occupied cells."""
+        return np.sort(self._cells[self._size :]).astype(np.int64, copy=False)
+
+    def __repr__(self) -> str:
+        return f"<{len(self)} empty cells>"
+
+
+class _SparseCells(dict):
+    """Cell contents of a sparse grid, by cell id.
+
+    Only the non-empty cells are stored; the others read as the grid's
+    default value, and storing an empty value removes the cell.
+    """
+
+    def __init__(self, default_val: Callable[[], Any]) -> None:
+        super().__init__()
+        self._default_val = default_val
+
+    def __missing__(self, cell: int) -> Any:
+        return self._default_val()
+
+    def __setitem__(self, cell: int, value: Any) -> None:
+        if value:
+            super().__setitem__(cell, value)
+        else:
+            self.pop(cell, None)
+
+
+class _SparseOccupancy:
+    """Number of agents in each cell of a sparse grid, by cell id.
+
+    Only the occupied cells are stored. Like the flat occupancy array of a
+    dense grid, it can be indexed by a single cell id or an array of them.
+    """
+
+    def __init__(self) -> None:
+        self._counts: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __getitem__(self, cells: Any) -> Any:
+        counts = self._counts
+        if np.ndim(cells) == 0:
+            return counts.get(int(cells), 0)
+        cells = np.asarray(cells, dtype=np.int64)
+        values = [counts.get(cell, 0) for cell in cells.reshape(-1).tolist()]
+        return np.array(values, dtype=np.int64).reshape(cells.shape)
+
+    def __setitem__(self, cells: Any, value: int) -> None:
+        for cell in np.asarray(cells, dtype=np.int64).reshape(-1).tolist():
+            if value:
+                self._counts[cell] = int(value)
+            else:
+                self._counts.pop(cell, None)
+
+    def add(self, cells: np.ndarray, delta: int) -> None:
+        """Add delta to the count of each cell, once per occurrence."""
+        counts = self._counts
+        for cell in cells.tolist():
+            count = counts.get(cell, 0) + delta
+            if count:
+                counts[cell] = count
+            else:
+                del counts[cell]
+
+    def ids(self) -> np.ndarray:
+        """Return the sorted array of the ids of the occupied cells."""
+        return np.array(sorted(self._counts), dtype=np.int64)
+
+
+class _SparseEmptyCells(_EmptyCells):
+    """Set-like, read-only view of the empty cells of a sparse grid.
+
+    Emptiness is implicit: a cell is empty unless the grid's occupancy holds
+    it. Random empty cells are drawn by rejection sampling, which takes O(1)
+    expected time while most of the grid is empty.
+    """
+
+    def __init__(self, grid: Grid) -> None:
+        self._grid = grid
+
+    def _add(self, cell: int) -> None:
+        pass
+
+    def _remove(self, cell: int) -> None:
+        pass
+
+    def _add_batch(self, cells: np.ndarray) -> None:
+        pass
+
+    def _remove_batch(self, cells: np.ndarray) -> None:
+        pass
+
+    def __len__(self) -> int:
+        grid = self._grid
+        return grid.width * grid.height - len(grid._flat_occupancy)
+
+    def sample(self, rng: Any) -> Coordinate:
+        grid = self._grid
+        num_cells = grid.width * grid.height
+        num_empty = len(self)
+        if num_empty == 0:
+            raise Exception("ERROR: No empty cells")
+        if 2 * num_empty >= num_cells:
+            while True:
+                cell = rng.randrange(num_cells)
+                if not grid._flat_occupancy[cell]:
+                    return divmod(cell, grid.height)
+        cell = int(self.ids()[rng.randrange(num_empty)])
+        return divmod(cell, grid.height)
+
+    def choice(self, rng: Any) -> Coordinate:
+        if len(self) == 0:
+            raise Exception("ERROR: No empty cells")
+        cell = int(self.ids()[rng.choice(range(len(self)))])
+        return divmod(cell, self._grid.height)
+
+    def _occupied_ids(self) -> np.ndarray:
+        return self._grid._flat_occupancy.ids()
+
+    def ids(self) -> np.ndarray:
+        grid = self._grid
+        return np.setdiff1d(
+            np.arange(grid.width * grid.height),
+            grid._flat_occupancy.ids(),
+            assume_unique=True,
+        )
+
+
+def _neighborhood_sum(
+    values: np.ndarray,
+    moore: bool,
+    include_center: bool = False,
+    radius: int = 1,
+    torus: bool = False,
+) -> np.ndarray:
+    """Sum a (width, height) array over the neighborhood of every cell.
+
+    This is a convolution with the neighborhood stencil, done as one shifted
+    array addition per offset. On a torus, offsets that wrap onto the same
+    cell are counted once, like in Grid.get_neighborhood; otherwise cells
+    beyond the edges count as zero.
+    """
+    offsets = _square_offsets(moore, include_center, radius)
+    return _offsets_sum(values, offsets, radius, torus)
+
+
+def _offsets_sum(
+    values: np.ndarray, offsets: Iterable[Coordinate], radius: int, torus: bool
+) -> np.ndarray:
+    """Sum a (width, height) array over the given (dx, dy) offsets, of at
+    most radius, around every cell."""
+    width, height = values.shape
+    total = np.zeros(values.shape, dtype=np.result_type(values.dtype, np.int64))
+    if torus:
+        for dx, dy in {(dx % width, dy % height) for dx, dy in offsets}:
+            # The value of cell (x + dx, y + dy) lands on cell (x, y)
+            total += np.roll(values, (-dx, -dy), axis=(0, 1))
+    else:
+        padded = np.pad(values, radius)
+        for dx, dy in offsets:
+            total += padded[
+                radius + dx : radius + dx + width, radius + dy : radius + dy + height
+            ]
+    return total
+
+
+class PropertyLayer:
+    """A named numpy array holding one value per cell of a grid.
+
+    Property layers store environmental state, such as the sugar of each
+    cell, without creating an agent per cell. The values live in the `data`
+    array, indexed by [x, y], and can be updated for all cells at once.
+
+    Properties:
+        name: The layer's name, used to look it up on a grid.
+        width, height: The shape of the layer, matching its grid.
+        data: The (width, height) array of values.
+        torus: Whether the grid the layer is attached to wraps around its
+               edges; False while the layer is not attached.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        width: int,
+        height: int,
+        default_value: Any = 0,
+        dtype: npt.DTypeLike = np.float64,
+    ) -> None:
+        """Create a new property layer.
+
+        Args:
+            name: The name of the layer.
+            width, height: The width and height of the grid.
+            default_value: The initial value of every cell.
+            dtype: The numpy dtype of the values.
+        """
+        self.name = name
+        self.width = width
+        self.height = height
+        self.data = np.full((width, height), default_value, dtype=dtype)
+        self.torus = False
+        # Counts changes through the methods below, to tell when results
+        # cached from the values are stale
+        self._version = 0
+
+    def mark_modified(self) -> None:
+        """Record a change made by writing to the data array directly, so
+        that cached results such as distance maps are recomputed."""
+        self._version += 1
+
+    def get_cell(self, pos: Coordinate) -> Any:
+        """Return the value of a single cell."""
+        return self.data[pos]
+
+    def set_cell(self, pos: Coordinate, value: Any) -> None:
+        """Set the value of a single cell."""
+        self.data[pos] = value
+        self._version += 1
+
+    def set_cells(
+        self, value: Any, condition: Callable[[np.ndarray], np.ndarray] | None = None
+    ) -> None:
+        """Set the value of all cells, or of the cells matching condition.
+
+        Args:
+            value: A scalar, or a (width, height) array of new values.
+            condition: Optional vectorized function taking the data array and
+                       returning a boolean mask of the cells to set.
+        """
+        if condition is None:
+            self.data[...] = value
+        else:
+            mask = condition(self.data)
+            self.data[mask] = np.broadcast_to(value, self.data.shape)[mask]
+        self._version += 1
+
+    def modify_cells(
+        self,
+        operation: Callable[..., np.ndarray],
+        value: Any = None,
+        condition: Callable[[np.ndarray], np.ndarray] | None = None,
+    ) -> None:
+        """Apply a vectorized operation to all cells, or to the cells matching
+        condition, e.g. layer.modify_cells(np.add, 1) for regrowth.
+
+        Args:
+            operation: A function taking the data array (and value, if given)
+                       and returning the new values, such as a numpy ufunc.
+            value: Optional second argument of operation.
+            condition: Optional vectorized function taking the data array and
+                       returning a boolean mask of the cells to modify.
+        """
+        if value is None:
+            result = operation(self.data)
+        else:
+            result = operation(self.data, value)
+        self.set_cells(result, condition)
+
+    def clamp(self, lower: Any = None, upper: Any = None) -> None:
+        """Clip the values in place to [lower, upper]; either bound may be a
+        scalar, a (width, height) array (e.g. per-cell maxima) or None."""
+        np.clip(self.data, lower, upper, out=self.data)
+        self._version += 1
+
+    def diffuse(
+        self, rate: float, moore: bool = True, torus: bool | None = None
+    ) -> None:
+        """Share a fraction of each cell's value equally among its neighbors.
+
+        This follows NetLogo's diffuse: every cell gives away `rate` of its
+        value, split into one equal share per neighbor (8 for Moore, 4 for
+        Von Neumann). Shares that would leave a non-toroidal grid stay in the
+        cell, so the total is conserved.
+
+        Args:
+            rate: The fraction of each value to diffuse, between 0 and 1.
+            moore: Whether to use the Moore or the Von Neumann neighborhood.
+            torus: Whether the grid wraps around its edges. Defaults to the
+                   topology of the grid the layer is attached to.
+        """
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1.")
+        if torus is None:
+            torus = self.torus
+        share = self.data * (rate / (8 if moore else 4))
+        received = _neighborhood_sum(share, moore, torus=torus)
+        num_neighbors = _neighborhood_sum(
+            np.ones(self.data.shape, dtype=np.int64), moore, torus=torus
+        )
+        self.data[...] = self.data - share * num_neighbors + received
+        self._version += 1
+
+    def select_cells(
+        self, condition: Callable[[np.ndarray], np.ndarray]
+    ) -> list[Coordinate]:
+        """Return the sorted list of cells whose value matches condition.
+
+        Args:
+            condition: Vectorized function taking the data array and returning
+                       a boolean mask.
+        """
+        xs, ys = np.nonzero(condition(self.data))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def aggregate(self, operation: Callable[[np.ndarray], Any] = np.sum) -> Any:
+        """Reduce all values with operation, e.g. np.sum or np.max."""
+        return operation(self.data)
+
+    def __repr__(self) -> str:
+        return f"PropertyLayer({self.name!r}, {self.width}, {self.height})"
+
+
+class SummedAreaTable:
+    """Summed-area table of a (width, height) array, for O(1) sums over
+    rectangular windows of cells.
+
+    Entry [i, j] of the table holds the sum of values[:i, :j]. On a torus the
+    table covers the values tiled twice along each axis, so that windows
+    wrapping around the edges are single rectangles too.
+
+    Properties:
+        width, height: The shape of the summed array.
+        torus: Whether windows wrap around the edges.
+    """
+
+    def __init__(self, values: npt.ArrayLike, torus: bool = False) -> None:
+        """Build the table.
+
+        Args:
+            values: The (width, height) array to sum.
+            torus: Whether windows wrap around the edges, as on a toroidal
+                   grid.
+        """
+        values = np.asarray(values)
+        self.width, self.height = values.shape
+        self.torus = torus
+        if torus:
+            values = np.tile(values, (2, 2))
+        dtype = np.int64 if values.dtype.kind in "biu" else np.float64
+        self._table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=dtype)
+        np.cumsum(values, axis=0, out=self._table[1:, 1:])
+        np.cumsum(self._table[1:, 1:], axis=1, out=self._table[1:, 1:])
+
+    def _bounds(
+        self, lo: np.ndarray, hi: np.ndarray, size: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Convert inclusive cell bounds along one axis to table indices."""
+        if self.torus:
+            # Windows covering the whole axis count each cell once
+            length = np.clip(hi - lo + 1, 0, size)
+            start = lo % size
+            return start, start + length
+        start = np.clip(lo, 0, size)
+        return start, np.maximum(np.clip(hi + 1, 0, size), start)
+
+    def window_sums(
+        self,
+        x_min: npt.ArrayLike,
+        y_min: npt.ArrayLike,
+        x_max: npt.ArrayLike,
+        y_max: npt.ArrayLike,
+    ) -> np.ndarray:
+        """Sum the values of many windows at once.
+
+        Args:
+            x_min, y_min, x_max, y_max: Arrays of the inclusive cell bounds
+                of the windows. Off a torus, windows are clipped to the
+                grid; on a torus they wrap around.
+
+        Returns:
+            The array of the sums of the windows.
+        """
+        x0, x1 = self._bounds(np.asarray(x_min), np.asarray(x_max), self.width)
+        y0, y1 = self._bounds(np.asarray(y_min), np.asarray(y_max), self.height)
+        table = self._table
+        return table[x1, y1] - table[x0, y1] - table[x1, y0] + table[x0, y0]
+
+    def window_sum(self, x_min: int, y_min: int, x_max: int, y_max: int) -> Any:
+        """Sum the values of the window of cells from (x_min, y_min) to
+        (x_max, y_max), inclusive."""
+        return self.window_sums(x_min, y_min, x_max, y_max).item()
+
+    def square_sums(self, positions: npt.ArrayLike, radius: int) -> np.ndarray:
+        """Sum the values of the square of the given radius around each of
+        the (N, 2) positions, including the center, as in a Moore
+        neighborhood."""
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        x, y = positions[:, 0], positions[:, 1]
+        return self.window_sums(x - radius, y - radius, x + radius, y + radius)
+
+
 class Grid:
     """Base class for a square grid.
 
@@ -89,39 +810,105 @@ class Grid:
     Properties:
         width, height: The grid's width and height.
         torus: Boolean which determines whether to treat the grid as a torus.
-        grid: Internal list-of-lists which holds the grid cells themselves.
+        grid: List of columns, so that grid[x][y] accesses a cell. The cells
+              themselves are stored in one flat list, indexed by cell id
+              x * height + y.
     """
 
-    def __init__(self, width: int, height: int, torus: bool) -> None:
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        neighborhood_cache_size: int = _NEIGHBORHOOD_CACHE_SIZE,
+        sparse: bool = False,
+    ) -> None:
         """Create a new grid.
 
         Args:
             width, height: The width and height of the grid
             torus: Boolean whether the grid wraps or not.
+            neighborhood_cache_size: Maximum total number of coordinates kept
+                in the neighborhood cache. The least recently used
+                neighborhoods are evicted first; 0 disables the cache.
+            sparse: If True, only store the occupied cells, so that memory
+                use depends on the number of agents rather than on the size
+                of the grid. Suits huge, mostly empty grids.
         """
         self.height = height
         self.width = width
         self.torus = torus
+        self.sparse = sparse
+
+        # Cells are stored in one flat list, indexed by cell id x * height + y,
+        # or in a dict of the occupied cells if the grid is sparse.
+        # grid[x][y] still works through column views of either.
+        self._cells: list[GridContent] | _SparseCells
+        if sparse:
+            self._cells = _SparseCells(self.default_val)
+        else:
+            self._cells = [self.default_val() for _ in range(width * height)]
+        self.grid: list[_GridColumn] = [
+            _GridColumn(self, x * self.height, self.height) for x in range(self.width)
+        ]
+
+        # Number of agents in each cell, for fast emptiness checks. The flat
+        # view is indexed by cell id. Sparse grids only store occupied cells,
+        # and emptiness is implicit.
+        self._occupancy: np.ndarray | None
+        self._flat_occupancy: np.ndarray | _SparseOccupancy
+        self.empties: _EmptyCells
+        if sparse:
+            self._occupancy = None
+            self._flat_occupancy = _SparseOccupancy()
+            self.empties = _SparseEmptyCells(self)
+        else:
+            self._occupancy = np.zeros(
+                (self.width, self.height), dtype=self._occupancy_dtype
+            )
+            self._flat_occupancy = self._occupancy.reshape(-1)
+            self.empties = _EmptyCells(self)
 
-        self.grid: list[list[GridContent]] = []
+        # Neighborhood Cache
+        self._neighborhood_cache = _NeighborhoodCache(neighborhood_cache_size)
 
-        for x in range(self.width):
-            col: list[GridContent] = []
-            for y in range(self.height):
-                col.append(self.default_val())
-            self.grid.append(col)
+        # Property layers, by name
+        self.properties: dict[str, PropertyLayer] = {}
 
-        # Add all cells to the empties list.
-        self.empties = set(itertools.product(*(range(self.width), range(self.height))))
+        # Counts placements and removals, to tell when cached tables of the
+        # agents are stale
+        self._version = 0
+        self._summed_area_tables: dict[Any, tuple[int, SummedAreaTable]] = {}
 
-        # Neighborhood Cache
-        self._neighborhood_cache: dict[Any, list[Coordinate]] = dict()
+        # Recently used distance maps
+        self._distance_maps: OrderedDict[Any, tuple[Any, np.ndarray]] = OrderedDict()
+
+    # Cells hold at most one agent, so a boolean is enough
+    _occupancy_dtype: type = bool
 
     @staticmethod
     def default_val() -> None:
         """Default value for new cell elements."""
         return None
 
+    @staticmethod
+    def _count_contents(contents: Any) -> int:
+        """Return the number of agents in the given cell contents."""
+        return int(contents is not None)
+
+    def _set_cell(self, cell: int, contents: Any) -> None:
+        """Overwrite the contents of a cell, as written by grid[x][y] = ...,
+        and update the occupancy and the empty cells to match. The pos of
+        the agents is left unchanged; prefer place_agent."""
+        self._cells[cell] = contents
+        self._version += 1
+        count = self._count_contents(contents)
+        if count and not self._flat_occupancy[cell]:
+            self.empties._remove(cell)
+        elif not count and self._flat_occupancy[cell]:
+            self.empties._add(cell)
+        self._flat_occupancy[cell] = count
+
     @overload
     def __getitem__(self, index: int) -> list[GridContent]:
         ...
@@ -152,7 +939,7 @@ class Grid:
             cells = []
             for pos in index:
                 x1, y1 = self.torus_adj(pos)
-                cells.append(self.grid[x1][y1])
+                cells.append(self._cells[x1 * self.height + y1])
             return cells
 
         x, y = index
@@ -161,7 +948,7 @@ class Grid:
             # grid[x, y]
             index = cast(Coordinate, index)
             x, y = self.torus_adj(index)
-            return self.grid[x][y]
+            return self._cells[x * self.height + y]
 
         if is_integer(x):
             # grid[x, :]
@@ -186,13 +973,46 @@ class Grid:
     def __iter__(self) -> Iterator[GridContent]:
         """Create an iterator that chains the rows of the grid together
         as if it is one list:"""
-        return itertools.chain(*self.grid)
+        return self._iter_cells()
+
+    def _iter_cells(self) -> Iterator[GridContent]:
+        """Iterate over the contents of all cells, by cell id."""
+        if isinstance(self._cells, list):
+            return iter(self._cells)
+        cells = self._cells
+        return (cells[cell] for cell in range(self.width * self.height))
 
     def coord_iter(self) -> Iterator[tuple[GridContent, int, int]]:
         """An iterator that returns coordinates as well as cell contents."""
+        cells = self._iter_cells()
         for row in range(self.width):
             for col in range(self.height):
-                yield self.grid[row][col], row, col  # agent, x, y
+                yield next(cells), row, col  # agent, x, y
+
+    def iter_occupied(self) -> Iterator[tuple[GridContent, int, int]]:
+        """Like coord_iter, but only over the occupied cells, in the same
+        order. Takes time proportional to the number of occupied cells."""
+        cells = self._cells
+        for cell in self._occupied_ids().tolist():
+            x, y = divmod(cell, self.height)
+            yield cells[cell], x, y
+
+    def get_occupied_ids(self) -> np.ndarray:
+        """Return the sorted array of the ids of the occupied cells."""
+        return self._occupied_ids()
+
+    def agent_positions(self) -> tuple[np.ndarray, np.ndarray]:
+        """Export the positions of all the agents on the grid.
+
+        Returns:
+            A tuple of an array of the agents' unique ids and an (N, 2) int
+            array of their (x, y) positions, in cell id order.
+        """
+        cells = self._occupied_ids()
+        agents = self.get_cell_contents_by_id(cells)
+        cells = np.repeat(cells, np.asarray(self._flat_occupancy[cells], np.int64))
+        ids = np.array([agent.unique_id for agent in agents])
+        return ids, np.column_stack(np.divmod(cells, self.height))
 
     def neighbor_iter(self, pos: Coordinate, moore: bool = True) -> Iterator[Agent]:
         """Iterate over position neighbors.
@@ -263,32 +1083,31 @@ class Grid:
             if not including the center).
         """
         cache_key = (pos, moore, include_center, radius)
-        neighborhood = self._neighborhood_cache.get(cache_key, None)
+        neighborhood = self._neighborhood_cache.get(cache_key)
 
         if neighborhood is None:
-            coordinates: set[Coordinate] = set()
-
             x, y = pos
-            for dy in range(-radius, radius + 1):
-                for dx in range(-radius, radius + 1):
-                    if dx == 0 and dy == 0 and not include_center:
-                        continue
-                    # Skip coordinates that are outside manhattan distance
-                    if not moore and abs(dx) + abs(dy) > radius:
-                        continue
-
-                    coord = (x + dx, y + dy)
-
-                    if self.out_of_bounds(coord):
-                        # Skip if not a torus and new coords out of bounds.
-                        if not self.torus:
-                            continue
-                        coord = self.torus_adj(coord)
-
-                    coordinates.add(coord)
-
-            neighborhood = sorted(coordinates)
-            self._neighborhood_cache[cache_key] = neighborhood
+            offsets = _square_offsets(moore, include_center, radius)
+            if radius <= x < self.width - radius and radius <= y < self.height - radius:
+                # Interior cell: all offsets fall inside the grid, and adding
+                # them to pos keeps them sorted.
+                neighborhood = [(x + dx, y + dy) for dx, dy in offsets]
+            elif self.torus:
+                # Wrapped coordinates may coincide when the radius is large
+                # compared to the grid.
+                neighborhood = sorted(
+                    {
+                        ((x + dx) % self.width, (y + dy) % self.height)
+                        for dx, dy in offsets
+                    }
+                )
+            else:
+                neighborhood = [
+                    (x + dx, y + dy)
+                    for dx, dy in offsets
+                    if 0 <= x + dx < self.width and 0 <= y + dy < self.height
+                ]
+            self._neighborhood_cache.put(cache_key, neighborhood)
 
         return neighborhood
 
@@ -378,7 +1197,8 @@ class Grid:
         # Note: filter(None, iterator) filters away an element of iterator that
         # is falsy. Hence, iter_cell_list_contents returns only non-empty
         # contents.
-        return filter(None, (self.grid[x][y] for x, y in cell_list))
+        cells, height = self._cells, self.height
+        return filter(None, (cells[x * height + y] for x, y in cell_list))
 
     @accept_tuple_argument
     def get_cell_list_contents(self, cell_list: Iterable[Coordinate]) -> list[Agent]:
@@ -414,112 +1234,667 @@ class Grid:
 
     def _place_agent(self, agent: Agent, pos: Coordinate) -> None:
         """Place the agent at the correct location."""
-        x, y = pos
-        self.grid[x][y] = agent
-        self.empties.discard(pos)
+        cell = self.get_cell_id(pos)
+        self._cells[cell] = agent
+        self._version += 1
+        if not self._flat_occupancy[cell]:
+            self._flat_occupancy[cell] = True
+            self.empties._remove(cell)
 
     def remove_agent(self, agent: Agent) -> None:
         """Remove the agent from the grid and set its pos attribute to None."""
-        pos = agent.pos
-        x, y = pos
-        self.grid[x][y] = self.default_val()
-        self.empties.add(pos)
+        cell = self.get_cell_id(agent.pos)
+        self._cells[cell] = self.default_val()
+        self._version += 1
+        if self._flat_occupancy[cell]:
+            self._flat_occupancy[cell] = False
+            self.empties._add(cell)
         agent.pos = None
 
-    def is_cell_empty(self, pos: Coordinate) -> bool:
-        """Returns a bool of the contents of a cell."""
-        x, y = pos
-        return self.grid[x][y] == self.default_val()
+    def place_agents(self, agents: Sequence[Agent], positions: npt.ArrayLike) -> None:
+        """Position many agents on the grid at once, and set their pos.
 
-    def move_to_empty(
-        self, agent: Agent, cutoff: float = 0.998, num_agents: int | None = None
+        The positions are validated in bulk, and the occupancy and empty cells
+        are updated once for the whole batch.
+
+        Args:
+            agents: The agents to place.
+            positions: (N, 2) array of (x, y) cell coordinates, one row per
+                       agent. On a torus, out of bounds coordinates wrap
+                       around.
+        """
+        x, y = self._cells_from_positions(positions)
+        if len(x) != len(agents):
+            raise ValueError("There must be one position per agent.")
+        self._check_cells_free(x, y)
+        self._place_agents(agents, x, y)
+
+    def move_agents(self, agents: Sequence[Agent], positions: npt.ArrayLike) -> None:
+        """Move many agents at once from their current cells to new ones.
+
+        Args:
+            agents: The agents to move; they must already be on the grid.
+            positions: (N, 2) array of (x, y) cell coordinates, one row per
+                       agent. On a torus, out of bounds coordinates wrap
+                       around.
+        """
+        x, y = self._cells_from_positions(positions)
+        if len(x) != len(agents):
+            raise ValueError("There must be one position per agent.")
+        self._check_cells_free(x, y, vacated=[agent.pos for agent in agents])
+        self._remove_agents(agents)
+        self._place_agents(agents, x, y)
+
+    def _check_cells_free(
+        self, x: np.ndarray, y: np.ndarray, vacated: list[Coordinate] | None = None
     ) -> None:
-        """Moves agent to a random empty cell, vacating agent's old cell."""
-        if len(self.empties) == 0:
-            raise Exception("ERROR: No empty cells")
-        if num_agents is None:
-            try:
-                num_agents = agent.model.schedule.get_agent_count()
-            except AttributeError:
-                raise Exception(
-                    "Your agent is not attached to a model, and so Mesa is unable\n"
-                    "to figure out the total number of agents you have created.\n"
-                    "This number is required in order to calculate the threshold\n"
-                    "for using a much faster algorithm to find an empty cell.\n"
-                    "In this case, you must specify `num_agents`."
-                )
-        new_pos = (0, 0)  # Initialize it with a starting value.
-        # This method is based on Agents.jl's random_empty() implementation.
-        # See https://github.com/JuliaDynamics/Agents.jl/pull/541.
-        # For the discussion, see
-        # https://github.com/projectmesa/mesa/issues/1052.
-        # This switch assumes the worst case (for this algorithm) of one
-        # agent per position, which is not true in general but is appropriate
-        # here.
-        if clamp(num_agents / (self.width * self.height), 0.0, 1.0) < cutoff:
-            # The default cutoff value provided is the break-even comparison
-            # with the time taken in the else branching point.
-            # The number is measured to be 0.998 in Agents.jl, but since Mesa
-            # run under different environment, the number is different here.
-            while True:
-                new_pos = (
-                    agent.random.randrange(self.width),
-                    agent.random.randrange(self.height),
-                )
-                if self.is_cell_empty(new_pos):
-                    break
-        else:
-            new_pos = agent.random.choice(sorted(self.empties))
-        self.remove_agent(agent)
-        self._place_agent(agent, new_pos)
-        agent.pos = new_pos
+        """Raise if agents cannot be placed in the given cells, which may
+        include the cells being vacated. Cells can always be overwritten."""
 
-    def find_empty(self) -> Coordinate | None:
-        """Pick a random empty cell."""
-        import random
+    def _place_agents(
+        self, agents: Sequence[Agent], x: np.ndarray, y: np.ndarray
+    ) -> None:
+        """Place the agents in the given cells and update the occupancy."""
+        cells = x * self.height + y
+        for agent, cell, px, py in zip(agents, cells.tolist(), x.tolist(), y.tolist()):
+            self._cells[cell] = agent
+            agent.pos = (px, py)
+        self._version += 1
+        cells = np.unique(cells)
+        self.empties._remove_batch(cells[self._flat_occupancy[cells] == 0])
+        self._flat_occupancy[cells] = True
+
+    def _remove_agents(self, agents: Sequence[Agent]) -> None:
+        """Remove the agents from the grid and update the occupancy."""
+        cells = self._flat_cells([agent.pos for agent in agents])
+        for agent, cell in zip(agents, cells.tolist()):
+            self._cells[cell] = self.default_val()
+            agent.pos = None
+        self._version += 1
+        cells = np.unique(cells)
+        self.empties._add_batch(cells[self._flat_occupancy[cells] != 0])
+        self._flat_occupancy[cells] = False
+
+    def get_cell_id(self, pos: Coordinate) -> int:
+        """Return the integer id of a cell, x * height + y.
+
+        On a torus, out of bounds coordinates wrap around; otherwise they
+        raise an exception.
+        """
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return x * self.height + y
+        if not self.torus:
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        return (x % self.width) * self.height + y % self.height
 
-        warn(
-            (
-                "`find_empty` is being phased out since it uses the global "
-                "`random` instead of the model-level random-number generator. "
-                "Consider replacing it with having a model or agent object "
-                "explicitly pick one of the grid's list of empty cells."
-            ),
-            DeprecationWarning,
+    def get_cell_pos(self, cell_id: int) -> Coordinate:
+        """Return the (x, y) coordinates of the cell with the given id."""
+        x, y = divmod(int(cell_id), self.height)
+        return x, y
+
+    def get_cell_ids(self, positions: npt.ArrayLike) -> np.ndarray:
+        """Return the ids of many cells at once.
+
+        Args:
+            positions: (N, 2) array of (x, y) cell coordinates. On a torus,
+                       out of bounds coordinates wrap around.
+        """
+        x, y = self._cells_from_positions(positions)
+        return x * self.height + y
+
+    def get_cell_positions(self, cell_ids: npt.ArrayLike) -> np.ndarray:
+        """Return the (N, 2) array of the coordinates of many cell ids."""
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        return np.stack(np.divmod(cell_ids, self.height), axis=-1)
+
+    def get_neighborhood_ids(
+        self,
+        cell_id: int,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Return the sorted array of the ids of the cells in the neighborhood
+        of a cell; same arguments as get_neighborhood, but with a cell id."""
+        x, y = self.get_cell_pos(cell_id)
+        if radius <= x < self.width - radius and radius <= y < self.height - radius:
+            offsets = _flat_square_offsets(moore, include_center, radius, self.height)
+            return cell_id + offsets
+        return self.get_cell_ids(
+            self.get_neighborhood((x, y), moore, include_center, radius)
         )
 
-        if self.exists_empty_cells():
-            pos = random.choice(sorted(self.empties))
-            return pos
-        else:
-            return None
+    def get_cell_contents_by_id(self, cell_ids: Iterable[int]) -> list[Agent]:
+        """Return a list of the agents in the cells with the given ids."""
+        cells, occupancy = self._cells, self._flat_occupancy
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        return [cells[cell_id] for cell_id in cell_ids[occupancy[cell_ids] != 0]]
 
-    def exists_empty_cells(self) -> bool:
-        """Return True if any cells empty else False."""
-        return len(self.empties) > 0
+    def _flat_cells(self, positions: list[Coordinate]) -> np.ndarray:
+        """Return the flat ids (x * height + y) of the given cells."""
+        positions = np.array(positions, dtype=np.int64).reshape(-1, 2)
+        return positions[:, 0] * self.height + positions[:, 1]
 
+    def is_cell_empty(self, pos: Coordinate) -> bool:
+        """Returns a bool of the contents of a cell."""
+        return not self._flat_occupancy[self.get_cell_id(pos)]
 
-class SingleGrid(Grid):
-    """Grid where each cell contains exactly at most one object."""
+    def is_cell_empty_batch(self, positions: npt.ArrayLike) -> np.ndarray:
+        """Check whether many cells are empty at once.
 
-    empties: set[Coordinate] = set()
+        Args:
+            positions: (N, 2) array of (x, y) cell coordinates. On a torus,
+                       out of bounds coordinates wrap around.
 
-    def position_agent(
-        self, agent: Agent, x: int | str = "random", y: int | str = "random"
-    ) -> None:
-        """Position an agent on the grid.
-        This is used when first placing agents! Use 'move_to_empty()'
-        when you want agents to jump to an empty cell.
-        Use 'swap_pos()' to swap agents positions.
-        If x or y are positive, they are used, but if "random",
-        we get a random position.
-        Ensure this random position is not occupied (in Grid).
+        Returns:
+            A boolean array, True for each empty cell.
         """
-        if x == "random" or y == "random":
-            if len(self.empties) == 0:
-                raise Exception("ERROR: Grid full")
-            coords = agent.random.choice(sorted(self.empties))
-        else:
+        x, y = self._cells_from_positions(positions)
+        return self._flat_occupancy[x * self.height + y] == 0
+
+    def _cells_from_positions(
+        self, positions: npt.ArrayLike
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Convert (N, 2) cell coordinates to x and y arrays, wrapping them
+        around a torus or raising if any is out of bounds."""
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        x, y = positions[:, 0], positions[:, 1]
+        if self.torus:
+            x, y = x % self.width, y % self.height
+        elif ((x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)).any():
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        return x, y
+
+    def get_empty_mask(self) -> np.ndarray:
+        """Return a (width, height) boolean array, True for each empty cell.
+
+        The array can be sliced to query the emptiness of a region, e.g.
+        grid.get_empty_mask()[x0:x1, y0:y1].any()
+        """
+        return self._occupancy_array() == 0
+
+    def _occupancy_array(self) -> np.ndarray:
+        """Return the (width, height) array of agent counts per cell."""
+        if self._occupancy is not None:
+            return self._occupancy
+        occupancy = np.zeros(self.width * self.height, dtype=self._occupancy_dtype)
+        cells = self._flat_occupancy.ids()
+        occupancy[cells] = self._flat_occupancy[cells]
+        return occupancy.reshape(self.width, self.height)
+
+    def _occupied_ids(self) -> np.ndarray:
+        """Return the sorted ids of the occupied cells."""
+        return self.empties._occupied_ids()
+
+    def _add_occupancy(self, cells: np.ndarray, delta: int) -> None:
+        """Add delta to the agent counts of cells, which may repeat."""
+        if self._occupancy is not None:
+            np.add.at(self._flat_occupancy, cells, delta)
+        else:
+            self._flat_occupancy.add(cells, delta)
+
+    def add_property_layer(self, layer: PropertyLayer) -> None:
+        """Attach a property layer to the grid, under its name."""
+        if (layer.width, layer.height) != (self.width, self.height):
+            raise ValueError("Property layer dimensions do not match the grid.")
+        if layer.name in self.properties:
+            raise ValueError(f"Property layer {layer.name!r} already exists.")
+        self.properties[layer.name] = layer
+        layer.torus = self.torus
+
+    def remove_property_layer(self, name: str) -> None:
+        """Detach the property layer with the given name from the grid."""
+        self.properties.pop(name).torus = False
+
+    def get_neighborhood_mask(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Return a (width, height) boolean array, True for the cells in the
+        neighborhood of pos, to combine with property layers."""
+        return self._cells_mask(
+            self.get_neighborhood(pos, moore, include_center, radius)
+        )
+
+    def _cells_mask(self, cells: list[Coordinate]) -> np.ndarray:
+        """Return a (width, height) boolean array, True for the given cells."""
+        mask = np.zeros((self.width, self.height), dtype=bool)
+        if cells:
+            mask[tuple(np.array(cells).T)] = True
+        return mask
+
+    def get_neighborhood_argmax(
+        self,
+        pos: Coordinate,
+        property_name: str,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+        only_empty: bool = False,
+    ) -> list[Coordinate]:
+        """Return the cells of a neighborhood holding the largest value of a
+        property layer.
+
+        Args:
+            pos: Coordinate tuple for the neighborhood to get.
+            property_name: Name of the property layer to compare.
+            moore, include_center, radius: As in get_neighborhood.
+            only_empty: If True, only consider empty cells.
+
+        Returns:
+            The sorted list of the best cells; empty if no cell qualifies.
+        """
+        return self._cells_argmax(
+            self.get_neighborhood(pos, moore, include_center, radius),
+            property_name,
+            only_empty,
+        )
+
+    def _cells_argmax(
+        self, cells: list[Coordinate], property_name: str, only_empty: bool
+    ) -> list[Coordinate]:
+        """Return the cells among the given ones holding the largest value of
+        a property layer."""
+        if not cells:
+            return []
+        x, y = np.array(cells).T
+        values = self.properties[property_name].data[x, y]
+        if only_empty:
+            empty = self._flat_occupancy[x * self.height + y] == 0
+            if not empty.any():
+                return []
+            x, y, values = x[empty], y[empty], values[empty]
+        best = values == values.max()
+        return list(zip(x[best].tolist(), y[best].tolist()))
+
+    def _cell_totals(self, value: Callable[[Agent], Any]) -> np.ndarray:
+        """Return a (width, height) array holding, for each cell, the total
+        of value(agent) over the agents in it."""
+        totals = np.zeros(self.width * self.height)
+        for cell in self._occupied_ids().tolist():
+            totals[cell] = sum(
+                value(agent)
+                for agent in self.iter_cell_list_contents(divmod(cell, self.height))
+            )
+        return totals.reshape(self.width, self.height)
+
+    def get_neighbor_counts(
+        self,
+        predicate: Callable[[Agent], bool] | None = None,
+        moore: bool = True,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Count the neighbors of every cell at once.
+
+        The counts are computed with an array convolution over the grid, and
+        follow the same neighborhoods as get_neighborhood, including torus
+        wrapping.
+
+        Args:
+            predicate: Optional function of an agent; only the agents for
+                       which it is true are counted.
+            moore: If True, use the Moore neighborhood, else Von Neumann.
+            include_center: If True, count the agents of the cell itself too.
+            radius: radius, in cells, of the neighborhood.
+
+        Returns:
+            A (width, height) integer array; [x, y] is the number of matching
+            agents in the neighborhood of cell (x, y).
+        """
+        counts = self._cell_counts(predicate)
+        return _neighborhood_sum(counts, moore, include_center, radius, self.torus)
+
+    def get_neighbor_sums(
+        self,
+        attribute: str | Callable[[Agent], float],
+        moore: bool = True,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Sum an agent attribute over the neighborhood of every cell at once.
+
+        Args:
+            attribute: Name of a numeric agent attribute, or a function
+                       returning a number for an agent.
+            moore, include_center, radius: As in get_neighbor_counts.
+
+        Returns:
+            A (width, height) float array; [x, y] is the total of the
+            attribute over the agents in the neighborhood of cell (x, y).
+        """
+        totals = self._cell_sums(attribute)
+        return _neighborhood_sum(totals, moore, include_center, radius, self.torus)
+
+    def _cell_counts(self, predicate: Callable[[Agent], bool] | None) -> np.ndarray:
+        """Return a (width, height) array of the number of agents in each
+        cell, only counting those for which predicate is true if given."""
+        if predicate is None:
+            return self._occupancy_array().astype(np.int64)
+        counts = self._cell_totals(lambda agent: bool(predicate(agent)))
+        return counts.astype(np.int64)
+
+    def _cell_sums(self, attribute: str | Callable[[Agent], float]) -> np.ndarray:
+        """Return a (width, height) array of the total of an agent attribute,
+        or function of an agent, over the agents in each cell."""
+        if isinstance(attribute, str):
+            name = attribute
+            return self._cell_totals(lambda agent: getattr(agent, name))
+        return self._cell_totals(attribute)
+
+    def get_summed_area_table(
+        self, value: type[Agent] | str | Callable[[Agent], Any] | None = None
+    ) -> SummedAreaTable:
+        """Return a summed-area table of the agents, for O(1) totals over
+        rectangular windows of cells.
+
+        Args:
+            value: What to total in each cell: None counts the agents, an
+                   agent class counts the agents of that class, an attribute
+                   name or a function of an agent sums that value.
+
+        Tables counting agents are cached, and only rebuilt after agents are
+        placed, moved or removed. Tables of attributes or functions are built
+        on each call, since the values can change without the agents moving;
+        keep the table while the values hold, e.g. for one step.
+        """
+        if value is None or isinstance(value, type):
+            cached = self._summed_area_tables.get(value)
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+            if value is None:
+                totals = self._occupancy_array().astype(np.int64)
+            else:
+                agent_class = value
+                totals = self._cell_totals(
+                    lambda agent: isinstance(agent, agent_class)
+                ).astype(np.int64)
+            table = SummedAreaTable(totals, self.torus)
+            self._summed_area_tables[value] = (self._version, table)
+            return table
+        if isinstance(value, str):
+            name = value
+            totals = self._cell_totals(lambda agent: getattr(agent, name))
+        else:
+            totals = self._cell_totals(value)
+        return SummedAreaTable(totals, self.torus)
+
+    def count_agents_in_rect(
+        self,
+        x_min: int,
+        y_min: int,
+        x_max: int,
+        y_max: int,
+        agent_class: type[Agent] | None = None,
+    ) -> int:
+        """Count the agents, or those of a class, in the window of cells from
+        (x_min, y_min) to (x_max, y_max), inclusive, in O(1) time.
+
+        Off a torus the window is clipped to the grid; on a torus it can
+        extend past the edges, and then wraps around.
+        """
+        table = self.get_summed_area_table(agent_class)
+        return table.window_sum(x_min, y_min, x_max, y_max)
+
+    def count_agents_in_rects(
+        self,
+        x_min: npt.ArrayLike,
+        y_min: npt.ArrayLike,
+        x_max: npt.ArrayLike,
+        y_max: npt.ArrayLike,
+        agent_class: type[Agent] | None = None,
+    ) -> np.ndarray:
+        """Count the agents, or those of a class, in many windows at once.
+
+        Args:
+            x_min, y_min, x_max, y_max: Arrays of the inclusive cell bounds
+                of the windows, as in count_agents_in_rect.
+            agent_class: Optional class of the agents to count.
+
+        Returns:
+            An integer array of the counts.
+        """
+        table = self.get_summed_area_table(agent_class)
+        return table.window_sums(x_min, y_min, x_max, y_max)
+
+    def _adjacent_cells(self, cells: np.ndarray, moore: bool) -> np.ndarray:
+        """Return the (len(cells), k) array of the ids of the cells adjacent
+        to the given cells, padded with -1 where the grid ends."""
+        x, y = np.divmod(cells, self.height)
+        offsets = np.array(_square_offsets(moore, False, 1))
+        return self._offset_cells(x, y, offsets[:, 0], offsets[:, 1])
+
+    def _offset_cells(
+        self, x: np.ndarray, y: np.ndarray, dx: np.ndarray, dy: np.ndarray
+    ) -> np.ndarray:
+        """Return the ids of the cells at offsets (dx, dy) from each cell
+        (x, y), as an (N, k) array, wrapped around a torus or -1 off the
+        grid."""
+        x = x[:, None] + dx
+        y = y[:, None] + dy
+        if self.torus:
+            return (x % self.width) * self.height + y % self.height
+        outside = (x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)
+        return np.where(outside, -1, x * self.height + y)
+
+    def get_distance_map(
+        self,
+        targets: Iterable[Coordinate],
+        moore: bool = True,
+        obstacles: str | None = None,
+        cost: str | None = None,
+    ) -> np.ndarray:
+        """Return the distance from every cell to the nearest target.
+
+        Without costs, distances count steps between adjacent cells and are
+        found by a breadth-first search; with costs, a step costs the value
+        of the cell it enters, and the search is a shortest path relaxation.
+        Both are vectorized over the grid. Maps are cached, and recomputed
+        when the obstacle or cost layer is modified.
+
+        Args:
+            targets: The target cells. They can always be entered, even if
+                     they are in the obstacles layer.
+            moore: If True, steps can be diagonal, else only up, down, left
+                   and right. Ignored on hexagonal grids.
+            obstacles: Optional name of a property layer whose non-zero cells
+                       cannot be entered.
+            cost: Optional name of a property layer holding the positive cost
+                  of entering each cell; infinite costs act as obstacles.
+
+        Returns:
+            A read-only (width, height) float array of distances, inf for the
+            cells that cannot reach any target.
+        """
+        x, y = self._cells_from_positions(list(targets))
+        targets = np.unique(x * self.height + y)
+        layers = [self.properties[name] for name in (obstacles, cost) if name]
+        key = (tuple(targets.tolist()), moore, obstacles, cost)
+        stamp = [(id(layer), layer._version) for layer in layers]
+        cached = self._distance_maps.get(key)
+        if cached is not None and cached[0] == stamp:
+            self._distance_maps.move_to_end(key)
+            return cached[1]
+
+        num_cells = self.width * self.height
+        if cost is None:
+            step_cost = np.ones(num_cells)
+        else:
+            step_cost = self.properties[cost].data.astype(np.float64).reshape(-1)
+        if obstacles is not None:
+            blocked = self.properties[obstacles].data.reshape(-1) != 0
+            blocked[targets] = False
+            step_cost = np.where(blocked, np.inf, step_cost)
+        if cost is None:
+            distances = self._breadth_first(targets, moore, np.isinf(step_cost))
+        else:
+            distances = self._relax_distances(targets, moore, step_cost)
+        distances = distances.reshape(self.width, self.height)
+        distances.setflags(write=False)
+
+        self._distance_maps[key] = (stamp, distances)
+        if len(self._distance_maps) > _DISTANCE_MAP_CACHE_SIZE:
+            self._distance_maps.popitem(last=False)
+        return distances
+
+    def _breadth_first(
+        self, targets: np.ndarray, moore: bool, blocked: np.ndarray
+    ) -> np.ndarray:
+        """Count the steps from the targets to every cell, one ring of
+        cells at a time."""
+        distances = np.full(len(blocked), np.inf)
+        distances[targets] = 0
+        ring = targets
+        step = 0
+        while len(ring):
+            step += 1
+            cells = self._adjacent_cells(ring, moore).reshape(-1)
+            cells = cells[cells >= 0]
+            cells = np.unique(cells[~blocked[cells] & np.isinf(distances[cells])])
+            distances[cells] = step
+            ring = cells
+        return distances
+
+    def _relax_distances(
+        self, targets: np.ndarray, moore: bool, step_cost: np.ndarray
+    ) -> np.ndarray:
+        """Find the cheapest paths from every cell to the targets, relaxing
+        the neighbors of all improved cells at once until none improves.
+
+        The search runs outward from the targets, so a cell reaching the
+        targets through an improved cell pays the cost of entering it.
+        """
+        if (step_cost <= 0).any():
+            raise ValueError("Costs must be positive.")
+        distances = np.full(len(step_cost), np.inf)
+        distances[targets] = 0
+        changed = targets
+        while len(changed):
+            cells = self._adjacent_cells(changed, moore)
+            sources = np.broadcast_to(changed[:, None], cells.shape)
+            valid = cells >= 0
+            cells, sources = cells[valid], sources[valid]
+            candidates = distances[sources] + step_cost[sources]
+            improved = distances.copy()
+            np.minimum.at(improved, cells, candidates)
+            changed = np.flatnonzero(improved < distances)
+            distances = improved
+        # Cells that cannot be entered cannot be left towards a target either
+        unreachable = np.isinf(step_cost)
+        unreachable[targets] = False
+        distances[unreachable] = np.inf
+        return distances
+
+    def get_next_step(
+        self,
+        pos: Coordinate,
+        targets: Iterable[Coordinate],
+        moore: bool = True,
+        obstacles: str | None = None,
+        cost: str | None = None,
+    ) -> Coordinate:
+        """Return the adjacent cell to move to from pos to get closest to the
+        targets, reading the cached distance map of get_distance_map.
+
+        Ties are broken in a fixed order of the adjacent cells. If none of
+        them is closer than pos, pos itself is returned.
+        """
+        distances = self.get_distance_map(targets, moore, obstacles, cost)
+        flat = distances.reshape(-1)
+        cell = self.get_cell_id(pos)
+        cells = self._adjacent_cells(np.array([cell]), moore)[0]
+        cells = cells[cells >= 0]
+        if not len(cells):
+            return pos
+        best = cells[np.argmin(flat[cells])]
+        if flat[best] >= flat[cell]:
+            return pos
+        return divmod(int(best), self.height)
+
+    def move_to_empty(
+        self, agent: Agent, cutoff: float = 0.998, num_agents: int | None = None
+    ) -> None:
+        """Moves agent to a random empty cell, vacating agent's old cell.
+
+        While the grid is filled less than cutoff, random cells are tried
+        until an empty one is found, which takes O(1) expected time;
+        otherwise one of the few empty cells is chosen. The fill ratio is
+        num_agents over the number of cells. num_agents defaults to the agent
+        count of the model's schedule, or else to the number of occupied
+        cells. Draws come from agent.random in the same order as in earlier
+        versions, so seeded runs are reproducible.
+        """
+        if len(self.empties) == 0:
+            raise Exception("ERROR: No empty cells")
+        if num_agents is None:
+            try:
+                num_agents = agent.model.schedule.get_agent_count()
+            except AttributeError:
+                num_agents = self.width * self.height - len(self.empties)
+        # This method is based on Agents.jl's random_empty() implementation.
+        # See https://github.com/JuliaDynamics/Agents.jl/pull/541.
+        if clamp(num_agents / (self.width * self.height), 0.0, 1.0) < cutoff:
+            while True:
+                new_pos = (
+                    agent.random.randrange(self.width),
+                    agent.random.randrange(self.height),
+                )
+                if self.is_cell_empty(new_pos):
+                    break
+        else:
+            new_pos = self.empties.choice(agent.random)
+        self.remove_agent(agent)
+        self._place_agent(agent, new_pos)
+        agent.pos = new_pos
+
+    def find_empty(self) -> Coordinate | None:
+        """Pick a random empty cell."""
+        import random
+
+        warn(
+            (
+                "`find_empty` is being phased out since it uses the global "
+                "`random` instead of the model-level random-number generator. "
+                "Consider replacing it with having a model or agent object "
+                "explicitly pick one of the grid's list of empty cells."
+            ),
+            DeprecationWarning,
+        )
+
+        if self.exists_empty_cells():
+            pos = self.empties.choice(random)
+            return pos
+        else:
+            return None
+
+    def exists_empty_cells(self) -> bool:
+        """Return True if any cells empty else False."""
+        return len(self.empties) > 0
+
+
+class SingleGrid(Grid):
+    """Grid where each cell contains exactly at most one object."""
+
+    def position_agent(
+        self, agent: Agent, x: int | str = "random", y: int | str = "random"
+    ) -> None:
+        """Position an agent on the grid.
+        This is used when first placing agents! Use 'move_to_empty()'
+        when you want agents to jump to an empty cell.
+        Use 'swap_pos()' to swap agents positions.
+        If x or y are positive, they are used, but if "random",
+        we get a random position.
+        Ensure this random position is not occupied (in Grid).
+        """
+        if x == "random" or y == "random":
+            if len(self.empties) == 0:
+                raise Exception("ERROR: Grid full")
+            coords = self.empties.choice(agent.random)
+        else:
             coords = (x, y)
         agent.pos = coords
         self._place_agent(agent, coords)
@@ -530,6 +1905,89 @@ class SingleGrid(Grid):
         else:
             raise Exception("Cell not empty")
 
+    def _check_cells_free(
+        self, x: np.ndarray, y: np.ndarray, vacated: list[Coordinate] | None = None
+    ) -> None:
+        cells = x * self.height + y
+        occupied = self._flat_occupancy[cells] != 0
+        if vacated:
+            occupied &= ~np.isin(cells, self._flat_cells(vacated))
+        if occupied.any() or len(np.unique(cells)) < len(cells):
+            raise Exception("Cell not empty")
+
+    def resolve_moves(
+        self,
+        agents: Sequence[Agent],
+        targets: npt.ArrayLike,
+        priority: npt.ArrayLike | None = None,
+        rng: Any = None,
+    ) -> np.ndarray:
+        """Move many agents at once to the cells they requested, resolving
+        conflicts between them.
+
+        When several agents request the same cell, the one with the highest
+        priority wins it, with ties broken at random. A winning move then only
+        succeeds if its cell is empty or vacated by another successful move;
+        an agent that cannot move keeps its cell, which may in turn block
+        other moves. Agents can swap cells or move in cycles. All successful
+        moves are applied at once, so the order of the agents does not matter.
+
+        Args:
+            agents: The agents requesting a move; they must be on the grid.
+            targets: (N, 2) array of the requested (x, y) cells, one row per
+                     agent. On a torus, out of bounds cells wrap around.
+            priority: Optional array of N numbers; higher values win.
+            rng: random.Random instance used to break ties, so that runs are
+                 reproducible. Defaults to the random of the first agent.
+
+        Returns:
+            A boolean array, True for each agent that moved. Agents whose
+            target is their own cell do not count as moving.
+        """
+        x, y = self._cells_from_positions(targets)
+        num_agents = len(agents)
+        if len(x) != num_agents:
+            raise ValueError("There must be one target per agent.")
+        if num_agents == 0:
+            return np.zeros(0, dtype=bool)
+        targets = x * self.height + y
+        current = self._flat_cells([agent.pos for agent in agents])
+
+        # Pick one winner per requested cell: highest priority, then random
+        if rng is None:
+            rng = agents[0].random
+        tiebreak = np.random.default_rng(rng.getrandbits(64)).random(num_agents)
+        if priority is None:
+            priority = np.zeros(num_agents)
+        moving = targets != current
+        order = np.lexsort((tiebreak, -np.asarray(priority, dtype=float), targets))
+        order = order[moving[order]]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = targets[order[1:]] != targets[order[:-1]]
+        winners = np.zeros(num_agents, dtype=bool)
+        winners[order[first]] = True
+
+        # Agents holding the requested cells, or -1 for agents outside the batch
+        by_cell = np.argsort(current)
+        slot = np.searchsorted(current[by_cell], targets).clip(max=num_agents - 1)
+        holder = np.where(current[by_cell[slot]] == targets, by_cell[slot], -1)
+        occupied = self._flat_occupancy[x * self.height + y] != 0
+
+        # A move fails if its cell is held by an agent that is not moving away,
+        # and each failure can block further moves
+        while True:
+            blocked = occupied & ((holder < 0) | ~winners[holder])
+            moved = winners & ~blocked
+            if (moved == winners).all():
+                break
+            winners = moved
+
+        self.move_agents(
+            [agent for agent, move in zip(agents, moved) if move],
+            np.stack((x[moved], y[moved]), axis=1),
+        )
+        return moved
+
 
 class MultiGrid(Grid):
     """Grid where each cell can contain more than one object.
@@ -538,42 +1996,107 @@ class MultiGrid(Grid):
     bottom-left and [width-1][height-1] is the top-right. If a grid is
     toroidal, the top and bottom, and left and right, edges wrap to each other.
 
-    Each grid cell holds a set object.
+    Each grid cell holds its agents in placement order, in a list-like
+    container where adding, removing and finding an agent take O(1) time.
 
     Properties:
         width, height: The grid's width and height.
 
         torus: Boolean which determines whether to treat the grid as a torus.
 
-        grid: Internal list-of-lists which holds the grid cells themselves.
+        grid: List of columns, so that grid[x][y] accesses a cell.
 
     Methods:
         get_neighbors: Returns the objects surrounding a given cell.
     """
 
-    grid: list[list[MultiGridContent]]
+    _cells: list[_CellAgents]
+
+    # Cells can hold many agents, so the occupancy counts them
+    _occupancy_dtype = np.int32
 
     @staticmethod
-    def default_val() -> MultiGridContent:
+    def default_val() -> _CellAgents:
         """Default value for new cell elements."""
-        return []
+        return _CellAgents()
+
+    @staticmethod
+    def _count_contents(contents: Any) -> int:
+        return len(contents)
+
+    def _set_cell(self, cell: int, contents: Any) -> None:
+        if not isinstance(contents, _CellAgents):
+            contents = _CellAgents(contents)
+        super()._set_cell(cell, contents)
 
     def _place_agent(self, agent: Agent, pos: Coordinate) -> None:
         """Place the agent at the correct location."""
-        x, y = pos
-        if agent not in self.grid[x][y]:
-            self.grid[x][y].append(agent)
-        self.empties.discard(pos)
+        cell = self.get_cell_id(pos)
+        contents = self._cells[cell]
+        if agent not in contents:
+            contents.append(agent)
+            # Store the contents back, for sparse grids
+            self._cells[cell] = contents
+            self._version += 1
+            if not self._flat_occupancy[cell]:
+                self.empties._remove(cell)
+            self._flat_occupancy[cell] += 1
 
     def remove_agent(self, agent: Agent) -> None:
         """Remove the agent from the given location and set its pos attribute to None."""
-        pos = agent.pos
-        x, y = pos
-        self.grid[x][y].remove(agent)
-        if self.is_cell_empty(pos):
-            self.empties.add(pos)
+        cell = self.get_cell_id(agent.pos)
+        contents = self._cells[cell]
+        contents.remove(agent)
+        self._cells[cell] = contents
+        self._version += 1
+        self._flat_occupancy[cell] -= 1
+        if not self._flat_occupancy[cell]:
+            self.empties._add(cell)
         agent.pos = None
 
+    def _place_agents(
+        self, agents: Sequence[Agent], x: np.ndarray, y: np.ndarray
+    ) -> None:
+        cells = x * self.height + y
+        placed = []
+        for i, (agent, cell, px, py) in enumerate(
+            zip(agents, cells.tolist(), x.tolist(), y.tolist())
+        ):
+            contents = self._cells[cell]
+            if agent not in contents:
+                contents.append(agent)
+                self._cells[cell] = contents
+                placed.append(i)
+            agent.pos = (px, py)
+        self._version += 1
+        cells = cells[placed]
+        unique_cells = np.unique(cells)
+        self.empties._remove_batch(
+            unique_cells[self._flat_occupancy[unique_cells] == 0]
+        )
+        self._add_occupancy(cells, 1)
+
+    def _remove_agents(self, agents: Sequence[Agent]) -> None:
+        cells = self._flat_cells([agent.pos for agent in agents])
+        for agent, cell in zip(agents, cells.tolist()):
+            contents = self._cells[cell]
+            contents.remove(agent)
+            self._cells[cell] = contents
+            agent.pos = None
+        self._version += 1
+        self._add_occupancy(cells, -1)
+        cells = np.unique(cells)
+        self.empties._add_batch(cells[self._flat_occupancy[cells] == 0])
+
+    def get_cell_contents_by_id(self, cell_ids: Iterable[int]) -> list[Agent]:
+        cells, occupancy = self._cells, self._flat_occupancy
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        return list(
+            itertools.chain.from_iterable(
+                cells[cell_id] for cell_id in cell_ids[occupancy[cell_ids] != 0]
+            )
+        )
+
     @accept_tuple_argument
     def iter_cell_list_contents(
         self, cell_list: Iterable[Coordinate]
@@ -588,90 +2111,274 @@ class MultiGrid(Grid):
             A iterator of the contents of the cells identified in cell_list
 
         """
+        cells, occupancy, height = self._cells, self._flat_occupancy, self.height
         return itertools.chain.from_iterable(
-            self[x][y] for x, y in cell_list if not self.is_cell_empty((x, y))
+            cells[x * height + y] for x, y in cell_list if occupancy[x * height + y]
         )
 
 
-class HexGrid(Grid):
-    """Hexagonal Grid: Extends Grid to handle hexagonal neighbors.
+class LayeredGrid:
+    """Grid made of one layer per agent class, all sharing coordinates.
 
-    Functions according to odd-q rules.
-    See http://www.redblobgames.com/grids/hexagons/#coordinates for more.
+    Each layer is a grid of its own, e.g. a SingleGrid of sugar patches under
+    a MultiGrid of ants, and agents are placed on the layer of their class.
+    Emptiness checks and neighbor queries on a layer never look at the agents
+    of other layers, and use that layer's occupancy array.
 
     Properties:
         width, height: The grid's width and height.
         torus: Boolean which determines whether to treat the grid as a torus.
+        layers: Dict of the layer grids, by agent class.
 
     Methods:
+        is_cell_empty: Whether a cell is empty, on one layer or on all.
         get_neighbors: Returns the objects surrounding a given cell.
         get_neighborhood: Returns the cells surrounding a given cell.
-        iter_neighbors: Iterates over position neighbors.
-        iter_neighborhood: Returns an iterator over cell coordinates that are
-            in the neighborhood of a certain point.
     """
 
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        layers: dict[type[Agent], type[Grid]],
+        sparse: bool = False,
+    ) -> None:
+        """Create a new layered grid.
+
+        Args:
+            width, height: The width and height of the grid
+            torus: Boolean whether the grid wraps or not.
+            layers: Grid class of the layer of each agent class, e.g.
+                {Sugar: SingleGrid, Ant: MultiGrid}. Agents of a subclass go
+                on the layer of their nearest listed base class.
+            sparse: Whether the layers are sparse grids.
+        """
+        if not layers:
+            raise ValueError("A layered grid needs at least one layer.")
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.layers: dict[type[Agent], Grid] = {
+            agent_class: grid_class(width, height, torus, sparse=sparse)
+            for agent_class, grid_class in layers.items()
+        }
+        # Layers share their coordinates, so any of them answers geometric
+        # queries
+        self._geometry = next(iter(self.layers.values()))
+        self._layer_cache: dict[type, Grid] = {}
+
+    def get_layer(self, agent_class: type[Agent]) -> Grid:
+        """Return the layer holding the agents of the given class."""
+        try:
+            return self._layer_cache[agent_class]
+        except KeyError:
+            pass
+        for base in agent_class.__mro__:
+            if base in self.layers:
+                self._layer_cache[agent_class] = layer = self.layers[base]
+                return layer
+        raise ValueError(f"No layer for agents of type {agent_class.__name__}.")
+
+    def _select(self, layer: type[Agent] | None) -> Iterable[Grid]:
+        if layer is None:
+            return self.layers.values()
+        return (self.get_layer(layer),)
+
+    def place_agent(self, agent: Agent, pos: Coordinate) -> None:
+        """Position an agent on the layer of its class, and set its pos."""
+        self.get_layer(type(agent)).place_agent(agent, pos)
+
+    def remove_agent(self, agent: Agent) -> None:
+        """Remove the agent from its layer and set its pos attribute to None."""
+        self.get_layer(type(agent)).remove_agent(agent)
+
+    def move_agent(self, agent: Agent, pos: Coordinate) -> None:
+        """Move an agent to a new position on its layer."""
+        self.get_layer(type(agent)).move_agent(agent, pos)
+
+    def move_to_empty(self, agent: Agent) -> None:
+        """Move an agent to a random cell that is empty on its layer."""
+        self.get_layer(type(agent)).move_to_empty(agent)
+
+    def is_cell_empty(self, pos: Coordinate, layer: type[Agent] | None = None) -> bool:
+        """Return whether a cell is empty on the layer of the given agent
+        class, or on all layers if no class is given."""
+        return all(grid.is_cell_empty(pos) for grid in self._select(layer))
+
+    def get_empty_mask(self, layer: type[Agent] | None = None) -> np.ndarray:
+        """Return a (width, height) boolean array, True for each cell empty on
+        the given layer, or on all layers if no class is given."""
+        masks = [grid.get_empty_mask() for grid in self._select(layer)]
+        return np.logical_and.reduce(masks)
+
+    def torus_adj(self, pos: Coordinate) -> Coordinate:
+        """Convert coordinate, handling torus looping."""
+        return self._geometry.torus_adj(pos)
+
+    def out_of_bounds(self, pos: Coordinate) -> bool:
+        """Determines whether position is off the grid."""
+        return self._geometry.out_of_bounds(pos)
+
+    def get_neighborhood(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> list[Coordinate]:
+        """Return a list of cells that are in the neighborhood of a certain
+        point, as in Grid.get_neighborhood."""
+        return self._geometry.get_neighborhood(pos, moore, include_center, radius)
+
     def iter_neighborhood(
-        self, pos: Coordinate, include_center: bool = False, radius: int = 1
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
     ) -> Iterator[Coordinate]:
         """Return an iterator over cell coordinates that are in the
-        neighborhood of a certain point.
+        neighborhood of a certain point."""
+        yield from self.get_neighborhood(pos, moore, include_center, radius)
 
-        Args:
-            pos: Coordinate tuple for the neighborhood to get.
-            include_center: If True, return the (x, y) cell as well.
-                            Otherwise, return surrounding cells only.
-            radius: radius, in cells, of neighborhood to get.
+    def get_neighbors(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool = False,
+        radius: int = 1,
+        layer: type[Agent] | None = None,
+    ) -> list[Agent]:
+        """Return a list of neighbors to a certain point.
 
-        Returns:
-            A list of coordinate tuples representing the neighborhood. For
-            example with radius 1, it will return list with number of elements
-            equals at most 9 (8) if Moore, 5 (4) if Von Neumann (if not
-            including the center).
+        Args:
+            pos, moore, include_center, radius: As in Grid.get_neighbors.
+            layer: If given, only return the agents on the layer of this
+                agent class.
         """
+        neighborhood = self.get_neighborhood(pos, moore, include_center, radius)
+        return self.get_cell_list_contents(neighborhood, layer)
 
-        def torus_adj_2d(pos: Coordinate) -> Coordinate:
-            return (pos[0] % self.width, pos[1] % self.height)
+    @accept_tuple_argument
+    def iter_cell_list_contents(
+        self, cell_list: Iterable[Coordinate], layer: type[Agent] | None = None
+    ) -> Iterator[Agent]:
+        """Returns an iterator of the contents of the cells identified in
+        cell_list, on the given layer or else on all layers, in layer order
+        within each cell.
 
-        coordinates = set()
+        Args:
+            cell_list: Array-like of (x, y) tuples, or single tuple.
+            layer: Optional agent class of the layer to look at.
+        """
+        grids = list(self._select(layer))
+        if len(grids) == 1:
+            return grids[0].iter_cell_list_contents(cell_list)
+        return itertools.chain.from_iterable(
+            grid.iter_cell_list_contents([pos]) for pos in cell_list for grid in grids
+        )
 
-        def find_neighbors(pos: Coordinate, radius: int) -> None:
-            x, y = pos
+    @accept_tuple_argument
+    def get_cell_list_contents(
+        self, cell_list: Iterable[Coordinate], layer: type[Agent] | None = None
+    ) -> list[Agent]:
+        """Returns a list of the contents of the cells identified in
+        cell_list, on the given layer or else on all layers."""
+        return list(self.iter_cell_list_contents(cell_list, layer))
 
-            """
-            Both: (0,-), (0,+)
+    def coord_iter(self) -> Iterator[tuple[list[Agent], int, int]]:
+        """An iterator that returns coordinates as well as the agents of all
+        layers in each cell."""
+        for x in range(self.width):
+            for y in range(self.height):
+                yield self.get_cell_list_contents([(x, y)]), x, y
 
-            Even: (-,+), (-,0), (+,+), (+,0)
-            Odd:  (-,0), (-,-), (+,0), (+,-)
-            """
-            adjacent = [(x, y - 1), (x, y + 1)]
+    def iter_occupied(self) -> Iterator[tuple[list[Agent], int, int]]:
+        """Like coord_iter, but only over the cells occupied on any layer."""
+        cells = functools.reduce(
+            np.union1d, (grid.get_occupied_ids() for grid in self.layers.values())
+        )
+        for cell in cells.tolist():
+            x, y = divmod(cell, self.height)
+            yield self.get_cell_list_contents([(x, y)]), x, y
+
+    def agent_positions(
+        self, layer: type[Agent] | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Export the unique ids and (N, 2) positions of the agents on the
+        given layer, or on all layers one after the other."""
+        exports = [grid.agent_positions() for grid in self._select(layer)]
+        ids = np.concatenate([ids for ids, _ in exports])
+        return ids, np.concatenate([positions for _, positions in exports])
+
+    def count_agents_in_rects(
+        self,
+        x_min: npt.ArrayLike,
+        y_min: npt.ArrayLike,
+        x_max: npt.ArrayLike,
+        y_max: npt.ArrayLike,
+        agent_class: type[Agent] | None = None,
+    ) -> np.ndarray:
+        """Count the agents of a class, or of all layers, in many windows
+        of cells at once, as in Grid.count_agents_in_rects."""
+        if agent_class is None:
+            return sum(
+                grid.count_agents_in_rects(x_min, y_min, x_max, y_max)
+                for grid in self.layers.values()
+            )
+        grid = self.get_layer(agent_class)
+        return grid.count_agents_in_rects(x_min, y_min, x_max, y_max, agent_class)
+
+    def count_agents_in_rect(
+        self,
+        x_min: int,
+        y_min: int,
+        x_max: int,
+        y_max: int,
+        agent_class: type[Agent] | None = None,
+    ) -> int:
+        """Count the agents of a class, or of all layers, in the window of
+        cells from (x_min, y_min) to (x_max, y_max), inclusive."""
+        counts = self.count_agents_in_rects(x_min, y_min, x_max, y_max, agent_class)
+        return counts.item()
 
-            if include_center:
-                adjacent.append(pos)
 
-            if x % 2 == 0:
-                adjacent += [(x - 1, y + 1), (x - 1, y), (x + 1, y + 1), (x + 1, y)]
-            else:
-                adjacent += [(x - 1, y), (x - 1, y - 1), (x + 1, y), (x + 1, y - 1)]
+class HexGrid(Grid):
+    """Hexagonal Grid: Extends Grid to handle hexagonal neighbors.
 
-            if self.torus is False:
-                adjacent = list(
-                    filter(lambda coords: not self.out_of_bounds(coords), adjacent)
-                )
-            else:
-                adjacent = [torus_adj_2d(coord) for coord in adjacent]
+    Functions according to odd-q rules.
+    See http://www.redblobgames.com/grids/hexagons/#coordinates for more.
 
-            coordinates.update(adjacent)
+    Properties:
+        width, height: The grid's width and height.
+        torus: Boolean which determines whether to treat the grid as a torus.
 
-            if radius > 1:
-                [find_neighbors(coords, radius - 1) for coords in adjacent]
+    Methods:
+        get_neighbors: Returns the objects surrounding a given cell.
+        get_neighborhood: Returns the cells surrounding a given cell.
+        iter_neighbors: Iterates over position neighbors.
+        iter_neighborhood: Returns an iterator over cell coordinates that are
+            in the neighborhood of a certain point.
+    """
 
-        find_neighbors(pos, radius)
+    def iter_neighborhood(
+        self, pos: Coordinate, include_center: bool = False, radius: int = 1
+    ) -> Iterator[Coordinate]:
+        """Return an iterator over cell coordinates that are in the
+        neighborhood of a certain point.
 
-        if not include_center and pos in coordinates:
-            coordinates.remove(pos)
+        Args:
+            pos: Coordinate tuple for the neighborhood to get.
+            include_center: If True, return the (x, y) cell as well.
+                            Otherwise, return surrounding cells only.
+            radius: radius, in cells, of neighborhood to get.
 
-        yield from coordinates
+        Returns:
+            An iterator of coordinate tuples representing the neighborhood, in
+            sorted order; With radius 1, at most 6 (7 if including the center).
+        """
+        yield from self.get_neighborhood(pos, include_center, radius)
 
     def neighbor_iter(self, pos: Coordinate) -> Iterator[Agent]:
         """Iterate over position neighbors.
@@ -699,10 +2406,141 @@ class HexGrid(Grid):
             radius: radius, in cells, of neighborhood to get.
 
         Returns:
-            A list of coordinate tuples representing the neighborhood;
-            With radius 1
+            A sorted list of coordinate tuples representing the neighborhood;
+            With radius 1, at most 6 (7 if including the center).
+        """
+        cache_key = (pos, include_center, radius)
+        neighborhood = self._neighborhood_cache.get(cache_key)
+
+        if neighborhood is None:
+            x, y = pos
+            # A radius below 1 has always been treated as 1
+            radius = max(radius, 1)
+            if radius <= x < self.width - radius and radius <= y < self.height - radius:
+                # Interior cell: the neighborhood cannot reach the edges, so
+                # it is the precomputed offset table for the column parity.
+                offsets = _hex_offsets(x % 2 == 1, include_center, radius)
+                neighborhood = [(x + dx, y + dy) for dx, dy in offsets]
+            else:
+                neighborhood = self._find_neighborhood(pos, include_center, radius)
+            self._neighborhood_cache.put(cache_key, neighborhood)
+
+        return neighborhood
+
+    def get_neighborhood_ids(
+        self, cell_id: int, include_center: bool = False, radius: int = 1
+    ) -> np.ndarray:
+        """Return the sorted array of the ids of the cells in the neighborhood
+        of a cell; same arguments as get_neighborhood, but with a cell id."""
+        pos = self.get_cell_pos(cell_id)
+        return self.get_cell_ids(self.get_neighborhood(pos, include_center, radius))
+
+    def get_neighborhood_mask(
+        self, pos: Coordinate, include_center: bool = False, radius: int = 1
+    ) -> np.ndarray:
+        """Return a (width, height) boolean array, True for the cells in the
+        neighborhood of pos, to combine with property layers."""
+        return self._cells_mask(self.get_neighborhood(pos, include_center, radius))
+
+    def get_neighborhood_argmax(
+        self,
+        pos: Coordinate,
+        property_name: str,
+        include_center: bool = False,
+        radius: int = 1,
+        only_empty: bool = False,
+    ) -> list[Coordinate]:
+        """Return the cells of a neighborhood holding the largest value of a
+        property layer; same as Grid.get_neighborhood_argmax, without moore."""
+        return self._cells_argmax(
+            self.get_neighborhood(pos, include_center, radius),
+            property_name,
+            only_empty,
+        )
+
+    def get_neighbor_counts(
+        self,
+        predicate: Callable[[Agent], bool] | None = None,
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Count the neighbors of every cell at once, over the same hexagonal
+        neighborhoods as get_neighborhood; same as Grid.get_neighbor_counts,
+        without moore."""
+        counts = self._cell_counts(predicate)
+        return self._hex_neighborhood_sum(counts, include_center, radius)
+
+    def get_neighbor_sums(
+        self,
+        attribute: str | Callable[[Agent], float],
+        include_center: bool = False,
+        radius: int = 1,
+    ) -> np.ndarray:
+        """Sum an agent attribute over the hexagonal neighborhood of every
+        cell at once; same as Grid.get_neighbor_sums, without moore."""
+        totals = self._cell_sums(attribute)
+        return self._hex_neighborhood_sum(totals, include_center, radius)
+
+    def _hex_neighborhood_sum(
+        self, values: np.ndarray, include_center: bool, radius: int
+    ) -> np.ndarray:
+        """Sum a (width, height) array over the neighborhood of every cell.
+
+        Even and odd columns each take the shifted sums of their own offset
+        table. On a torus of odd width, column parity flips across the
+        seam, so the cells within radius of it are summed one by one.
         """
-        return list(self.iter_neighborhood(pos, include_center, radius))
+        radius = max(radius, 1)
+        width, height = values.shape
+        total = np.zeros(values.shape, dtype=np.result_type(values.dtype, np.int64))
+        for parity in (0, 1):
+            offsets = set(_hex_offsets(parity == 1, include_center, radius))
+            if self.torus:
+                offsets = {(dx % width, dy % height) for dx, dy in offsets}
+                if not include_center:
+                    # Offsets wrapping onto the cell itself are not neighbors
+                    offsets.discard((0, 0))
+            sums = _offsets_sum(values, offsets, radius, self.torus)
+            total[parity::2] = sums[parity::2]
+        if self.torus and width % 2:
+            flat = values.reshape(-1)
+            seam = [x for x in range(width) if x < radius or x >= width - radius]
+            for x, y in itertools.product(seam, range(height)):
+                cells = self._find_neighborhood((x, y), include_center, radius)
+                total[x, y] = flat[self.get_cell_ids(cells)].sum()
+        return total
+
+    def _adjacent_cells(self, cells: np.ndarray, moore: bool = True) -> np.ndarray:
+        """Return the (len(cells), 6) array of the ids of the cells adjacent
+        to the given cells, padded with -1 where the grid ends."""
+        x, y = np.divmod(cells, self.height)
+        even = np.array(_hex_offsets(False, False, 1))
+        odd = np.array(_hex_offsets(True, False, 1))
+        offsets = np.where((x % 2 == 0)[:, None, None], even, odd)
+        return self._offset_cells(x, y, offsets[:, :, 0], offsets[:, :, 1])
+
+    def _find_neighborhood(
+        self, pos: Coordinate, include_center: bool, radius: int
+    ) -> list[Coordinate]:
+        """Expand the neighborhood of a cell near the edges ring by ring,
+        dropping out of bounds cells or wrapping them around the torus."""
+        reached = {pos}
+        ring = [pos]
+        for _ in range(radius):
+            next_ring = []
+            for cell in ring:
+                for coord in _hex_adjacent(cell):
+                    if self.torus:
+                        coord = (coord[0] % self.width, coord[1] % self.height)
+                    elif self.out_of_bounds(coord):
+                        continue
+                    if coord not in reached:
+                        reached.add(coord)
+                        next_ring.append(coord)
+            ring = next_ring
+        if not include_center:
+            reached.remove(pos)
+        return sorted(reached)
 
     def iter_neighbors(
         self, pos: Coordinate, include_center: bool = False, radius: int = 1
@@ -719,7 +2557,7 @@ class HexGrid(Grid):
         Returns:
             An iterator of non-None objects in the given neighborhood
         """
-        neighborhood = self.iter_neighborhood(pos, include_center, radius)
+        neighborhood = self.get_neighborhood(pos, include_center, radius)
         return self.iter_cell_list_contents(neighborhood)
 
     def get_neighbors(
@@ -740,15 +2578,447 @@ class HexGrid(Grid):
         return list(self.iter_neighbors(pos, include_center, radius))
 
 
+class _CellView:
+    """View of a single cell of a CellularAutomaton.
+
+    Views let portrayals and reporters treat cells like agents: they read and
+    write the automaton's state array, and hold no state of their own.
+    """
+
+    __slots__ = ("_automaton", "pos")
+
+    def __init__(self, automaton: CellularAutomaton, pos: Coordinate) -> None:
+        self._automaton = automaton
+        self.pos = pos
+
+    @property
+    def unique_id(self) -> Coordinate:
+        return self.pos
+
+    @property
+    def state(self) -> int:
+        return int(self._automaton.state[self.pos])
+
+    @state.setter
+    def state(self, value: int) -> None:
+        self._automaton.state[self.pos] = value
+
+    def __repr__(self) -> str:
+        return f"<Cell {self.pos}: {self.state}>"
+
+
+class CellularAutomaton:
+    """Grid of integer cell states, all updated at once by a rule.
+
+    The states are stored in a (width, height) integer array and updated with
+    array operations, instead of stepping one agent per cell. The next states
+    are written to a second buffer, which is then swapped with the current
+    one, so every cell sees the states of the previous step.
+
+    The rule is either:
+        - a function taking the automaton and returning the array of next
+          states, typically built from `state` and `count_neighbors`; or
+        - a lookup table, indexed by [state, count], where count is the number
+          of neighbors in `counted_state`. E.g. Conway's Game of Life is
+          [[0, 0, 0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 1, 0, 0, 0, 0, 0]].
+
+    The automaton can be used as a model's grid for the CanvasGrid
+    visualization, and its cells read as agents through per-cell views.
+
+    Properties:
+        width, height: The grid's width and height.
+        torus: Boolean which determines whether to treat the grid as a torus.
+        state: The (width, height) array of current states.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        rule: Callable[[CellularAutomaton], npt.ArrayLike] | npt.ArrayLike,
+        moore: bool = True,
+        radius: int = 1,
+        counted_state: int = 1,
+        initial_state: npt.ArrayLike = 0,
+        dtype: npt.DTypeLike = np.int64,
+    ) -> None:
+        """Create a new cellular automaton.
+
+        Args:
+            width, height: The width and height of the grid.
+            torus: Boolean whether the grid wraps or not.
+            rule: A function of the automaton returning the next states, or a
+                  lookup table indexed by [state, neighbor count].
+            moore: Whether neighborhoods are Moore or Von Neumann.
+            radius: radius, in cells, of the neighborhoods.
+            counted_state: The state counted in the neighborhood, when the
+                           rule is a lookup table.
+            initial_state: A scalar or (width, height) array of initial states.
+            dtype: The integer dtype of the states.
+        """
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.moore = moore
+        self.radius = radius
+        self.counted_state = counted_state
+
+        self.state = np.empty((width, height), dtype=dtype)
+        self.state[...] = initial_state
+        self._next_state = np.empty_like(self.state)
+
+        if callable(rule):
+            self.rule = rule
+            self._table = None
+        else:
+            self._table = np.asarray(rule, dtype=dtype)
+            num_neighbors = len(_square_offsets(moore, False, radius))
+            if self._table.ndim != 2 or self._table.shape[1] <= num_neighbors:
+                raise ValueError(
+                    "The lookup table must have one column per neighbor count, "
+                    f"from 0 to {num_neighbors}."
+                )
+
+    def count_neighbors(self, value: int) -> np.ndarray:
+        """Return a (width, height) array with, for each cell, the number of
+        its neighbors in the given state."""
+        return _neighborhood_sum(
+            (self.state == value).astype(np.int64),
+            self.moore,
+            radius=self.radius,
+            torus=self.torus,
+        )
+
+    def count_state(self, value: int) -> int:
+        """Return the number of cells in the given state."""
+        return int(np.count_nonzero(self.state == value))
+
+    def step(self) -> None:
+        """Update all cells at once."""
+        if self._table is None:
+            self._next_state[...] = self.rule(self)
+        else:
+            counts = self.count_neighbors(self.counted_state)
+            self._next_state[...] = self._table[self.state, counts]
+        self.state, self._next_state = self._next_state, self.state
+
+    @property
+    def cells(self) -> list[_CellView]:
+        """Views of all cells, e.g. for reporters."""
+        return [cell for cell, _, _ in self.coord_iter()]
+
+    def coord_iter(self) -> Iterator[tuple[_CellView, int, int]]:
+        """An iterator that returns coordinates as well as cell views."""
+        for x in range(self.width):
+            for y in range(self.height):
+                yield _CellView(self, (x, y)), x, y
+
+    def iter_occupied(self) -> Iterator[tuple[_CellView, int, int]]:
+        """Every cell holds a cell view, so this is coord_iter."""
+        return self.coord_iter()
+
+    @accept_tuple_argument
+    def get_cell_list_contents(
+        self, cell_list: Iterable[Coordinate]
+    ) -> list[_CellView]:
+        """Return the views of the cells identified in cell_list."""
+        return [_CellView(self, (x, y)) for x, y in cell_list]
+
+
+# Number of agents a ContinuousSpace can hold before growing its buffers.
+_INITIAL_CAPACITY = 100
+
+# Upper bound on the number of bins along one axis when binning the agents of
+# a ContinuousSpace, to keep the integer cell keys from overflowing.
+_MAX_BINS = 2**20
+
+# Bins per agent above which a cell list uses coarser cells, so that a query
+# with a small first radius does not spread few agents over many empty bins.
+_BINS_PER_AGENT = 4
+
+# Number of bins a cell list may always use, however few agents there are.
+_MIN_CELL_LIST_BINS = 1024
+
+
+def _wrapped_bins(
+    lo: float, hi: float, origin: float, extent: float, size: float, n: int, torus: bool
+) -> Iterable[int]:
+    """Return the bin numbers along one axis covered by the interval [lo, hi].
+
+    Bins have width `size` and start at `origin`; there are `n` of them over
+    `extent`. On a torus the parts of the interval falling outside the space
+    are wrapped around before binning.
+    """
+    lo -= origin
+    hi -= origin
+    if not torus:
+        pieces = [(max(lo, 0.0), min(hi, extent))]
+    elif hi - lo >= extent:
+        return range(n)
+    elif lo < 0:
+        pieces = [(lo + extent, extent), (0.0, hi)]
+    elif hi >= extent:
+        pieces = [(lo, extent), (0.0, hi - extent)]
+    else:
+        pieces = [(lo, hi)]
+
+    bins: set[int] = set()
+    for start, stop in pieces:
+        if start > stop:
+            continue
+        first = max(int(start // size), 0)
+        last = min(int(stop // size), n - 1)
+        bins.update(range(first, last + 1))
+    return bins
+
+
+class _CellListIndex:
+    """Spatial index which bins the agents of a ContinuousSpace in a uniform
+    grid of square cells.
+
+    A radius query only has to look at the agents in the cells overlapping
+    the bounding box of the search circle, so its cost depends on the local
+    agent density rather than on the total number of agents. The bins are
+    updated incrementally whenever an agent is placed, moved or removed.
+    """
+
+    def __init__(self, space: ContinuousSpace, cell_size: float | None = None):
+        """Create a new cell list.
+
+        Args:
+            space: The ContinuousSpace to index.
+            cell_size: Side length of the cells. If None, it is set to the
+                       radius of the first radius query, which is the
+                       optimal size when the same radius is used throughout
+                       a run. Rectangle queries made before that bin the
+                       agents about one per cell.
+
+        The agents are binned at the first query. Cells are made larger than
+        asked when there would be more than a few bins per agent, and the
+        agents are binned again if their number grows enough to afford
+        smaller cells.
+        """
+        if cell_size is not None and cell_size <= 0:
+            raise ValueError("cell_size must be positive.")
+        self.space = space
+        self.cell_size: float | None = None
+        self._requested_size = cell_size
+        self._binned_agents = 0
+        self._cells: dict[tuple[int, int], dict[Agent, None]] = {}
+        self._agent_cell: dict[Agent, tuple[int, int]] = {}
+
+    def _default_size(self) -> float:
+        """Return a cell size holding about one agent per cell."""
+        space = self.space
+        return math.sqrt(
+            space.width * space.height / max(len(space._agent_to_index), 1)
+        )
+
+    def _rebuild(self, cell_size: float) -> None:
+        space = self.space
+        self._binned_agents = len(space._agent_to_index)
+        max_bins = max(_BINS_PER_AGENT * self._binned_agents, _MIN_CELL_LIST_BINS)
+        cell_size = max(
+            cell_size,
+            math.sqrt(space.width * space.height / max_bins),
+            space.width / _MAX_BINS,
+            space.height / _MAX_BINS,
+        )
+        self.cell_size = cell_size
+        self._nx = max(math.ceil(space.width / cell_size), 1)
+        self._ny = max(math.ceil(space.height / cell_size), 1)
+        self._cells = {}
+        self._agent_cell = {}
+        for agent in self.space._agent_to_index:
+            self.add(agent, agent.pos)
+
+    def _cell(self, pos: FloatCoordinate) -> tuple[int, int]:
+        space = self.space
+        cx = int((pos[0] - space.x_min) // self.cell_size)
+        cy = int((pos[1] - space.y_min) // self.cell_size)
+        return min(cx, self._nx - 1), min(cy, self._ny - 1)
+
+    def add(self, agent: Agent, pos: FloatCoordinate) -> None:
+        if self.cell_size is None:
+            return
+        cell = self._cell(pos)
+        self._agent_cell[agent] = cell
+        self._cells.setdefault(cell, {})[agent] = None
+
+    def move(self, agent: Agent, pos: FloatCoordinate) -> None:
+        if self.cell_size is None:
+            return
+        cell = self._cell(pos)
+        old_cell = self._agent_cell[agent]
+        if cell != old_cell:
+            self._discard(agent, old_cell)
+            self._agent_cell[agent] = cell
+            self._cells.setdefault(cell, {})[agent] = None
+
+    def remove(self, agent: Agent) -> None:
+        if self.cell_size is None:
+            return
+        self._discard(agent, self._agent_cell.pop(agent))
+
+    def _discard(self, agent: Agent, cell: tuple[int, int]) -> None:
+        bucket = self._cells[cell]
+        del bucket[agent]
+        if not bucket:
+            del self._cells[cell]
+
+    def query(self, pos: FloatCoordinate, radius: float) -> np.ndarray:
+        """Return the sorted indices (into the space's agent array) of all
+        agents that may lie within `radius` of `pos`."""
+        if self._requested_size is None and radius > 0:
+            self._requested_size = radius
+            if self.cell_size is not None:
+                # The agents were binned by density for a rectangle query
+                self._rebuild(radius)
+        x, y = pos
+        return self.query_rect(x - radius, y - radius, x + radius, y + radius)
+
+    def query_rect(
+        self, x_min: float, y_min: float, x_max: float, y_max: float
+    ) -> np.ndarray:
+        """Return the sorted indices (into the space's agent array) of all
+        agents that may lie within the given rectangle."""
+        space = self.space
+        if self.cell_size is None:
+            self._rebuild(self._requested_size or self._default_size())
+        elif len(space._agent_to_index) > 2 * self._binned_agents and (
+            self._requested_size is None or self.cell_size > self._requested_size
+        ):
+            # The cells were sized for fewer agents than there are now
+            self._rebuild(self._requested_size or self._default_size())
+        xs = _wrapped_bins(
+            x_min,
+            x_max,
+            space.x_min,
+            space.width,
+            self.cell_size,
+            self._nx,
+            space.torus,
+        )
+        ys = _wrapped_bins(
+            y_min,
+            y_max,
+            space.y_min,
+            space.height,
+            self.cell_size,
+            self._ny,
+            space.torus,
+        )
+
+        agent_to_index = space._agent_to_index
+        cells = self._cells
+        if len(xs) * len(ys) <= len(cells):
+            keys: Iterable[tuple[int, int]] = itertools.product(xs, ys)
+        else:
+            # The box covers more bins than there are occupied ones
+            keys = (cell for cell in cells if cell[0] in xs and cell[1] in ys)
+        idxs = [
+            agent_to_index[agent]
+            for cell in keys
+            if cell in cells
+            for agent in cells[cell]
+        ]
+        return np.sort(np.array(idxs, dtype=int))
+
+
+class _KDTreeIndex:
+    """Spatial index backed by a scipy KD-tree over the agent positions.
+
+    A KD-tree cannot be updated in place, so any change to the agents only
+    marks the tree as stale; it is rebuilt (in O(N log N)) on the next query.
+    This suits models where many queries are made between moves. Periodic
+    boundaries are handled natively by the tree when the space is a torus.
+    """
+
+    def __init__(self, space: ContinuousSpace) -> None:
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError as e:
+            raise ImportError(
+                "The 'kdtree' spatial index requires scipy to be installed."
+            ) from e
+        self._tree_class = cKDTree
+        self.space = space
+        self._tree = None
+
+    def add(self, agent: Agent, pos: FloatCoordinate) -> None:
+        self._tree = None
+
+    def move(self, agent: Agent, pos: FloatCoordinate) -> None:
+        self._tree = None
+
+    def remove(self, agent: Agent) -> None:
+        self._tree = None
+
+    def _get_tree(self):
+        if self._tree is None:
+            space = self.space
+            self._tree = self._tree_class(
+                space._agent_points - (space.x_min, space.y_min),
+                boxsize=space.size if space.torus else None,
+            )
+        return self._tree
+
+    def _to_tree_coordinates(self, points: npt.ArrayLike) -> np.ndarray:
+        space = self.space
+        points = np.asarray(points, dtype=float) - (space.x_min, space.y_min)
+        if space.torus:
+            points %= space.size
+        return points
+
+    def query(self, pos: FloatCoordinate, radius: float) -> np.ndarray:
+        """Return the sorted indices (into the space's agent array) of all
+        agents within `radius` of `pos`."""
+        idxs = self._get_tree().query_ball_point(self._to_tree_coordinates(pos), radius)
+        return np.sort(np.array(idxs, dtype=int))
+
+    def query_rect(
+        self, x_min: float, y_min: float, x_max: float, y_max: float
+    ) -> np.ndarray:
+        """Return the sorted indices (into the space's agent array) of all
+        agents that may lie within the given rectangle."""
+        center = ((x_min + x_max) / 2, (y_min + y_max) / 2)
+        return self.query(center, math.hypot(x_max - x_min, y_max - y_min) / 2)
+
+    def query_nearest(
+        self, points: npt.ArrayLike, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (M, k) arrays of distances and indices (into the space's
+        agent array) of the k agents nearest to each of the M points."""
+        distances, idxs = self._get_tree().query(self._to_tree_coordinates(points), k)
+        return distances.reshape(len(distances), -1), idxs.reshape(len(idxs), -1)
+
+
 class ContinuousSpace:
     """Continuous space where each agent can have an arbitrary position.
 
     Assumes that all agents are point objects, and have a pos property storing
     their position as an (x, y) tuple.
 
-    This class uses a numpy array internally to store agent objects, to speed
-    up neighborhood lookups. This array is calculated on the first neighborhood
-    lookup, and is reused (and updated) until agents are added or removed.
+    This class uses a numpy array internally to store agent positions, to speed
+    up neighborhood lookups. The array is a view into a buffer that doubles
+    its capacity when full, and removing an agent moves the last agent into
+    its slot, so that adding, moving and removing agents are all O(1).
+
+    Optionally, a spatial index can be used so that a neighborhood lookup only
+    examines the agents close to the query point instead of every agent:
+        "cell_list": agents are binned in a uniform grid of cells, updated
+                     incrementally as agents are placed, moved or removed.
+        "kdtree": agents are stored in a scipy KD-tree, rebuilt lazily after
+                  agents have changed. Requires scipy.
+
+    The space can also store agent attributes as columns of float arrays
+    (structure of arrays), so that they can be updated for all agents at
+    once with numpy. In that case, agent.pos and each declared field (e.g.
+    agent.velocity) are numpy views into a row of the shared arrays, which
+    get_agent_field returns. Such attributes must be updated in place (e.g.
+    agent.velocity += acceleration, or agent.velocity[:] = value); assigning
+    a new array to the attribute detaches it from the space.
     """
 
     _grid = None
@@ -760,6 +3030,9 @@ class ContinuousSpace:
         torus: bool,
         x_min: float = 0,
         y_min: float = 0,
+        spatial_index: str | None = None,
+        cell_size: float | None = None,
+        agent_fields: dict[str, int] | None = None,
     ) -> None:
         """Create a new continuous space.
 
@@ -769,6 +3042,17 @@ class ContinuousSpace:
             x_min, y_min: (default 0) If provided, set the minimum x and y
                           coordinates for the space. Below them, values loop to
                           the other edge (if torus=True) or raise an exception.
+            spatial_index: (default None) "cell_list" or "kdtree" to speed up
+                           neighborhood lookups with a spatial index. If None,
+                           every lookup computes the distance to all agents.
+            cell_size: (default None) Cell side length for the "cell_list"
+                       index. If None, the radius of the first neighborhood
+                       lookup is used.
+            agent_fields: (default None) If not None, store agent positions
+                          and the given fields in shared arrays, and make the
+                          agent attributes views into them. Maps the name of
+                          each agent attribute to its number of components,
+                          e.g. {"velocity": 2}. Pass {} for positions only.
         """
         self.x_min = x_min
         self.x_max = x_max
@@ -780,25 +3064,70 @@ class ContinuousSpace:
         self.size = np.array((self.width, self.height))
         self.torus = torus
 
-        self._agent_points: npt.NDArray[FloatCoordinate] | None = None
+        self._points_buffer = np.empty((_INITIAL_CAPACITY, 2))
+        self._agent_points: npt.NDArray[FloatCoordinate] = self._points_buffer[:0]
         self._index_to_agent: dict[int, Agent] = {}
-        self._agent_to_index: dict[Agent, int | None] = {}
+        self._agent_to_index: dict[Agent, int] = {}
+
+        self._agent_views = agent_fields is not None
+        self._field_buffers: dict[str, np.ndarray] = {}
+        for name, size in (agent_fields or {}).items():
+            if name == "pos":
+                raise ValueError("'pos' is always stored, and not a field.")
+            self._field_buffers[name] = np.zeros((_INITIAL_CAPACITY, size))
+
+        self._index: _CellListIndex | _KDTreeIndex | None
+        if spatial_index is None:
+            self._index = None
+        elif spatial_index == "cell_list":
+            self._index = _CellListIndex(self, cell_size)
+        elif spatial_index == "kdtree":
+            self._index = _KDTreeIndex(self)
+        else:
+            raise ValueError(f"Unknown spatial index: {spatial_index!r}")
+
+    def _grow_buffer(self, capacity: int) -> None:
+        """Reallocate the agent buffers to hold `capacity` agents."""
+        n = len(self._agent_points)
+        buffer = np.empty((capacity, 2))
+        buffer[:n] = self._agent_points
+        self._points_buffer = buffer
+        self._agent_points = buffer[:n]
+        for name, field in self._field_buffers.items():
+            buffer = np.zeros((capacity, field.shape[1]))
+            buffer[:n] = field[:n]
+            self._field_buffers[name] = buffer
+        if self._agent_views:
+            # The agents still hold views into the old buffers
+            for idx, agent in self._index_to_agent.items():
+                self._set_agent_views(agent, idx)
+
+    def _set_agent_views(self, agent: Agent, idx: int) -> None:
+        """Point the stored attributes of an agent to its row of the buffers."""
+        agent.pos = self._points_buffer[idx]
+        for name, field in self._field_buffers.items():
+            setattr(agent, name, field[idx])
+
+    def get_agent_field(self, name: str) -> np.ndarray:
+        """Get the array holding an agent attribute for every agent.
+
+        Only available if the space was created with agent_fields.
 
-    def _build_agent_cache(self):
-        """Cache Agent positions to speed up neighbors calculations."""
-        self._index_to_agent = {}
-        agents = self._agent_to_index.keys()
-        for idx, agent in enumerate(agents):
-            self._agent_to_index[agent] = idx
-            self._index_to_agent[idx] = agent
-        self._agent_points = np.array(
-            [self._index_to_agent[idx].pos for idx in range(len(agents))]
-        )
+        Args:
+            name: Name of a field declared in agent_fields, or "pos".
 
-    def _invalidate_agent_cache(self):
-        """Clear cached data of Agents and positions in the space."""
-        self._agent_points = None
-        self._index_to_agent = {}
+        Returns:
+            An (N, size) array view, with one row per agent, in the same
+            order as the agents returned by get_all_neighbors. Writing to it
+            updates the agents' attributes. Positions should be changed with
+            move_agent instead, so that the space can keep track of them.
+        """
+        if not self._agent_views:
+            raise Exception("The space does not store agent fields.")
+        n = len(self._agent_points)
+        if name == "pos":
+            return self._agent_points
+        return self._field_buffers[name][:n]
 
     def place_agent(self, agent: Agent, pos: FloatCoordinate) -> None:
         """Place a new agent in the space.
@@ -807,10 +3136,87 @@ class ContinuousSpace:
             agent: Agent object to place.
             pos: Coordinate tuple for where to place the agent.
         """
-        self._invalidate_agent_cache()
-        self._agent_to_index[agent] = None
+        if agent in self._agent_to_index:
+            self.move_agent(agent, pos)
+            return
         pos = self.torus_adj(pos)
-        agent.pos = pos
+        idx = len(self._agent_points)
+        if idx == len(self._points_buffer):
+            self._grow_buffer(2 * idx)
+        self._points_buffer[idx] = pos
+        self._agent_points = self._points_buffer[: idx + 1]
+        self._agent_to_index[agent] = idx
+        self._index_to_agent[idx] = agent
+        if self._agent_views:
+            for name, field in self._field_buffers.items():
+                # Start from the agent's own value of the field, if any
+                value = getattr(agent, name, None)
+                field[idx] = 0.0 if value is None else value
+            self._set_agent_views(agent, idx)
+        else:
+            agent.pos = pos
+        if self._index is not None:
+            self._index.add(agent, pos)
+
+    def place_agents(self, agents: Sequence[Agent], positions: npt.ArrayLike) -> None:
+        """Place many agents in the space at once.
+
+        The positions are validated in bulk and copied into the position array
+        in one operation. Agents that are already in the space are moved.
+
+        Args:
+            agents: The agents to place, each at most once.
+            positions: (N, 2) array of coordinates, one row per agent.
+        """
+        points = self.torus_adj_batch(np.reshape(positions, (-1, 2)))
+        if len(points) != len(agents):
+            raise ValueError("There must be one position per agent.")
+        is_new = np.array([agent not in self._agent_to_index for agent in agents])
+        if not is_new.all():
+            self.move_agents(
+                [agent for agent, new in zip(agents, is_new) if not new],
+                points[~is_new],
+            )
+            agents = [agent for agent, new in zip(agents, is_new) if new]
+            points = points[is_new]
+
+        start = len(self._agent_points)
+        end = start + len(agents)
+        if end > len(self._points_buffer):
+            self._grow_buffer(max(2 * len(self._points_buffer), end))
+        self._points_buffer[start:end] = points
+        self._agent_points = self._points_buffer[:end]
+        for idx, agent, pos in zip(range(start, end), agents, points.tolist()):
+            self._agent_to_index[agent] = idx
+            self._index_to_agent[idx] = agent
+            if self._agent_views:
+                for name, field in self._field_buffers.items():
+                    value = getattr(agent, name, None)
+                    field[idx] = 0.0 if value is None else value
+                self._set_agent_views(agent, idx)
+            else:
+                agent.pos = tuple(pos)
+            if self._index is not None:
+                self._index.add(agent, pos)
+
+    def move_agents(self, agents: Sequence[Agent], positions: npt.ArrayLike) -> None:
+        """Move many agents at once.
+
+        Args:
+            agents: The agents to move, each at most once.
+            positions: (N, 2) array of coordinates, one row per agent.
+        """
+        points = self.torus_adj_batch(np.reshape(positions, (-1, 2)))
+        if len(points) != len(agents):
+            raise ValueError("There must be one position per agent.")
+        idxs = [self._agent_to_index[agent] for agent in agents]
+        self._agent_points[idxs] = points
+        if not self._agent_views:
+            for agent, pos in zip(agents, points.tolist()):
+                agent.pos = tuple(pos)
+        if self._index is not None:
+            for agent, pos in zip(agents, points.tolist()):
+                self._index.move(agent, pos)
 
     def move_agent(self, agent: Agent, pos: FloatCoordinate) -> None:
         """Move an agent from its current position to a new position.
@@ -820,14 +3226,13 @@ class ContinuousSpace:
             pos: Coordinate tuple to move the agent to.
         """
         pos = self.torus_adj(pos)
-        agent.pos = pos
-
-        if self._agent_points is not None:
-            # instead of invalidating the full cache,
-            # apply the move to the cached values
-            idx = self._agent_to_index[agent]
-            self._agent_points[idx, 0] = pos[0]
-            self._agent_points[idx, 1] = pos[1]
+        idx = self._agent_to_index[agent]
+        self._agent_points[idx, 0] = pos[0]
+        self._agent_points[idx, 1] = pos[1]
+        if not self._agent_views:
+            agent.pos = pos
+        if self._index is not None:
+            self._index.move(agent, pos)
 
     def remove_agent(self, agent: Agent) -> None:
         """Remove an agent from the simulation.
@@ -837,9 +3242,25 @@ class ContinuousSpace:
         """
         if agent not in self._agent_to_index:
             raise Exception("Agent does not exist in the space")
-        self._agent_to_index.pop(agent)
-
-        self._invalidate_agent_cache()
+        idx = self._agent_to_index.pop(agent)
+        for name, field in self._field_buffers.items():
+            # Detach the agent's fields from the buffers, keeping their value
+            setattr(agent, name, field[idx].copy())
+        last = len(self._agent_points) - 1
+        if idx != last:
+            # Fill the hole with the last agent to keep the arrays contiguous
+            last_agent = self._index_to_agent[last]
+            self._agent_points[idx] = self._agent_points[last]
+            for field in self._field_buffers.values():
+                field[idx] = field[last]
+            self._agent_to_index[last_agent] = idx
+            self._index_to_agent[idx] = last_agent
+            if self._agent_views:
+                self._set_agent_views(last_agent, idx)
+        del self._index_to_agent[last]
+        self._agent_points = self._points_buffer[:last]
+        if self._index is not None:
+            self._index.remove(agent)
         agent.pos = None
 
     def get_neighbors(
@@ -855,20 +3276,255 @@ class ContinuousSpace:
                             neighbors of a given agent, True will include that
                             agent in the results.
         """
-        if self._agent_points is None:
-            self._build_agent_cache()
+        if self._index is None:
+            candidates = None
+            points = self._agent_points
+        else:
+            # Only the agents the spatial index considers close enough
+            candidates = self._index.query(pos, radius)
+            points = self._agent_points[candidates]
 
-        deltas = np.abs(self._agent_points - np.array(pos))
+        deltas = np.abs(points - np.array(pos))
         if self.torus:
             deltas = np.minimum(deltas, self.size - deltas)
         dists = deltas[:, 0] ** 2 + deltas[:, 1] ** 2
 
         (idxs,) = np.where(dists <= radius**2)
-        neighbors = [
-            self._index_to_agent[x] for x in idxs if include_center or dists[x] > 0
-        ]
+        if not include_center:
+            idxs = idxs[dists[idxs] > 0]
+        if candidates is not None:
+            idxs = candidates[idxs]
+        neighbors = [self._index_to_agent[x] for x in idxs]
         return neighbors
 
+    def get_all_neighbors(
+        self, radius: float, include_center: bool = False
+    ) -> tuple[list[Agent], np.ndarray, np.ndarray, np.ndarray]:
+        """Get the neighbors of every agent in the space in one vectorized pass.
+
+        The result is equivalent to calling
+        get_neighbors(agent.pos, radius, include_center) for every agent, but
+        is returned in compressed sparse row (CSR) form: the neighbors of
+        agents[i] are agents[j] for j in indices[offsets[i]:offsets[i + 1]],
+        sorted by j, and distances holds the matching distances.
+
+        Args:
+            radius: Get all the objects within this distance of each agent.
+            include_center: If True, include objects at the *exact* position
+                            of an agent, i.e. the agent itself, as neighbors.
+
+        Returns:
+            A tuple (agents, offsets, indices, distances), where agents is the
+            list of agents in the space, offsets an int array of length
+            len(agents) + 1, and indices and distances arrays holding the
+            neighbor index and distance of each neighbor pair.
+        """
+        points = self._agent_points
+        n = len(points)
+        agents = [self._index_to_agent[i] for i in range(n)]
+
+        # Bin the agents in cells at least `radius` wide, so that all the
+        # neighbors of an agent are in its own cell or the 8 around it.
+        num_bins = []
+        for extent in (self.width, self.height):
+            bins = int(extent // radius) if radius > 0 else _MAX_BINS
+            num_bins.append(min(max(bins, 1), _MAX_BINS))
+        nx, ny = num_bins
+        rel = (points - (self.x_min, self.y_min)) / self.size
+        cx = np.minimum((rel[:, 0] * nx).astype(np.int64), nx - 1)
+        cy = np.minimum((rel[:, 1] * ny).astype(np.int64), ny - 1)
+        order = np.argsort(cx * ny + cy, kind="stable")
+        sorted_keys = (cx * ny + cy)[order]
+
+        if self.torus:
+            x_offsets = sorted({d % nx for d in (-1, 0, 1)})
+            y_offsets = sorted({d % ny for d in (-1, 0, 1)})
+        else:
+            x_offsets = y_offsets = [-1, 0, 1]
+
+        sources = []
+        targets = []
+        for dx, dy in itertools.product(x_offsets, y_offsets):
+            tx = cx + dx
+            ty = cy + dy
+            if self.torus:
+                tx %= nx
+                ty %= ny
+            target_keys = tx * ny + ty
+            start = np.searchsorted(sorted_keys, target_keys, side="left")
+            stop = np.searchsorted(sorted_keys, target_keys, side="right")
+            counts = stop - start
+            if not self.torus:
+                counts[(tx < 0) | (tx >= nx) | (ty < 0) | (ty >= ny)] = 0
+            # Expand every agent into one candidate pair per agent found in
+            # the target cell.
+            ramp = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            sources.append(np.repeat(np.arange(n), counts))
+            targets.append(order[np.repeat(start, counts) + ramp])
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+
+        deltas = np.abs(points[sources] - points[targets])
+        if self.torus:
+            deltas = np.minimum(deltas, self.size - deltas)
+        dists = deltas[:, 0] ** 2 + deltas[:, 1] ** 2
+        mask = dists <= radius**2
+        if not include_center:
+            mask &= dists > 0
+        sources, targets, dists = sources[mask], targets[mask], dists[mask]
+
+        pair_order = np.lexsort((targets, sources))
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+        return agents, offsets, targets[pair_order], np.sqrt(dists[pair_order])
+
+    def _squared_distances(self, pos: FloatCoordinate, idxs: np.ndarray) -> np.ndarray:
+        """Squared distances from pos to the agents at the given indices."""
+        deltas = np.abs(self._agent_points[idxs] - np.array(pos))
+        if self.torus:
+            deltas = np.minimum(deltas, self.size - deltas)
+        return deltas[:, 0] ** 2 + deltas[:, 1] ** 2
+
+    def _k_nearest(
+        self, pos: FloatCoordinate, k: int, include_center: bool
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Indices and distances of the k agents nearest to pos, sorted by
+        distance and then by index."""
+        n = len(self._agent_points)
+        if self._index is None or k >= n:
+            candidates = np.arange(n)
+            dists = self._squared_distances(pos, candidates)
+        else:
+            # Start from the radius expected to hold k agents if they were
+            # spread uniformly, and double it until it holds at least k: the
+            # k nearest agents are then among the candidates found.
+            radius = math.sqrt(self.width * self.height * k / (math.pi * n))
+            max_radius = math.hypot(self.width, self.height)
+            while True:
+                candidates = self._index.query(pos, radius)
+                dists = self._squared_distances(pos, candidates)
+                within = dists <= radius**2
+                if not include_center:
+                    within &= dists > 0
+                if within.sum() >= k or radius >= max_radius:
+                    break
+                radius *= 2
+        if not include_center:
+            candidates, dists = candidates[dists > 0], dists[dists > 0]
+        order = np.lexsort((candidates, dists))[:k]
+        return candidates[order], np.sqrt(dists[order])
+
+    def get_k_nearest(
+        self, pos: FloatCoordinate, k: int, include_center: bool = True
+    ) -> list[Agent]:
+        """Get the k objects closest to a point.
+
+        Args:
+            pos: (x,y) coordinate tuple to center the search at.
+            k: Number of objects to get. Fewer are returned if the space
+               holds fewer objects.
+            include_center: If True, objects at the *exact* provided
+                            coordinates can be included in the results.
+
+        Returns:
+            A list of at most k agents, nearest first.
+        """
+        idxs, _ = self._k_nearest(pos, k, include_center)
+        return [self._index_to_agent[x] for x in idxs]
+
+    def get_k_nearest_batch(
+        self, positions: npt.ArrayLike, k: int, include_center: bool = True
+    ) -> tuple[list[Agent], np.ndarray, np.ndarray]:
+        """Get the k objects closest to each of many points.
+
+        Args:
+            positions: (M, 2) array of coordinates to center the searches at.
+            k: Number of objects to get for each point.
+            include_center: If True, objects at the *exact* provided
+                            coordinates can be included in the results.
+
+        Returns:
+            A tuple (agents, indices, distances), where agents is the list of
+            agents in the space, and indices and distances are (M, k) arrays
+            holding, nearest first, the index in agents and the distance of
+            the k agents closest to each point. If the space holds fewer than
+            k objects, rows are padded with index -1 and distance inf.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        n = len(self._agent_points)
+        agents = [self._index_to_agent[i] for i in range(n)]
+        indices = np.full((len(positions), k), -1, dtype=int)
+        distances = np.full((len(positions), k), np.inf)
+        if isinstance(self._index, _KDTreeIndex) and include_center and n > 0:
+            dists, idxs = self._index.query_nearest(positions, k)
+            found = idxs < n
+            indices[found] = idxs[found]
+            distances[found] = dists[found]
+        else:
+            for row, pos in enumerate(positions):
+                idxs, dists = self._k_nearest(pos, k, include_center)
+                indices[row, : len(idxs)] = idxs
+                distances[row, : len(idxs)] = dists
+        return agents, indices, distances
+
+    def _agents_in_rect(
+        self, x_min: float, y_min: float, x_max: float, y_max: float
+    ) -> np.ndarray:
+        """Sorted indices of the agents within the given rectangle."""
+        if self._index is None:
+            candidates = np.arange(len(self._agent_points))
+        else:
+            candidates = self._index.query_rect(x_min, y_min, x_max, y_max)
+        offsets = self._agent_points[candidates] - (x_min, y_min)
+        if self.torus:
+            # Measure the offsets from the lower corner along the wrap
+            offsets %= self.size
+        inside = np.all(
+            (offsets >= 0) & (offsets <= (x_max - x_min, y_max - y_min)), axis=1
+        )
+        return candidates[inside]
+
+    def get_agents_in_rect(
+        self, x_min: float, y_min: float, x_max: float, y_max: float
+    ) -> list[Agent]:
+        """Get all objects within an axis-aligned rectangle.
+
+        On a toroidal space the rectangle can extend past the edges of the
+        space, and then wraps around.
+
+        Args:
+            x_min, y_min: Coordinates of the lower-left corner.
+            x_max, y_max: Coordinates of the upper-right corner.
+
+        Returns:
+            A list of the agents in the rectangle, edges included.
+        """
+        idxs = self._agents_in_rect(x_min, y_min, x_max, y_max)
+        return [self._index_to_agent[x] for x in idxs]
+
+    def get_agents_in_rect_batch(
+        self, rects: npt.ArrayLike
+    ) -> tuple[list[Agent], np.ndarray, np.ndarray]:
+        """Get all objects within each of many axis-aligned rectangles.
+
+        Args:
+            rects: (M, 4) array of (x_min, y_min, x_max, y_max) rectangles.
+
+        Returns:
+            A tuple (agents, offsets, indices) in compressed sparse row form:
+            the agents in rectangle i are agents[j] for j in
+            indices[offsets[i]:offsets[i + 1]].
+        """
+        rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+        agents = [self._index_to_agent[i] for i in range(len(self._agent_points))]
+        results = [self._agents_in_rect(*rect) for rect in rects]
+        offsets = np.zeros(len(rects) + 1, dtype=np.int64)
+        np.cumsum([len(idxs) for idxs in results], out=offsets[1:])
+        indices = np.concatenate(results) if results else np.empty(0, dtype=int)
+        return agents, offsets, indices
+
     def get_heading(
         self, pos_1: FloatCoordinate, pos_2: FloatCoordinate
     ) -> FloatCoordinate:
@@ -877,16 +3533,35 @@ class ContinuousSpace:
         Args:
             pos_1, pos_2: Coordinate tuples for both points.
         """
-        one = np.array(pos_1)
-        two = np.array(pos_2)
+        heading = np.array(pos_2) - np.array(pos_1)
         if self.torus:
-            one = (one - self.center) % self.size
-            two = (two - self.center) % self.size
-        heading = two - one
+            # Minimum image: the shortest of the headings to pos_2 and to
+            # its periodic copies.
+            heading = (heading + self.size / 2) % self.size - self.size / 2
         if isinstance(pos_1, tuple):
             heading = tuple(heading)
         return heading
 
+    def get_heading_batch(
+        self, pos_1: npt.ArrayLike, pos_2: npt.ArrayLike
+    ) -> np.ndarray:
+        """Get the headings between many pairs of points, accounting for
+        toroidal space.
+
+        Args:
+            pos_1, pos_2: (N, 2) arrays of coordinates. Either can also be a
+                          single coordinate, which is paired with every point
+                          of the other.
+
+        Returns:
+            An (N, 2) array with the heading from each point of pos_1 to the
+            matching point of pos_2.
+        """
+        heading = np.asarray(pos_2, dtype=float) - np.asarray(pos_1, dtype=float)
+        if self.torus:
+            heading = (heading + self.size / 2) % self.size - self.size / 2
+        return heading
+
     def get_distance(self, pos_1: FloatCoordinate, pos_2: FloatCoordinate) -> float:
         """Get the distance between two point, accounting for toroidal space.
 
@@ -903,6 +3578,25 @@ class ContinuousSpace:
             dy = min(dy, self.height - dy)
         return math.sqrt(dx * dx + dy * dy)
 
+    def get_distance_batch(
+        self, pos_1: npt.ArrayLike, pos_2: npt.ArrayLike
+    ) -> np.ndarray:
+        """Get the distances between many pairs of points, accounting for
+        toroidal space.
+
+        Args:
+            pos_1, pos_2: (N, 2) arrays of coordinates. Either can also be a
+                          single coordinate, which is paired with every point
+                          of the other.
+
+        Returns:
+            An array with the N distances.
+        """
+        deltas = np.abs(np.asarray(pos_1, dtype=float) - np.asarray(pos_2, dtype=float))
+        if self.torus:
+            deltas = np.minimum(deltas, self.size - deltas)
+        return np.hypot(deltas[..., 0], deltas[..., 1])
+
     def torus_adj(self, pos: FloatCoordinate) -> FloatCoordinate:
         """Adjust coordinates to handle torus looping.
 
@@ -925,19 +3619,254 @@ class ContinuousSpace:
             else:
                 return np.array((x, y))
 
+    def torus_adj_batch(self, positions: npt.ArrayLike) -> np.ndarray:
+        """Adjust many coordinates at once to handle torus looping.
+
+        Args:
+            positions: (N, 2) array of coordinates to convert.
+
+        Returns:
+            A new (N, 2) array with every point moved within the space.
+        """
+        positions = np.array(positions, dtype=float)
+        out_of_bounds = self.out_of_bounds_batch(positions)
+        if not out_of_bounds.any():
+            return positions
+        elif not self.torus:
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        origin = np.array((self.x_min, self.y_min))
+        return origin + (positions - origin) % self.size
+
     def out_of_bounds(self, pos: FloatCoordinate) -> bool:
         """Check if a point is out of bounds."""
         x, y = pos
         return x < self.x_min or x >= self.x_max or y < self.y_min or y >= self.y_max
 
+    def out_of_bounds_batch(self, positions: npt.ArrayLike) -> np.ndarray:
+        """Check which of many points are out of bounds.
+
+        Args:
+            positions: (N, 2) array of coordinates.
+
+        Returns:
+            A boolean array, True for each point outside the space.
+        """
+        positions = np.asarray(positions)
+        x, y = positions[..., 0], positions[..., 1]
+        return (
+            (x < self.x_min) | (x >= self.x_max) | (y < self.y_min) | (y >= self.y_max)
+        )
+
+
+# Node ids in number order, node numbers by id, and the CSR indptr and indices
+_NetworkCSR = Tuple[List[Any], Dict[Any, int], np.ndarray, np.ndarray]
+
 
 class NetworkGrid:
-    """Network Grid where each node contains zero or more agents."""
+    """Network Grid where each node contains zero or more agents.
+
+    Neighbor lookups read a snapshot of the graph's adjacency: the nodes are
+    numbered 0..n-1 in graph order, and the neighbors of node number i are
+    kept in a list, and in compressed sparse row (CSR) form as
+    indices[indptr[i]:indptr[i + 1]]. Edits made through the grid's
+    add_node, remove_node, add_edge and remove_edge methods patch the
+    snapshot in place, and the CSR arrays are rebuilt lazily.
+
+    After editing G directly, call refresh(). Nodes added or removed
+    directly are detected from the node count, and get_neighbors detects a
+    changed degree of the node it looks up; other direct edge edits, such
+    as those read by the CSR arrays, go unnoticed until refresh() is called.
+
+    The agents of each node are kept in a list-like container with O(1)
+    adding and removal, in a list indexed by node number. Unless told
+    otherwise, the grid also publishes each container as the node's "agent"
+    attribute in G, for visualization.
+    """
+
+    def __init__(self, G: Any, publish_agents: bool = True) -> None:
+        """Create a new network grid.
 
-    def __init__(self, G: Any) -> None:
+        Args:
+            G: The networkx graph.
+            publish_agents: Whether to expose the agents of each node as
+                G.nodes[node_id]["agent"].
+        """
         self.G = G
-        for node_id in self.G.nodes:
-            G.nodes[node_id]["agent"] = list()
+        self.publish_agents = publish_agents
+        # Adjacency snapshot: the node ids by number, the node numbers by id,
+        # the neighbor ids of each node, and the CSR arrays built from them
+        # (None when stale); and the agent containers by node number
+        self._nodes: list[Any] = []
+        self._numbers: dict[Any, int] = {}
+        self._neighbor_lists: list[list[Any]] = []
+        self._arrays: tuple[np.ndarray, np.ndarray] | None = None
+        self._contents: list[_CellAgents] = []
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Rebuild the adjacency snapshot and the node containers, after G
+        was edited directly."""
+        nodes = list(self.G)
+        numbers = {node_id: i for i, node_id in enumerate(nodes)}
+        adjacency = self.G.adj
+        self._neighbor_lists = [list(adjacency[node_id]) for node_id in nodes]
+        self._arrays = None
+        self._layout_contents(nodes, numbers)
+        self._nodes = nodes
+
+    def _sync(self) -> None:
+        """Rebuild the snapshot if nodes were added to or removed from G
+        directly, which shows in the node count."""
+        if len(self.G) != len(self._nodes):
+            self.refresh()
+
+    def _get_csr(self) -> _NetworkCSR:
+        """Return the node list, the node numbers by node id, and the CSR
+        indptr and indices arrays, rebuilding the arrays if stale."""
+        self._sync()
+        if self._arrays is None:
+            numbers, neighbor_lists = self._numbers, self._neighbor_lists
+            indptr = np.zeros(len(neighbor_lists) + 1, dtype=np.int64)
+            np.cumsum([len(neighbors) for neighbors in neighbor_lists], out=indptr[1:])
+            indices = np.fromiter(
+                (numbers[other] for neighbors in neighbor_lists for other in neighbors),
+                dtype=np.int64,
+                count=indptr[-1],
+            )
+            indptr.setflags(write=False)
+            indices.setflags(write=False)
+            self._arrays = (indptr, indices)
+        return (self._nodes, self._numbers, *self._arrays)
+
+    def _layout_contents(self, nodes: list[Any], numbers: dict[Any, int]) -> None:
+        """Order the agent containers by the new node numbers, keeping those
+        of the nodes still in the graph."""
+        previous = dict(zip(self._numbers, self._contents))
+        self._contents = [
+            _CellAgents() if previous.get(node_id) is None else previous[node_id]
+            for node_id in nodes
+        ]
+        self._numbers = numbers
+        if self.publish_agents:
+            for node_id, contents in zip(nodes, self._contents):
+                self.G.nodes[node_id]["agent"] = contents
+
+    @property
+    def nodes(self) -> list[Any]:
+        """The node ids, in node number order."""
+        self._sync()
+        return self._nodes
+
+    def get_node_number(self, node_id: Any) -> int:
+        """Return the dense number (0..n-1) of a node."""
+        self._sync()
+        return self._numbers[node_id]
+
+    def get_csr(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the read-only indptr and indices arrays of the adjacency
+        snapshot, over node numbers."""
+        _, _, indptr, indices = self._get_csr()
+        return indptr, indices
+
+    def get_neighbor_numbers(self, number: int) -> np.ndarray:
+        """Return the node numbers of the neighbors of the node with the
+        given number, as a read-only array slice."""
+        _, _, indptr, indices = self._get_csr()
+        return indices[indptr[number] : indptr[number + 1]]
+
+    def sum_neighbors(self, values: npt.ArrayLike) -> np.ndarray:
+        """Sum a per-node array over the neighbors of every node at once.
+
+        Args:
+            values: An array with one value per node number.
+
+        Returns:
+            An array holding, for each node number, the total of values over
+            its neighbors (its successors, in a directed graph). Integer and
+            boolean values are summed as int64, floats as float64.
+        """
+        _, _, indptr, indices = self._get_csr()
+        values = np.asarray(values)
+        if values.dtype.kind in "biu":
+            values = values.astype(np.int64)
+        elif values.dtype.kind == "f":
+            values = values.astype(np.float64)
+        totals = np.zeros(len(indptr) - 1, dtype=values.dtype)
+        # reduceat sums each CSR row; rows of nodes without neighbors are
+        # skipped, since reduceat would return the next value for them
+        starts = indptr[:-1]
+        has_neighbors = starts < indptr[1:]
+        if has_neighbors.any():
+            totals[has_neighbors] = np.add.reduceat(
+                values[indices], starts[has_neighbors]
+            )
+        return totals
+
+    def count_neighbors(self, mask: npt.ArrayLike) -> np.ndarray:
+        """Count, for every node number, the neighbors for which the boolean
+        per-node mask is true, e.g. states == INFECTED."""
+        return self.sum_neighbors(np.asarray(mask, dtype=bool))
+
+    def get_exposure_probability(
+        self, infectious: npt.ArrayLike, probability: npt.ArrayLike
+    ) -> np.ndarray:
+        """Return, for every node number, the chance of being reached by at
+        least one infectious neighbor, when each one independently transmits
+        with the given probability (a scalar, or one value per node)."""
+        counts = self.count_neighbors(infectious)
+        return 1 - (1 - np.asarray(probability, dtype=float)) ** counts
+
+    @staticmethod
+    def draw_bernoulli(probabilities: npt.ArrayLike, rng: Any) -> np.ndarray:
+        """Draw one independent success per entry of probabilities, at once.
+
+        Args:
+            probabilities: Array of success probabilities.
+            rng: random.Random instance, e.g. model.random, that seeds the
+                 vectorized draws so that runs are reproducible.
+
+        Returns:
+            A boolean array of the successes.
+        """
+        probabilities = np.asarray(probabilities, dtype=float)
+        draws = np.random.default_rng(rng.getrandbits(64)).random(probabilities.shape)
+        return draws < probabilities
+
+    def spread(
+        self,
+        states: npt.ArrayLike,
+        infectious_state: Any,
+        susceptible_state: Any,
+        probability: npt.ArrayLike,
+        rng: Any,
+    ) -> np.ndarray:
+        """Run one synchronous round of contagion over the whole network.
+
+        Every node in susceptible_state with infectious neighbors takes on
+        infectious_state with its exposure probability, as in SIR or SIS
+        models. All nodes are updated from the states at the start of the
+        round.
+
+        Args:
+            states: Array of the state of each node, by node number.
+            infectious_state: The state that spreads.
+            susceptible_state: The state that can catch it.
+            probability: Chance that one infectious neighbor transmits, a
+                         scalar or one value per node.
+            rng: random.Random instance seeding the draws, e.g. model.random.
+
+        Returns:
+            The new array of states; the input array is left unchanged.
+        """
+        states = np.asarray(states)
+        exposure = self.get_exposure_probability(
+            states == infectious_state, probability
+        )
+        exposure[states != susceptible_state] = 0
+        infected = self.draw_bernoulli(exposure, rng)
+        new_states = states.copy()
+        new_states[infected] = infectious_state
+        return new_states
 
     def place_agent(self, agent: Agent, node_id: int) -> None:
         """Place a agent in a node."""
@@ -948,12 +3877,88 @@ class NetworkGrid:
     def get_neighbors(self, node_id: int, include_center: bool = False) -> list[int]:
         """Get all adjacent nodes"""
 
-        neighbors = list(self.G.neighbors(node_id))
+        # A node or edges edited in G directly show as an unknown node or a
+        # changed degree. G._adj is read rather than G.adj, which builds a
+        # view on every access.
+        number = self._numbers.get(node_id)
+        if number is None or len(self._neighbor_lists[number]) != len(
+            self.G._adj[node_id]
+        ):
+            self.refresh()
+            number = self._numbers[node_id]
+        neighbors = self._neighbor_lists[number].copy()
         if include_center:
             neighbors.append(node_id)
 
         return neighbors
 
+    def add_node(self, node_id: Any) -> None:
+        """Add an empty node to the graph."""
+        self._sync()
+        if node_id in self.G:
+            return
+        self.G.add_node(node_id)
+        self._numbers[node_id] = len(self._nodes)
+        self._nodes.append(node_id)
+        self._neighbor_lists.append([])
+        contents = _CellAgents()
+        self._contents.append(contents)
+        if self.publish_agents:
+            self.G.nodes[node_id]["agent"] = contents
+        self._arrays = None
+
+    def remove_node(self, node_id: Any) -> None:
+        """Remove an empty node, and its edges, from the graph."""
+        if not self.is_cell_empty(node_id):
+            raise Exception("Node not empty")
+        G = self.G
+        linked = G.pred[node_id] if G.is_directed() else G.adj[node_id]
+        linked = [other for other in linked if other != node_id]
+        G.remove_node(node_id)
+        nodes, numbers = self._nodes, self._numbers
+        number = numbers.pop(node_id)
+        del nodes[number]
+        del self._neighbor_lists[number]
+        del self._contents[number]
+        # The nodes after the removed one move down by one number
+        for i in range(number, len(nodes)):
+            numbers[nodes[i]] = i
+        for other in linked:
+            self._neighbor_lists[numbers[other]].remove(node_id)
+        self._arrays = None
+
+    def add_edge(self, u: Any, v: Any) -> None:
+        """Add an edge between two existing nodes."""
+        if u not in self.G or v not in self.G:
+            raise ValueError("Both nodes must be in the graph.")
+        self._sync()
+        self.G.add_edge(u, v)
+        self._link(u, v)
+        if not self.G.is_directed():
+            self._link(v, u)
+
+    def remove_edge(self, u: Any, v: Any) -> None:
+        """Remove the edge between two nodes."""
+        self._sync()
+        self.G.remove_edge(u, v)
+        # Parallel edges of a multigraph may remain
+        if not self.G.has_edge(u, v):
+            self._unlink(u, v)
+            if not self.G.is_directed() and u != v:
+                self._unlink(v, u)
+
+    def _link(self, u: Any, v: Any) -> None:
+        """Add v to the neighbors of u in the snapshot, if missing."""
+        neighbors = self._neighbor_lists[self._numbers[u]]
+        if v not in neighbors:
+            neighbors.append(v)
+            self._arrays = None
+
+    def _unlink(self, u: Any, v: Any) -> None:
+        """Remove v from the neighbors of u in the snapshot."""
+        self._neighbor_lists[self._numbers[u]].remove(v)
+        self._arrays = None
+
     def move_agent(self, agent: Agent, node_id: int) -> None:
         """Move an agent from its current node to a new node."""
 
@@ -961,20 +3966,25 @@ class NetworkGrid:
         self._place_agent(agent, node_id)
         agent.pos = node_id
 
+    def _node_contents(self, node_id: Any) -> _CellAgents:
+        """Return the agent container of a node."""
+        self._sync()
+        return self._contents[self._numbers[node_id]]
+
     def _place_agent(self, agent: Agent, node_id: int) -> None:
         """Place the agent at the correct node."""
 
-        self.G.nodes[node_id]["agent"].append(agent)
+        self._node_contents(node_id).append(agent)
 
     def remove_agent(self, agent: Agent) -> None:
         """Remove the agent from the network and set its pos attribute to None."""
         node_id = agent.pos
-        self.G.nodes[node_id]["agent"].remove(agent)
+        self._node_contents(node_id).remove(agent)
         agent.pos = None
 
     def is_cell_empty(self, node_id: int) -> bool:
         """Returns a bool of the contents of a cell."""
-        return not self.G.nodes[node_id]["agent"]
+        return not self._node_contents(node_id)
 
     def get_cell_list_contents(self, cell_list: list[int]) -> list[GridContent]:
         """Returns the contents of a list of cells ((x,y) tuples)
@@ -985,14 +3995,12 @@ class NetworkGrid:
     def get_all_cell_contents(self) -> list[GridContent]:
         """Returns a list of the contents of the cells
         identified in cell_list."""
-        return list(self.iter_cell_list_contents(self.G))
+        self._sync()
+        return [agent for contents in self._contents for agent in contents]
 
     def iter_cell_list_contents(self, cell_list: list[int]) -> list[GridContent]:
         """Returns an iterator of the contents of the cells
         identified in cell_list."""
-        list_of_lists = [
-            self.G.nodes[node_id]["agent"]
-            for node_id in cell_list
-            if not self.is_cell_empty(node_id)
-        ]
-        return [item for sublist in list_of_lists for item in sublist]
+        self._sync()
+        contents, numbers = self._contents, self._numbers
+        return [agent for node_id in cell_list for agent in contents[numbers[node_id]]]
@@ -116,13 +116,10 @@ class TextGrid(ASCIIElement):
 
     def render(self):
         """What to show when printed."""
-        viz = ""
-        for y in range(self.grid.height):
-            for x in range(self.grid.width):
-                c = self.grid[y][x]
-                if c is None:
-                    viz += " "
-                else:
-                    viz += self.converter(c)
-            viz += "\n"
-        return viz
+        # Fill in a blank grid, converting only the occupied cells
+        empty = self.grid.default_val()
+        blank = " " if empty is None else self.converter(empty)
+        rows = [[blank] * self.grid.height for _ in range(self.grid.width)]
+        for c, x, y in self.grid.iter_occupied():
+            rows[x][y] = self.converter(c)
+        return "".join("".join(row) + "\n" for row in rows)
@@ -1,9 +1,21 @@
 """
 Test the Grid objects.
 """
+import itertools
 import random
 import unittest
-from mesa.space import Grid, SingleGrid, MultiGrid, HexGrid
+import pytest
+import numpy as np
+from mesa.space import (
+    CellularAutomaton,
+    Grid,
+    HexGrid,
+    LayeredGrid,
+    MultiGrid,
+    PropertyLayer,
+    SingleGrid,
+    SummedAreaTable,
+)
 
 # Initial agent positions for testing
 #
@@ -128,6 +140,78 @@ class TestBaseGrid(unittest.TestCase):
         neighbors = self.grid.get_neighbors((1, 3), moore=False, radius=2)
         assert len(neighbors) == 2
 
+    def test_neighborhood_stencils(self):
+        """
+        Test that the stencil-based neighborhoods match a direct computation.
+        """
+        grid = Grid(7, 6, self.torus)
+        for x, y in itertools.product(range(7), range(6)):
+            for moore, include_center, radius in itertools.product(
+                [True, False], [True, False], [1, 2, 4]
+            ):
+                expected = set()
+                for dx, dy in itertools.product(range(-radius, radius + 1), repeat=2):
+                    if (dx, dy) == (0, 0) and not include_center:
+                        continue
+                    if not moore and abs(dx) + abs(dy) > radius:
+                        continue
+                    coord = (x + dx, y + dy)
+                    if grid.out_of_bounds(coord):
+                        if not self.torus:
+                            continue
+                        coord = grid.torus_adj(coord)
+                    expected.add(coord)
+                neighborhood = grid.get_neighborhood(
+                    (x, y), moore, include_center, radius
+                )
+                assert neighborhood == sorted(expected)
+
+    def test_neighborhood_cache(self):
+        """
+        Test that the neighborhood cache stays within its bound.
+        """
+        grid = Grid(10, 10, self.torus, neighborhood_cache_size=50)
+        first = grid.get_neighborhood((5, 5), moore=True)
+        assert grid.get_neighborhood((5, 5), moore=True) is first
+        for x in range(10):
+            grid.get_neighborhood((x, 2), moore=True)
+            assert grid._neighborhood_cache.size <= 50
+        assert grid.get_neighborhood((5, 5), moore=True) is not first
+        assert grid.get_neighborhood((5, 5), moore=True) == first
+
+        grid = Grid(10, 10, self.torus, neighborhood_cache_size=0)
+        assert grid.get_neighborhood((5, 5), moore=True) == first
+        assert len(grid._neighborhood_cache) == 0
+
+    def test_neighbor_aggregates(self):
+        """
+        Test the grid-wide neighbor counts and sums against get_neighbors.
+        """
+        rng = random.Random(0)
+        for grid in [Grid(6, 5, self.torus), MultiGrid(6, 5, self.torus)]:
+            for i in range(20):
+                pos = (rng.randrange(6), rng.randrange(5))
+                if isinstance(grid, MultiGrid) or grid.is_cell_empty(pos):
+                    grid.place_agent(MockAgent(i, None), pos)
+
+            for moore, include_center, radius in itertools.product(
+                [True, False], [True, False], [1, 2]
+            ):
+                counts = grid.get_neighbor_counts(None, moore, include_center, radius)
+                odd = grid.get_neighbor_counts(
+                    lambda agent: agent.unique_id % 2, moore, include_center, radius
+                )
+                sums = grid.get_neighbor_sums(
+                    "unique_id", moore, include_center, radius
+                )
+                for x, y in itertools.product(range(6), range(5)):
+                    neighbors = grid.get_neighbors(
+                        (x, y), moore, include_center, radius
+                    )
+                    assert counts[x, y] == len(neighbors)
+                    assert odd[x, y] == sum(a.unique_id % 2 for a in neighbors)
+                    assert sums[x, y] == sum(a.unique_id for a in neighbors)
+
     def test_coord_iter(self):
         ci = self.grid.coord_iter()
 
@@ -168,6 +252,22 @@ class TestBaseGrid(unittest.TestCase):
         assert agent.pos is None
         assert self.grid.grid[x][y] is None
 
+    def test_out_of_bounds_placement(self):
+        agent = MockAgent(100, None)
+        if not self.torus:
+            with self.assertRaises(Exception):
+                self.grid.place_agent(agent, (0, self.grid.height))
+            assert agent.pos is None
+            assert self.grid.is_cell_empty((1, 0))
+            with self.assertRaises(Exception):
+                self.grid.is_cell_empty((2, 7))
+        else:
+            self.grid.place_agent(agent, (1, -1))
+            assert self.grid[1][self.grid.height - 1] is agent
+            assert not self.grid.is_cell_empty((1, -1))
+            self.grid.remove_agent(agent)
+            assert self.grid.is_cell_empty((1, self.grid.height - 1))
+
 
 class TestBaseGridTorus(TestBaseGrid):
     """
@@ -211,13 +311,15 @@ class TestSingleGrid(unittest.TestCase):
     work here too. Instead, this tests the enforcement.
     """
 
+    sparse = False
+
     def setUp(self):
         """
         Create a test non-toroidal grid and populate it with Mock Agents
         """
         width = 3
         height = 5
-        self.grid = SingleGrid(width, height, True)
+        self.grid = SingleGrid(width, height, True, sparse=self.sparse)
         self.agents = []
         counter = 0
         for x in range(width):
@@ -231,6 +333,32 @@ class TestSingleGrid(unittest.TestCase):
                 self.grid.place_agent(a, (x, y))
         self.num_agents = len(self.agents)
 
+    def test_direct_cell_writes(self):
+        """
+        Test that writing to grid[x][y] keeps the empty cells in sync.
+        """
+        a = MockAgent(100, None)
+        self.grid.grid[0][0] = a
+        assert not self.grid.is_cell_empty((0, 0))
+        assert (0, 0) not in self.grid.empties
+        assert len(self.grid.empties) == 8
+        self.grid.grid[0][0] = None
+        assert self.grid.is_cell_empty((0, 0))
+        assert (0, 0) in self.grid.empties
+        assert len(self.grid.empties) == 9
+
+    def test_out_of_bounds_placement(self):
+        grid = SingleGrid(3, 5, False, sparse=self.sparse)
+        agent = MockAgent(100, None)
+        with self.assertRaises(Exception):
+            grid.place_agent(agent, (0, 5))
+        with self.assertRaises(Exception):
+            grid.place_agent(agent, (1, -1))
+        assert len(grid.empties) == 15
+        self.grid.place_agent(agent, (1, -1))
+        assert self.grid[1][4] is agent
+        assert len(self.grid.empties) == 8
+
     def test_enforcement(self):
         """
         Test the SingleGrid empty count and enforcement.
@@ -248,10 +376,9 @@ class TestSingleGrid(unittest.TestCase):
         assert a.pos not in self.grid.empties
         assert len(self.grid.empties) == 8
         for i in range(10):
-            # Since the agents and the grid are not associated with a model, we
-            # must explicitly tell move_to_empty the number of agents.
-            self.grid.move_to_empty(a, num_agents=self.num_agents)
+            self.grid.move_to_empty(a)
         assert len(self.grid.empties) == 8
+        self.grid.move_to_empty(a, num_agents=self.num_agents)
 
         # Place agents until the grid is full
         empty_cells = len(self.grid.empties)
@@ -267,6 +394,170 @@ class TestSingleGrid(unittest.TestCase):
         with self.assertRaises(Exception):
             self.move_to_empty(self.agents[0], num_agents=self.num_agents)
 
+    def test_occupancy(self):
+        """
+        Test that the occupancy array follows placements and removals.
+        """
+        empty_mask = self.grid.get_empty_mask()
+        for x in range(self.grid.width):
+            for y in range(self.grid.height):
+                assert empty_mask[x, y] == (TEST_GRID[x][y] == 0)
+                assert self.grid.is_cell_empty((x, y)) == (TEST_GRID[x][y] == 0)
+                assert ((x, y) in self.grid.empties) == (TEST_GRID[x][y] == 0)
+        assert list(self.grid.empties) == sorted(self.grid.empties)
+
+        cells = [(0, 0), (0, 1), (4, 6)]
+        assert list(self.grid.is_cell_empty_batch(cells)) == [True, False, True]
+
+        agent = self.agents[0]
+        pos = agent.pos
+        self.grid.remove_agent(agent)
+        assert self.grid.is_cell_empty(pos)
+        assert pos in self.grid.empties
+        assert len(self.grid.empties) == 10
+        self.grid.place_agent(agent, pos)
+        assert not self.grid.is_cell_empty(pos)
+        assert len(self.grid.empties) == 9
+        assert self.grid.exists_empty_cells()
+
+    def test_occupied_cells(self):
+        """
+        Test iterating over the occupied cells and exporting agent positions.
+        """
+        occupied = [(c, x, y) for c, x, y in self.grid.coord_iter() if c]
+        assert list(self.grid.iter_occupied()) == occupied
+        assert self.grid.get_occupied_ids().tolist() == [
+            x * 5 + y for _, x, y in occupied
+        ]
+        ids, positions = self.grid.agent_positions()
+        assert ids.tolist() == [c.unique_id for c, _, _ in occupied]
+        assert positions.tolist() == [[x, y] for _, x, y in occupied]
+
+        self.grid.remove_agent(self.agents[0])
+        self.grid.move_agent(self.agents[1], (0, 0))
+        ids, positions = self.grid.agent_positions()
+        assert ids[0] == self.agents[1].unique_id
+        assert positions[0].tolist() == [0, 0]
+        assert len(ids) == self.num_agents - 1
+
+    def test_place_and_move_agents(self):
+        """
+        Test placing and moving many agents at once.
+        """
+        agents = [MockAgent(100 + i, None) for i in range(3)]
+        with self.assertRaises(Exception):
+            self.grid.place_agents(agents, [(0, 0), (0, 1), (0, 2)])
+        with self.assertRaises(Exception):
+            self.grid.place_agents(agents, [(0, 0), (0, 0), (0, 2)])
+        assert len(self.grid.empties) == 9
+
+        self.grid.place_agents(agents, np.array([(0, 0), (0, 2), (1, 0)]))
+        for agent in agents:
+            assert self.grid[agent.pos[0]][agent.pos[1]] is agent
+        assert len(self.grid.empties) == 6
+
+        # Agents can move into cells vacated in the same batch
+        movers = [agents[0], agents[1], self.agents[0]]
+        old_positions = [agent.pos for agent in movers]
+        self.grid.move_agents(movers, [old_positions[1], (2, 2), (2, 3)])
+        assert movers[0].pos == old_positions[1] and movers[2].pos == (2, 3)
+        assert self.grid.is_cell_empty(old_positions[0])
+        assert self.grid.is_cell_empty(old_positions[2])
+        with self.assertRaises(Exception):
+            self.grid.move_agents(movers[:2], [(1, 1), (1, 1)])
+        self.assert_empties_consistent()
+
+    def test_resolve_moves(self):
+        """
+        Test resolving conflicting move requests.
+        """
+        grid = SingleGrid(5, 1, torus=False)
+        agents = [MockAgent(i, None) for i in range(4)]
+        grid.place_agents(agents, [(0, 0), (1, 0), (2, 0), (4, 0)])
+
+        # The higher priority wins the free cell; the chain behind it is
+        # blocked since agent 2 cannot leave its cell
+        moved = grid.resolve_moves(
+            agents,
+            [(1, 0), (2, 0), (3, 0), (3, 0)],
+            priority=[0, 0, 0, 1],
+        )
+        assert list(moved) == [False, False, False, True]
+        assert [a.pos for a in agents] == [(0, 0), (1, 0), (2, 0), (3, 0)]
+
+        # Moving into cells vacated in the same pass, and swapping cells
+        moved = grid.resolve_moves(agents, [(1, 0), (2, 0), (4, 0), (3, 0)])
+        assert list(moved) == [True, True, True, False]
+        assert [a.pos for a in agents] == [(1, 0), (2, 0), (4, 0), (3, 0)]
+        moved = grid.resolve_moves(agents[2:], [(3, 0), (4, 0)])
+        assert [a.pos for a in agents[2:]] == [(3, 0), (4, 0)]
+
+        # Agents outside the batch and staying agents block moves
+        moved = grid.resolve_moves(agents[:1], [(2, 0)])
+        assert not moved.any()
+        moved = grid.resolve_moves(agents[:2], [(2, 0), (2, 0)])
+        assert not moved.any()
+
+        # Ties are broken at random, reproducibly
+        winners = set()
+        for seed in range(20):
+            grid = SingleGrid(3, 1, torus=False)
+            agents = [MockAgent(i, None) for i in range(2)]
+            grid.place_agents(agents, [(0, 0), (2, 0)])
+            moved = grid.resolve_moves(agents, [(1, 0)] * 2, rng=random.Random(seed))
+            assert moved.sum() == 1
+            winners.add(int(np.argmax(moved)))
+            grid = SingleGrid(3, 1, torus=False)
+            grid.place_agents(agents, [(0, 0), (2, 0)])
+            again = grid.resolve_moves(agents, [(1, 0)] * 2, rng=random.Random(seed))
+            assert list(again) == list(moved)
+        assert winners == {0, 1}
+
+    def assert_empties_consistent(self):
+        empties = [
+            (x, y)
+            for x in range(self.grid.width)
+            for y in range(self.grid.height)
+            if self.grid[x][y] is None
+        ]
+        assert list(self.grid.empties) == empties
+        assert len(self.grid.empties) == len(empties)
+        assert all(self.grid.empties.sample(random) in empties for _ in range(20))
+
+    def test_empty_cell_sampling(self):
+        """
+        Test that empty cells are sampled reproducibly and stay consistent.
+        """
+        agent = self.agents[0]
+        agent.random = random.Random(42)
+        positions = []
+        for _ in range(50):
+            self.grid.move_to_empty(agent)
+            positions.append(agent.pos)
+            assert self.grid[agent.pos[0]][agent.pos[1]] is agent
+            assert set(self.grid.empties) == {
+                (x, y)
+                for x in range(self.grid.width)
+                for y in range(self.grid.height)
+                if self.grid.is_cell_empty((x, y))
+            }
+        assert len(set(positions)) > 1
+
+        rng = random.Random(1)
+        samples = [self.grid.empties.sample(rng) for _ in range(20)]
+        rng = random.Random(1)
+        assert samples == [self.grid.empties.sample(rng) for _ in range(20)]
+        assert all(pos in self.grid.empties for pos in samples)
+
+        # choice draws like rng.choice(sorted(empties)), as earlier versions
+        rng, reference = random.Random(3), random.Random(3)
+        for _ in range(10):
+            expected = reference.choice(sorted(self.grid.empties))
+            assert self.grid.empties.choice(rng) == expected
+        if not self.sparse:
+            assert self.grid.empties._cells.dtype == np.int32
+            assert self.grid.empties.ids().dtype == np.int64
+
 
 # Number of agents at each position for testing
 # Initial agent positions for testing
@@ -281,12 +572,21 @@ class TestSingleGrid(unittest.TestCase):
 TEST_MULTIGRID = [[0, 1, 0, 2, 0], [0, 1, 5, 0, 0], [0, 0, 0, 3, 0]]
 
 
+class TestSingleGridSparse(TestSingleGrid):
+    """
+    Test a sparse SingleGrid.
+    """
+
+    sparse = True
+
+
 class TestMultiGrid(unittest.TestCase):
     """
     Testing a toroidal MultiGrid
     """
 
     torus = True
+    sparse = False
 
     def setUp(self):
         """
@@ -294,7 +594,7 @@ class TestMultiGrid(unittest.TestCase):
         """
         width = 3
         height = 5
-        self.grid = MultiGrid(width, height, self.torus)
+        self.grid = MultiGrid(width, height, self.torus, sparse=self.sparse)
         self.agents = []
         counter = 0
         for x in range(width):
@@ -314,6 +614,109 @@ class TestMultiGrid(unittest.TestCase):
             x, y = agent.pos
             assert agent in self.grid[x][y]
 
+    def test_occupancy(self):
+        """
+        Test that the occupancy counts follow placements and removals.
+        """
+        for x in range(self.grid.width):
+            for y in range(self.grid.height):
+                assert self.grid._occupancy_array()[x, y] == TEST_MULTIGRID[x][y]
+                assert self.grid.is_cell_empty((x, y)) == (TEST_MULTIGRID[x][y] == 0)
+        assert len(self.grid.empties) == 10
+
+        agents = self.grid.get_cell_list_contents((1, 2))
+        for agent in agents[:-1]:
+            self.grid.remove_agent(agent)
+            assert not self.grid.is_cell_empty((1, 2))
+        self.grid.remove_agent(agents[-1])
+        assert self.grid.is_cell_empty((1, 2))
+        assert (1, 2) in self.grid.empties
+        assert len(self.grid.empties) == 11
+
+    def test_direct_cell_writes(self):
+        """
+        Test that writing to grid[x][y] keeps the occupancy in sync.
+        """
+        agents = [MockAgent(100 + i, None) for i in range(3)]
+        self.grid.grid[0][0] = agents
+        assert self.grid._occupancy_array()[0, 0] == 3
+        assert (0, 0) not in self.grid.empties
+        self.grid.place_agent(MockAgent(103, None), (0, 0))
+        assert len(self.grid[0][0]) == 4
+        self.grid.grid[0][0] = []
+        assert self.grid.is_cell_empty((0, 0))
+        assert (0, 0) in self.grid.empties
+
+    def test_out_of_bounds_placement(self):
+        grid = MultiGrid(4, 5, False, sparse=self.sparse)
+        agent = MockAgent(100, None)
+        with self.assertRaises(Exception):
+            grid.place_agent(agent, (0, 5))
+        assert agent.pos is None
+        assert grid.is_cell_empty((1, 0))
+        with self.assertRaises(Exception):
+            grid.is_cell_empty((2, 7))
+        self.grid.place_agent(agent, (1, -1))
+        assert agent in self.grid[1][4]
+        self.grid.remove_agent(agent)
+        assert agent not in self.grid[1][4]
+
+    def test_place_and_move_agents(self):
+        """
+        Test placing and moving many agents at once.
+        """
+        agents = [MockAgent(100 + i, None) for i in range(4)]
+        self.grid.place_agents(agents, [(0, 0), (0, 0), (1, 2), (0, 2)])
+        assert self.grid[0][0] == agents[:2]
+        assert self.grid._occupancy_array()[0, 0] == 2
+        assert self.grid._occupancy_array()[1, 2] == TEST_MULTIGRID[1][2] + 1
+        assert len(self.grid.empties) == 8
+
+        self.grid.move_agents(agents, [(0, 1), (0, 1), (0, 1), (0, 2)])
+        assert self.grid.is_cell_empty((0, 0))
+        assert self.grid._occupancy_array()[0, 1] == TEST_MULTIGRID[0][1] + 3
+        assert self.grid._occupancy_array()[1, 2] == TEST_MULTIGRID[1][2]
+        assert list(self.grid.empties) == [
+            (x, y)
+            for x in range(self.grid.width)
+            for y in range(self.grid.height)
+            if not self.grid[x][y]
+        ]
+
+    def test_occupied_cells(self):
+        """
+        Test iterating over the occupied cells and exporting agent positions.
+        """
+        occupied = [(c, x, y) for c, x, y in self.grid.coord_iter() if c]
+        assert list(self.grid.iter_occupied()) == occupied
+        ids, positions = self.grid.agent_positions()
+        assert ids.tolist() == [a.unique_id for c, _, _ in occupied for a in c]
+        assert positions.tolist() == [
+            [x, y] for c, x, y in occupied for _ in range(len(c))
+        ]
+
+    def test_cell_order(self):
+        """
+        Test that cells keep their agents in placement order.
+        """
+        agents = [MockAgent(100 + i, None) for i in range(5)]
+        for agent in agents:
+            self.grid.place_agent(agent, (0, 0))
+        self.grid.place_agent(agents[1], (0, 0))
+        cell = self.grid[0][0]
+        assert cell == agents and len(cell) == 5
+        assert cell[0] is agents[0] and cell[-1] is agents[-1]
+        assert cell[1:3] == agents[1:3]
+        assert agents[2] in cell
+
+        self.grid.remove_agent(agents[2])
+        assert agents[2] not in cell
+        assert list(reversed(cell)) == [agents[i] for i in [4, 3, 1, 0]]
+        self.grid.place_agent(agents[2], (0, 0))
+        assert self.grid[0][0] == [agents[i] for i in [0, 1, 3, 4, 2]]
+        with self.assertRaises(ValueError):
+            self.grid[0][0].remove(MockAgent(200, None))
+
     def test_neighbors(self):
         """
         Test the toroidal MultiGrid neighborhood methods.
@@ -341,6 +744,165 @@ class TestMultiGrid(unittest.TestCase):
         assert len(neighbors) == 11
 
 
+class TestMultiGridSparse(TestMultiGrid):
+    """
+    Testing a sparse toroidal MultiGrid
+    """
+
+    sparse = True
+
+
+class TestSparseGrid(unittest.TestCase):
+    """
+    Testing sparse grids against dense ones.
+    """
+
+    def test_huge_grid(self):
+        """
+        Test that a huge sparse grid only stores its occupied cells.
+        """
+        for grid_class in [SingleGrid, MultiGrid]:
+            grid = grid_class(100_000, 100_000, torus=False, sparse=True)
+            agents = [MockAgent(i, None) for i in range(10)]
+            for agent in agents:
+                grid.place_agent(agent, (0, 0))
+                grid.move_to_empty(agent)
+            assert len(grid._cells) == len(set(a.pos for a in agents))
+            assert len(grid.empties) == 100_000**2 - len(grid._cells)
+            grid.move_agent(agents[0], (99_999, 99_999))
+            assert grid.get_neighbors((99_998, 99_998), True) == [agents[0]]
+            for agent in agents:
+                grid.remove_agent(agent)
+            assert len(grid._cells) == 0
+            assert grid.is_cell_empty((99_999, 99_999))
+
+    def test_same_as_dense(self):
+        """
+        Test that sparse grids behave like dense ones.
+        """
+        for grid_class in [SingleGrid, MultiGrid]:
+            dense = grid_class(6, 5, torus=True)
+            sparse = grid_class(6, 5, torus=True, sparse=True)
+            for grid in [dense, sparse]:
+                agents = [MockAgent(i, None) for i in range(12)]
+                grid.place_agents(agents[:6], [(i, i % 5) for i in range(6)])
+                for i, agent in enumerate(agents[6:]):
+                    grid.place_agent(agent, (i, (i + 2) % 5))
+                for agent in agents[::2]:
+                    x, y = agent.pos
+                    if grid.is_cell_empty((x + 1, y)):
+                        grid.move_agent(agent, (x + 1, y))
+                grid.remove_agent(agents[1])
+            assert [a.pos for a in dense.get_neighbors((2, 2), True, radius=2)] == [
+                a.pos for a in sparse.get_neighbors((2, 2), True, radius=2)
+            ]
+            assert list(dense.empties) == list(sparse.empties)
+            assert (dense.get_empty_mask() == sparse.get_empty_mask()).all()
+            assert (dense.get_neighbor_counts() == sparse.get_neighbor_counts()).all()
+            assert [dense.is_cell_empty((x, y)) for _, x, y in dense.coord_iter()] == [
+                sparse.is_cell_empty((x, y)) for _, x, y in sparse.coord_iter()
+            ]
+            assert [bool(content) for content in dense] == [
+                bool(content) for content in sparse
+            ]
+
+
+class MockPatch(MockAgent):
+    pass
+
+
+class MockAnt(MockAgent):
+    pass
+
+
+class MockSoldierAnt(MockAnt):
+    pass
+
+
+class TestLayeredGrid(unittest.TestCase):
+    """
+    Testing the layered grid.
+    """
+
+    def setUp(self):
+        self.grid = LayeredGrid(
+            3, 5, torus=False, layers={MockPatch: SingleGrid, MockAnt: MultiGrid}
+        )
+        self.patches = []
+        for _, x, y in self.grid.coord_iter():
+            patch = MockPatch(len(self.patches), None)
+            self.grid.place_agent(patch, (x, y))
+            self.patches.append(patch)
+        self.ants = [MockAnt(100, None), MockSoldierAnt(101, None)]
+        self.grid.place_agent(self.ants[0], (1, 1))
+        self.grid.place_agent(self.ants[1], (1, 1))
+
+    def test_layers(self):
+        """
+        Test that agents go on the layer of their class.
+        """
+        patch_layer = self.grid.layers[MockPatch]
+        ant_layer = self.grid.layers[MockAnt]
+        assert isinstance(patch_layer, SingleGrid)
+        assert ant_layer[1][1] == self.ants
+        assert patch_layer[1, 1] is self.patches[6]
+        assert self.grid.get_layer(MockSoldierAnt) is ant_layer
+        with self.assertRaises(ValueError):
+            self.grid.place_agent(MockAgent(200, None), (0, 0))
+
+    def test_emptiness(self):
+        """
+        Test emptiness on one layer and on all of them.
+        """
+        assert not self.grid.is_cell_empty((1, 1), MockAnt)
+        assert self.grid.is_cell_empty((0, 0), MockAnt)
+        assert not self.grid.is_cell_empty((0, 0))
+        assert self.grid.get_empty_mask(MockAnt).sum() == 14
+        assert not self.grid.get_empty_mask().any()
+
+        self.grid.move_agent(self.ants[0], (2, 4))
+        self.grid.remove_agent(self.ants[1])
+        assert self.grid.is_cell_empty((1, 1), MockAnt)
+        assert self.ants[1].pos is None
+        self.grid.move_to_empty(self.ants[0])
+        assert self.ants[0].pos != (2, 4)
+
+    def test_contents(self):
+        """
+        Test cell contents and neighbors, across layers or on one.
+        """
+        assert self.grid.get_cell_list_contents((1, 1)) == [self.patches[6]] + self.ants
+        assert self.grid.get_cell_list_contents((1, 1), MockAnt) == self.ants
+        neighbors = self.grid.get_neighbors((1, 2), True, layer=MockAnt)
+        assert neighbors == self.ants
+        neighbors = self.grid.get_neighbors((0, 0), True)
+        assert neighbors == [self.patches[1], self.patches[5], self.patches[6]] + (
+            self.ants
+        )
+        assert self.grid.get_neighborhood((0, 0), False) == [(0, 1), (1, 0)]
+        assert self.grid.out_of_bounds((3, 0))
+
+    def test_occupied_cells(self):
+        """
+        Test the occupied cells and agent positions across layers.
+        """
+        ids, positions = self.grid.agent_positions(MockAnt)
+        assert ids.tolist() == [100, 101]
+        assert positions.tolist() == [[1, 1], [1, 1]]
+        assert len(self.grid.agent_positions()[0]) == 17
+        assert len(list(self.grid.iter_occupied())) == 15
+
+    def test_window_counts(self):
+        """
+        Test counting the agents of a layer in windows of cells.
+        """
+        assert self.grid.count_agents_in_rect(0, 0, 1, 1, MockAnt) == 2
+        assert self.grid.count_agents_in_rect(0, 0, 1, 1, MockSoldierAnt) == 1
+        assert self.grid.count_agents_in_rect(0, 0, 1, 1) == 6
+        counts = self.grid.count_agents_in_rects([0, 2], [0, 0], [2, 2], [4, 4])
+        assert counts.tolist() == [17, 5]
+
+
 class TestHexGrid(unittest.TestCase):
     """
     Testing a hexagonal grid.
@@ -391,6 +953,61 @@ class TestHexGrid(unittest.TestCase):
         neighborhood = self.grid.get_neighborhood((1, 1), include_center=True)
         assert len(neighborhood) == 7
 
+    def test_neighborhood_radius(self):
+        """
+        Test larger hexagonal neighborhoods against their recursive definition.
+        """
+        for torus in [False, True]:
+            grid = HexGrid(9, 8, torus)
+            for x, y in itertools.product(range(9), range(8)):
+                previous = grid.get_neighborhood((x, y), include_center=True)
+                for radius in range(2, 5):
+                    neighborhood = grid.get_neighborhood(
+                        (x, y), include_center=True, radius=radius
+                    )
+                    assert neighborhood == sorted(neighborhood)
+                    expected = set()
+                    for pos in previous:
+                        expected.update(grid.get_neighborhood(pos, True))
+                    assert set(neighborhood) == expected
+                    previous = neighborhood
+                    without_center = grid.get_neighborhood((x, y), radius=radius)
+                    assert without_center == [
+                        pos for pos in neighborhood if pos != (x, y)
+                    ]
+
+        # Interior cells get full hexagons
+        grid = HexGrid(20, 20, torus=False)
+        for pos in [(9, 9), (10, 9)]:
+            for radius in range(1, 6):
+                neighborhood = grid.get_neighborhood(pos, radius=radius)
+                assert len(neighborhood) == 3 * radius * (radius + 1)
+        assert grid.get_neighborhood((9, 9), radius=5) is grid.get_neighborhood(
+            (9, 9), radius=5
+        )
+
+    def test_neighbor_aggregates(self):
+        """
+        Test the hexagonal neighbor counts and sums against get_neighbors.
+        """
+        rng = random.Random(0)
+        for torus, (width, height) in itertools.product(
+            [False, True], [(6, 7), (5, 4), (2, 2)]
+        ):
+            grid = HexGrid(width, height, torus)
+            for i in range(20):
+                pos = (rng.randrange(width), rng.randrange(height))
+                if grid.is_cell_empty(pos):
+                    grid.place_agent(MockAgent(i, None), pos)
+
+            for include_center, radius in itertools.product([True, False], [1, 2, 3]):
+                counts = grid.get_neighbor_counts(None, include_center, radius)
+                sums = grid.get_neighbor_sums("unique_id", include_center, radius)
+                for x, y in itertools.product(range(width), range(height)):
+                    neighbors = grid.get_neighbors((x, y), include_center, radius)
+                    assert counts[x, y] == len(neighbors)
+                    assert sums[x, y] == sum(a.unique_id for a in neighbors)
+
 
 class TestHexGridTorus(TestBaseGrid):
     """
@@ -436,6 +1053,310 @@ class TestHexGridTorus(TestBaseGrid):
         assert len(neighborhood) == 6
 
 
+class TestPropertyLayer(unittest.TestCase):
+    """
+    Testing property layers attached to a grid.
+    """
+
+    def setUp(self):
+        self.grid = MultiGrid(4, 3, torus=False)
+        self.layer = PropertyLayer("sugar", 4, 3, default_value=1)
+        self.grid.add_property_layer(self.layer)
+
+    def test_attach(self):
+        assert self.grid.properties["sugar"] is self.layer
+        with self.assertRaises(ValueError):
+            self.grid.add_property_layer(PropertyLayer("sugar", 4, 3))
+        with self.assertRaises(ValueError):
+            self.grid.add_property_layer(PropertyLayer("spice", 3, 4))
+        self.grid.remove_property_layer("sugar")
+        assert "sugar" not in self.grid.properties
+
+    def test_cells(self):
+        self.layer.set_cell((2, 1), 5)
+        assert self.layer.get_cell((2, 1)) == 5
+        self.layer.set_cells(0, condition=lambda data: data > 2)
+        assert self.layer.aggregate() == 11
+        max_sugar = np.arange(12).reshape(4, 3)
+        self.layer.modify_cells(np.add, 2)
+        self.layer.clamp(upper=max_sugar)
+        expected = np.minimum(max_sugar, 3)
+        expected[2, 1] = 2
+        assert (self.layer.data == expected).all()
+        assert self.layer.select_cells(lambda data: data == 0) == [(0, 0)]
+
+    def test_diffuse(self):
+        self.layer.set_cells(0)
+        self.layer.set_cell((0, 0), 8)
+        self.layer.diffuse(0.5)
+        # Three neighbors each get 1/8 of half the value, the rest stays
+        assert self.layer.get_cell((0, 0)) == 6.5
+        assert self.layer.get_cell((1, 1)) == 0.5
+        assert self.layer.get_cell((2, 2)) == 0
+        assert self.layer.aggregate() == 8
+
+        self.layer.set_cells(0)
+        self.layer.set_cell((0, 0), 8)
+        self.layer.diffuse(0.5, moore=False, torus=True)
+        assert self.layer.get_cell((0, 0)) == 4
+        assert self.layer.get_cell((3, 0)) == 1
+        assert self.layer.get_cell((0, 2)) == 1
+        assert self.layer.aggregate() == 8
+
+        # Layers on a toroidal grid diffuse across its edges by default
+        grid = MultiGrid(4, 3, torus=True)
+        layer = PropertyLayer("heat", 4, 3, default_value=0)
+        grid.add_property_layer(layer)
+        layer.set_cell((0, 0), 8)
+        layer.diffuse(0.5, moore=False)
+        assert layer.get_cell((3, 0)) == 1
+        assert layer.get_cell((0, 0)) == 4
+
+    def test_neighborhood_helpers(self):
+        self.layer.set_cell((1, 0), 3)
+        self.layer.set_cell((2, 2), 3)
+        mask = self.grid.get_neighborhood_mask((1, 1), moore=True)
+        assert mask.sum() == 8 and not mask[1, 1] and not mask[3, 0]
+        best = self.grid.get_neighborhood_argmax((1, 1), "sugar", moore=True)
+        assert best == [(1, 0), (2, 2)]
+
+        a = MockAgent(1, None)
+        self.grid.place_agent(a, (1, 0))
+        best = self.grid.get_neighborhood_argmax(
+            (1, 1), "sugar", moore=True, only_empty=True
+        )
+        assert best == [(2, 2)]
+
+    def test_hex_neighborhood_helpers(self):
+        grid = HexGrid(4, 3, torus=False)
+        layer = PropertyLayer("sugar", 4, 3, default_value=1)
+        grid.add_property_layer(layer)
+        layer.set_cell((2, 0), 3)
+        layer.set_cell((0, 2), 3)
+        mask = grid.get_neighborhood_mask((1, 1))
+        assert mask.sum() == 6 and not mask[0, 2]
+        assert grid.get_neighborhood_argmax((1, 1), "sugar") == [(2, 0)]
+
+        grid.place_agent(MockAgent(1, None), (2, 0))
+        best = grid.get_neighborhood_argmax((1, 1), "sugar", only_empty=True)
+        assert best == [(0, 0), (0, 1), (1, 0), (1, 2), (2, 1)]
+
+
+LIFE = [[0, 0, 0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 1, 0, 0, 0, 0, 0]]
+
+
+class TestSummedAreaTable(unittest.TestCase):
+    """
+    Testing summed-area tables and window counts.
+    """
+
+    def test_window_sums(self):
+        """
+        Test window sums against direct sums, on and off a torus.
+        """
+        values = np.arange(35).reshape(7, 5)
+        rng = random.Random(0)
+        for torus in [False, True]:
+            table = SummedAreaTable(values, torus)
+            for _ in range(200):
+                x_min, y_min = rng.randrange(-8, 8), rng.randrange(-6, 6)
+                x_max = x_min + rng.randrange(-1, 10)
+                y_max = y_min + rng.randrange(-1, 8)
+                xs = range(x_min, x_max + 1)
+                ys = range(y_min, y_max + 1)
+                if torus:
+                    cells = {(x % 7, y % 5) for x in xs for y in ys}
+                else:
+                    cells = {
+                        (x, y) for x in xs for y in ys if 0 <= x < 7 and 0 <= y < 5
+                    }
+                expected = sum(values[cell] for cell in cells)
+                assert table.window_sum(x_min, y_min, x_max, y_max) == expected
+            sums = table.square_sums([(0, 0), (3, 2)], 1)
+            assert sums[1] == values[2:5, 1:4].sum()
+
+    def test_grid_counts(self):
+        """
+        Test the cached agent count tables of a grid.
+        """
+        grid = MultiGrid(6, 5, torus=True)
+        agents = [MockAgent(i, None) for i in range(10)]
+        for i, agent in enumerate(agents):
+            grid.place_agent(agent, (i % 6, i % 5))
+        table = grid.get_summed_area_table()
+        assert grid.get_summed_area_table() is table
+        assert grid.count_agents_in_rect(0, 0, 5, 4) == 10
+        assert grid.count_agents_in_rect(5, 4, 6, 5) == 2
+        assert grid.count_agents_in_rect(0, 0, 0, 0, MockAgent) == 1
+
+        grid.move_agent(agents[0], (1, 1))
+        assert grid.get_summed_area_table() is not table
+        assert grid.count_agents_in_rect(0, 0, 0, 0) == 0
+        counts = grid.count_agents_in_rects([0, 1], [0, 1], [0, 1], [0, 1])
+        assert counts.tolist() == [0, 2]
+        sums = grid.get_summed_area_table("unique_id")
+        assert sums.window_sum(1, 1, 1, 1) == agents[1].unique_id
+
+
+class TestDistanceMaps(unittest.TestCase):
+    """
+    Testing distance maps and next steps towards targets.
+    """
+
+    def setUp(self):
+        # A wall along x == 2, with a gap at y == 4
+        self.grid = Grid(5, 5, torus=False)
+        walls = PropertyLayer("walls", 5, 5, 0, dtype=bool)
+        walls.data[2, :4] = True
+        self.grid.add_property_layer(walls)
+        self.grid.add_property_layer(PropertyLayer("cost", 5, 5, 1.0))
+
+    def test_steps(self):
+        """
+        Test step counts, around obstacles and on hexagonal grids.
+        """
+        distances = self.grid.get_distance_map([(0, 0)], moore=False)
+        assert distances[4, 0] == 4
+        assert distances[0, 4] == 4
+        distances = self.grid.get_distance_map([(0, 0)], moore=True)
+        assert distances[4, 4] == 4
+        distances = self.grid.get_distance_map([(0, 0)], False, obstacles="walls")
+        assert distances[4, 0] == 12
+        assert np.isinf(distances[2, 0])
+
+        grid = HexGrid(5, 5, torus=False)
+        distances = grid.get_distance_map([(2, 2)])
+        neighborhood = grid.get_neighborhood((2, 2))
+        for x, y in itertools.product(range(5), range(5)):
+            if (x, y) == (2, 2):
+                assert distances[x, y] == 0
+            elif (x, y) in neighborhood:
+                assert distances[x, y] == 1
+            else:
+                assert distances[x, y] >= 2
+
+    def test_costs(self):
+        """
+        Test that costly cells are avoided when cheaper paths exist.
+        """
+        cost = self.grid.properties["cost"]
+        cost.set_cell((1, 0), 10)
+        distances = self.grid.get_distance_map([(0, 0)], False, cost="cost")
+        assert distances[1, 0] == 1
+        assert distances[2, 0] == 4
+        distances = self.grid.get_distance_map([(2, 0)], False, cost="cost")
+        assert distances[0, 0] == 4
+
+        # A step costs the value of the cell it enters
+        line = Grid(1, 3, torus=False)
+        line.add_property_layer(PropertyLayer("cost", 1, 3, 1.0))
+        line.properties["cost"].data[0] = [1, 5, 2]
+        distances = line.get_distance_map([(0, 0)], cost="cost")
+        assert list(distances[0]) == [0, 1, 6]
+        line.properties["cost"].data[0] = [1, 1, 100]
+        line.properties["cost"].mark_modified()
+        distances = line.get_distance_map([(0, 0)], cost="cost")
+        assert list(distances[0]) == [0, 1, 2]
+        assert list(line.get_distance_map([(0, 2)], cost="cost")[0]) == [101, 100, 0]
+        cost.set_cell((1, 0), 0)
+        with self.assertRaises(ValueError):
+            self.grid.get_distance_map([(0, 0)], False, cost="cost")
+
+    def test_cache(self):
+        """
+        Test that maps are cached until their layers change.
+        """
+        distances = self.grid.get_distance_map([(0, 0)], False, obstacles="walls")
+        assert self.grid.get_distance_map([(0, 0)], False, "walls") is distances
+        assert not distances.flags.writeable
+
+        walls = self.grid.properties["walls"]
+        walls.data[2, 0] = False
+        assert self.grid.get_distance_map([(0, 0)], False, "walls") is distances
+        walls.mark_modified()
+        distances = self.grid.get_distance_map([(0, 0)], False, "walls")
+        assert distances[4, 0] == 4
+
+    def test_next_step(self):
+        """
+        Test following the distance map to a target.
+        """
+        pos = (4, 0)
+        path = [pos]
+        while pos != (0, 0):
+            pos = self.grid.get_next_step(pos, [(0, 0)], False, obstacles="walls")
+            path.append(pos)
+        assert len(path) == 13
+        assert (2, 4) in path
+        assert self.grid.get_next_step((0, 0), [(0, 0)]) == (0, 0)
+        assert Grid(1, 1, False).get_next_step((0, 0), [(0, 0)]) == (0, 0)
+
+
+class TestCellularAutomaton(unittest.TestCase):
+    """
+    Testing the cellular automaton.
+    """
+
+    def test_lookup_table(self):
+        """
+        Test a blinker, which oscillates with period 2, in Game of Life.
+        """
+        for torus in [False, True]:
+            automaton = CellularAutomaton(5, 5, torus, rule=LIFE)
+            automaton.state[2, 1:4] = 1
+            initial = automaton.state.copy()
+            automaton.step()
+            assert automaton.state[1:4, 2].all()
+            assert automaton.count_state(1) == 3
+            automaton.step()
+            assert (automaton.state == initial).all()
+
+        # Cells on opposite edges are only neighbors on a torus
+        automaton = CellularAutomaton(5, 5, True, rule=LIFE)
+        automaton.state[0, 1:4] = 1
+        automaton.step()
+        assert automaton.state[4, 2] == 1 and automaton.state[1, 2] == 1
+
+        with self.assertRaises(ValueError):
+            CellularAutomaton(5, 5, True, rule=[[0, 1], [1, 0]])
+
+    def test_function_rule(self):
+        """
+        Test a forest fire written as a vectorized rule.
+        """
+        empty, fine, burning, burned = range(4)
+
+        def fire(automaton):
+            state = automaton.state
+            next_state = state.copy()
+            next_state[state == burning] = burned
+            catching = automaton.count_neighbors(burning) > 0
+            next_state[(state == fine) & catching] = burning
+            return next_state
+
+        automaton = CellularAutomaton(
+            4, 1, False, rule=fire, moore=False, initial_state=fine
+        )
+        automaton.state[0, 0] = burning
+        automaton.state[2, 0] = empty
+        automaton.step()
+        assert list(automaton.state[:, 0]) == [burned, burning, empty, fine]
+        automaton.step()
+        assert list(automaton.state[:, 0]) == [burned, burned, empty, fine]
+
+    def test_cell_views(self):
+        automaton = CellularAutomaton(3, 2, False, rule=LIFE)
+        cell = automaton.get_cell_list_contents((1, 1))[0]
+        assert cell.pos == cell.unique_id == (1, 1)
+        cell.state = 1
+        assert automaton.state[1, 1] == 1
+        automaton.step()
+        assert cell.state == 0
+        assert [c.pos for c in automaton.cells] == [
+            (x, y) for x in range(3) for y in range(2)
+        ]
+
+
 class TestIndexing:
     # Create a grid where the content of each coordinate is a tuple of its coordinates
     grid = Grid(3, 5, True)
@@ -461,6 +1382,55 @@ class TestIndexing:
         assert self.grid[1, :] == [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4)]
         assert self.grid[:, :] == [(x, y) for x in range(3) for y in range(5)]
 
+    def test_columns(self):
+        assert self.grid[1][-1] == (1, 4)
+        assert self.grid[2][1:3] == [(2, 1), (2, 2)]
+        assert list(self.grid[0]) == [(0, y) for y in range(5)]
+        assert len(self.grid.grid[0]) == 5
+        with pytest.raises(IndexError):
+            self.grid[0][5]
+
+    def test_cell_ids(self):
+        grid = self.grid
+        assert grid.get_cell_id((2, 3)) == 13
+        assert grid.get_cell_pos(13) == (2, 3)
+        assert list(grid.get_cell_ids([(0, 1), (2, 3), (3, 5)])) == [1, 13, 0]
+        assert grid.get_cell_positions([1, 13]).tolist() == [[0, 1], [2, 3]]
+        assert list(grid) == [grid.get_cell_pos(i) for i in range(15)]
+
+
+class TestCellIds(unittest.TestCase):
+    """
+    Testing the id-based grid methods.
+    """
+
+    def test_neighborhood_ids(self):
+        for grid in [Grid(7, 6, False), Grid(7, 6, True), HexGrid(7, 6, True)]:
+            for x, y in itertools.product(range(7), range(6)):
+                cell_id = grid.get_cell_id((x, y))
+                for radius in [1, 2]:
+                    if isinstance(grid, HexGrid):
+                        ids = grid.get_neighborhood_ids(cell_id, radius=radius)
+                        neighborhood = grid.get_neighborhood((x, y), radius=radius)
+                    else:
+                        ids = grid.get_neighborhood_ids(cell_id, True, radius=radius)
+                        neighborhood = grid.get_neighborhood(
+                            (x, y), True, radius=radius
+                        )
+                    assert [grid.get_cell_pos(i) for i in ids] == neighborhood
+
+    def test_contents_by_id(self):
+        for grid in [SingleGrid(3, 5, False), MultiGrid(3, 5, False)]:
+            agents = [MockAgent(i, None) for i in range(3)]
+            if isinstance(grid, SingleGrid):
+                agents.pop()
+            grid.place_agents(agents, [(0, 1), (2, 2), (2, 2)][: len(agents)])
+            ids = grid.get_cell_ids([(0, 1), (1, 1), (2, 2)])
+            assert grid.get_cell_contents_by_id(ids) == agents
+            assert list(grid.empties.ids()) == [
+                i for i in range(15) if grid.get_cell_pos(i) in grid.empties
+            ]
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 import networkx as nx
@@ -110,6 +111,35 @@ class TestSpaceToroidal(unittest.TestCase):
         pos_2 = (-25, -25)
         self.assertEqual((10, 0), self.space.get_heading(pos_1, pos_2))
 
+        # Points on both sides of the center of the space
+        pos_1 = (19, -5)
+        pos_2 = (21, -5)
+        self.assertEqual((2, 0), self.space.get_heading(pos_1, pos_2))
+
+    def test_batch_calculations(self):
+        """
+        Test the batch versions against the single point calculations.
+        """
+        rng = np.random.default_rng(0)
+        pos_1 = rng.uniform((-30, -30), (70, 20), size=(50, 2))
+        pos_2 = rng.uniform((-30, -30), (70, 20), size=(50, 2))
+        headings = self.space.get_heading_batch(pos_1, pos_2)
+        distances = self.space.get_distance_batch(pos_1, pos_2)
+        for i in range(50):
+            heading = self.space.get_heading(tuple(pos_1[i]), tuple(pos_2[i]))
+            np.testing.assert_allclose(headings[i], heading)
+            assert distances[i] == pytest.approx(
+                self.space.get_distance(pos_1[i], pos_2[i])
+            )
+        np.testing.assert_allclose(
+            self.space.get_distance_batch(pos_1[0], pos_2),
+            [self.space.get_distance(pos_1[0], p) for p in pos_2],
+        )
+
+        adjusted = self.space.torus_adj_batch(OUTSIDE_POSITIONS)
+        for pos, adj_pos in zip(OUTSIDE_POSITIONS, adjusted):
+            np.testing.assert_allclose(adj_pos, self.space.torus_adj(pos))
+
     def test_neighborhood_retrieval(self):
         """
         Test neighborhood retrieval
@@ -193,6 +223,20 @@ class TestSpaceNonToroidal(unittest.TestCase):
         pos_2 = (-25, -25)
         self.assertEqual((-90, 0), self.space.get_heading(pos_1, pos_2))
 
+        np.testing.assert_allclose(
+            self.space.get_heading_batch([(-30, -30), (65, -25)], (70, 20)),
+            [(100, 50), (5, 45)],
+        )
+
+    def test_batch_bounds(self):
+        assert self.space.out_of_bounds_batch(OUTSIDE_POSITIONS).all()
+        assert not self.space.out_of_bounds_batch(TEST_AGENTS).any()
+        np.testing.assert_array_equal(
+            self.space.torus_adj_batch(TEST_AGENTS), TEST_AGENTS
+        )
+        with self.assertRaises(Exception):
+            self.space.torus_adj_batch(OUTSIDE_POSITIONS)
+
     def test_neighborhood_retrieval(self):
         """
         Test neighborhood retrieval
@@ -280,6 +324,306 @@ class TestSpaceAgentMapping(unittest.TestCase):
         with self.assertRaises(Exception):
             self.space.remove_agent(agent_to_remove)
 
+    def test_add_and_remove_many(self):
+        """
+        Test growing the positions buffer and removing agents in between
+        """
+        rng = np.random.default_rng(0)
+        agents = list(self.agents)
+        for i in range(500):
+            a = MockAgent(len(REMOVAL_TEST_AGENTS) + i, None)
+            self.space.place_agent(a, tuple(rng.uniform((-30, -30), (70, 50))))
+            agents.append(a)
+            if i % 3 == 0:
+                self.space.remove_agent(agents.pop(rng.integers(len(agents))))
+        assert len(self.space._agent_points) == len(agents)
+        assert len(self.space._points_buffer) >= len(agents)
+        for i, agent in self.space._index_to_agent.items():
+            assert agent.pos == tuple(self.space._agent_points[i, :])
+            assert i == self.space._agent_to_index[agent]
+        assert set(self.space._agent_to_index) == set(agents)
+        neighbors = self.space.get_neighbors((0, 0), 200)
+        assert set(neighbors) == set(agents)
+
+    def test_place_and_move_agents(self):
+        """
+        Test placing and moving many agents at once
+        """
+        rng = np.random.default_rng(0)
+        agents = [MockAgent(100 + i, None) for i in range(300)]
+        positions = rng.uniform((-30, -30), (40, 20), size=(300, 2))
+        self.space.place_agents(agents, positions)
+        assert len(self.space._agent_points) == len(REMOVAL_TEST_AGENTS) + 300
+        for agent, pos in zip(agents, positions):
+            assert agent.pos == tuple(pos)
+
+        moved = agents[::2] + self.agents[:1]
+        new_positions = rng.uniform((-30, -30), (40, 20), size=(len(moved), 2))
+        self.space.move_agents(moved, new_positions)
+        for agent, pos in zip(moved, new_positions):
+            assert agent.pos == tuple(pos)
+        for i, agent in self.space._index_to_agent.items():
+            assert agent.pos == tuple(self.space._agent_points[i, :])
+            assert i == self.space._agent_to_index[agent]
+
+        with self.assertRaises(Exception):
+            self.space.move_agents(agents[:1], [(100, 0)])
+        with self.assertRaises(ValueError):
+            self.space.place_agents(agents[:2], [(0, 0)])
+
+
+class TestSpaceAgentFields(unittest.TestCase):
+    """
+    Testing agent attributes stored as arrays in a continuous space.
+    """
+
+    def setUp(self):
+        self.space = ContinuousSpace(
+            70, 50, True, -30, -30, agent_fields={"velocity": 2}
+        )
+        self.agents = []
+        for i, pos in enumerate(REMOVAL_TEST_AGENTS):
+            a = MockAgent(i, None)
+            a.velocity = np.array((i, -i), dtype=float)
+            self.agents.append(a)
+            self.space.place_agent(a, pos)
+
+    def assert_views(self):
+        positions = self.space.get_agent_field("pos")
+        velocities = self.space.get_agent_field("velocity")
+        for i, agent in self.space._index_to_agent.items():
+            assert np.shares_memory(agent.pos, positions)
+            assert np.shares_memory(agent.velocity, velocities)
+            np.testing.assert_array_equal(agent.pos, positions[i])
+            np.testing.assert_array_equal(
+                agent.velocity, (agent.unique_id, -agent.unique_id)
+            )
+
+    def test_views(self):
+        self.assert_views()
+        for i, agent in enumerate(self.agents):
+            np.testing.assert_array_equal(agent.pos, REMOVAL_TEST_AGENTS[i])
+
+    def test_vectorized_update(self):
+        velocities = self.space.get_agent_field("velocity")
+        velocities *= 2
+        for agent in self.agents:
+            np.testing.assert_array_equal(
+                agent.velocity, (2 * agent.unique_id, -2 * agent.unique_id)
+            )
+        agent = self.agents[1]
+        agent.velocity += 1
+        assert velocities[self.space._agent_to_index[agent], 0] == 3
+
+    def test_move(self):
+        agent = self.agents[2]
+        pos_view = agent.pos
+        self.space.move_agent(agent, agent.pos + agent.velocity)
+        np.testing.assert_array_equal(pos_view, (67, 16))
+        assert agent.pos is pos_view
+
+    def test_grow_and_remove(self):
+        for i in range(len(self.agents), 300):
+            a = MockAgent(i, None)
+            a.velocity = np.array((i, -i), dtype=float)
+            self.agents.append(a)
+            self.space.place_agent(a, (i % 70 - 30, i % 50 - 30))
+        self.assert_views()
+        removed = self.agents[5]
+        self.space.remove_agent(removed)
+        self.assert_views()
+        assert removed.pos is None
+        np.testing.assert_array_equal(removed.velocity, (5, -5))
+        assert len(self.space.get_agent_field("velocity")) == 299
+
+    def test_place_agents(self):
+        agents = []
+        for i in range(len(self.agents), 300):
+            a = MockAgent(i, None)
+            a.velocity = np.array((i, -i), dtype=float)
+            agents.append(a)
+        self.space.place_agents(
+            agents, [(i % 70 - 30, i % 50 - 30) for i in range(7, 300)]
+        )
+        self.assert_views()
+        self.space.move_agents(agents[:2], [(0, 0), (75, 1)])
+        np.testing.assert_array_equal(agents[1].pos, (-25, 1))
+
+    def test_no_fields(self):
+        space = ContinuousSpace(70, 50, True, -30, -30)
+        with self.assertRaises(Exception):
+            space.get_agent_field("pos")
+
+
+class TestSpaceSpatialIndex(unittest.TestCase):
+    """
+    Testing that the spatial indices return the same neighbors as the
+    brute-force search.
+    """
+
+    spatial_index = "cell_list"
+
+    def setUp(self):
+        if self.spatial_index == "kdtree":
+            pytest.importorskip("scipy")
+        rng = np.random.default_rng(42)
+        self.positions = rng.uniform((-30, -30), (70, 20), size=(300, 2))
+        self.spaces = []
+        for torus in (True, False):
+            for spatial_index in (None, self.spatial_index):
+                space = ContinuousSpace(
+                    70, 20, torus, -30, -30, spatial_index=spatial_index
+                )
+                for i, pos in enumerate(self.positions):
+                    space.place_agent(MockAgent(i, None), tuple(pos))
+                self.spaces.append(space)
+
+    def assert_same_neighbors(self, pos, radius, include_center=True):
+        for reference, indexed in zip(self.spaces[::2], self.spaces[1::2]):
+            expected = reference.get_neighbors(pos, radius, include_center)
+            result = indexed.get_neighbors(pos, radius, include_center)
+            assert [a.unique_id for a in result] == [a.unique_id for a in expected]
+
+    def test_neighborhood_retrieval(self):
+        for pos in [(-30, -30), (0, 0), (69.9, 19.9), (20, -5)]:
+            for radius in (0.5, 5, 12, 60):
+                self.assert_same_neighbors(pos, radius)
+                self.assert_same_neighbors(pos, radius, include_center=False)
+
+    def test_small_first_radius(self):
+        for space in self.spaces:
+            space.get_neighbors((0, 0), 0.001)
+        self.assert_same_neighbors((20, -5), 40)
+        if self.spatial_index == "cell_list":
+            index = self.spaces[1]._index
+            assert index._nx * index._ny < 5 * len(self.positions)
+
+    def test_rect_then_radius(self):
+        for space in self.spaces:
+            space.get_agents_in_rect(-30, -30, 70, 20)
+        self.assert_same_neighbors((20, -5), 1)
+        if self.spatial_index == "cell_list":
+            assert self.spaces[1]._index.cell_size < 3
+
+    def test_move_and_remove(self):
+        rng = np.random.default_rng(0)
+        for space in self.spaces:
+            space.get_neighbors((0, 0), 5)
+        for _ in range(3):
+            new_positions = rng.uniform((-30, -30), (70, 20), size=(300, 2))
+            for space in self.spaces:
+                agents = list(space._agent_to_index)
+                for agent, pos in zip(agents, new_positions):
+                    space.move_agent(agent, tuple(pos))
+                space.remove_agent(agents[0])
+            self.assert_same_neighbors((10, -10), 8)
+            self.assert_same_neighbors((-29, 19), 8)
+
+    def test_move_agents(self):
+        rng = np.random.default_rng(1)
+        for space in self.spaces:
+            space.get_neighbors((0, 0), 5)
+        new_positions = rng.uniform((-30, -30), (70, 20), size=(300, 2))
+        for space in self.spaces:
+            agents = list(space._agent_to_index)
+            space.move_agents(agents, new_positions[: len(agents)])
+        self.assert_same_neighbors((10, -10), 8)
+        self.assert_same_neighbors((-29, 19), 8)
+
+    def test_k_nearest(self):
+        for space in self.spaces:
+            for pos in [(-30, -30), (0, 0), (69.9, 19.9)]:
+                expected = sorted(
+                    space._agent_to_index,
+                    key=lambda a: (space.get_distance(pos, a.pos), a.unique_id),
+                )
+                for k in (1, 7, 40, 500):
+                    nearest = space.get_k_nearest(pos, k)
+                    assert nearest == expected[:k]
+
+            agent = space._index_to_agent[0]
+            nearest = space.get_k_nearest(agent.pos, 3, include_center=False)
+            assert agent not in nearest
+            assert len(nearest) == 3
+
+            queries = [(-30, -30), (0, 0), (69.9, 19.9)]
+            agents, indices, distances = space.get_k_nearest_batch(queries, 5)
+            for pos, row, row_distances in zip(queries, indices, distances):
+                assert [agents[j] for j in row] == space.get_k_nearest(pos, 5)
+                np.testing.assert_allclose(
+                    row_distances,
+                    [space.get_distance(pos, agents[j].pos) for j in row],
+                )
+            _, indices, distances = space.get_k_nearest_batch(queries, 301)
+            assert (indices[:, -1] == -1).all()
+            assert np.isinf(distances[:, -1]).all()
+
+    def test_agents_in_rect(self):
+        rects = [(-30, -30, 70, 20), (0, 0, 10, 5), (60, 10, 80, 30), (-40, -5, -25, 0)]
+        for space in self.spaces:
+            for rect in rects:
+                x_min, y_min, x_max, y_max = rect
+                expected = []
+                for agent in space._index_to_agent.values():
+                    x, y = agent.pos
+                    if space.torus:
+                        inside = (x - x_min) % space.width <= x_max - x_min and (
+                            y - y_min
+                        ) % space.height <= y_max - y_min
+                    else:
+                        inside = x_min <= x <= x_max and y_min <= y <= y_max
+                    if inside:
+                        expected.append(agent)
+                assert set(space.get_agents_in_rect(*rect)) == set(expected)
+
+            agents, offsets, indices = space.get_agents_in_rect_batch(rects)
+            for i, rect in enumerate(rects):
+                found = [agents[j] for j in indices[offsets[i] : offsets[i + 1]]]
+                assert found == space.get_agents_in_rect(*rect)
+
+
+class TestSpaceKDTreeIndex(TestSpaceSpatialIndex):
+    spatial_index = "kdtree"
+
+
+class TestSpaceAllNeighbors(unittest.TestCase):
+    """
+    Testing the batched neighbor query against get_neighbors.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        positions = rng.uniform((-30, -30), (70, 20), size=(200, 2))
+        # Add an agent on top of another one
+        positions[1] = positions[0]
+        self.spaces = []
+        for torus in (True, False):
+            space = ContinuousSpace(70, 20, torus, -30, -30)
+            for i, pos in enumerate(positions):
+                space.place_agent(MockAgent(i, None), tuple(pos))
+            self.spaces.append(space)
+
+    def test_matches_get_neighbors(self):
+        for space in self.spaces:
+            for radius in (0, 3, 11.5, 200):
+                for include_center in (True, False):
+                    agents, offsets, indices, distances = space.get_all_neighbors(
+                        radius, include_center
+                    )
+                    assert len(offsets) == len(agents) + 1
+                    for i, agent in enumerate(agents):
+                        start, stop = offsets[i], offsets[i + 1]
+                        expected = space.get_neighbors(
+                            agent.pos, radius, include_center
+                        )
+                        assert [agents[j] for j in indices[start:stop]] == expected
+                        for j, distance in zip(
+                            indices[start:stop], distances[start:stop]
+                        ):
+                            assert distance == pytest.approx(
+                                space.get_distance(agent.pos, agents[j].pos)
+                            )
+
 
 class TestSingleGrid(unittest.TestCase):
     def setUp(self):
@@ -407,6 +751,87 @@ class TestSingleNetworkGrid(unittest.TestCase):
             self.agents[2],
         ]
 
+    def test_csr(self):
+        indptr, indices = self.space.get_csr()
+        assert indptr.tolist() == list(range(0, 91, 9))
+        assert self.space.get_neighbor_numbers(1).tolist() == [0] + list(range(2, 10))
+        assert not indices.flags.writeable
+
+    def test_graph_edits(self):
+        self.space.add_node("hub")
+        self.space.add_edge("hub", 3)
+        assert self.space.get_neighbors("hub") == [3]
+        assert "hub" in self.space.get_neighbors(3)
+        assert self.space.nodes[-1] == "hub"
+        assert self.space.get_node_number("hub") == 10
+        self.space.remove_edge(3, 4)
+        assert 4 not in self.space.get_neighbors(3)
+        self.space.remove_node("hub")
+        assert "hub" not in self.space.get_neighbors(3)
+        with self.assertRaises(Exception):
+            self.space.remove_node(0)
+
+        self.space.G.add_edge(3, 4)
+        self.space.refresh()
+        assert 4 in self.space.get_neighbors(3)
+
+    def test_incremental_edits(self):
+        rng = random.Random(0)
+        for G in [
+            nx.gnm_random_graph(20, 40, seed=0),
+            nx.gnm_random_graph(20, 60, 1, True),
+        ]:
+            space = NetworkGrid(G)
+            for i in range(200):
+                nodes = space.nodes
+                choice = rng.random()
+                if choice < 0.1:
+                    space.add_node(f"new{i}")
+                elif choice < 0.2:
+                    space.remove_node(rng.choice(nodes))
+                elif choice < 0.6:
+                    space.add_edge(rng.choice(nodes), rng.choice(nodes))
+                elif G.number_of_edges():
+                    space.remove_edge(*rng.choice(list(G.edges)))
+                fresh = NetworkGrid(G, publish_agents=False)
+                assert space.nodes == fresh.nodes
+                for node_id in nodes[:3]:
+                    if node_id in G:
+                        assert space.get_neighbors(node_id) == list(G.adj[node_id])
+            for actual, expected in zip(space.get_csr(), fresh.get_csr()):
+                assert actual.tolist() == expected.tolist()
+
+    def test_direct_edits(self):
+        self.space.G.add_node("direct")
+        assert self.space.get_node_number("direct") == 10
+        self.space.G.add_edge(0, "direct")
+        assert "direct" in self.space.get_neighbors(0)
+        assert self.space.get_csr()[0][-1] == 92
+
+    def test_node_contents(self):
+        contents = self.space.G.nodes[0]["agent"]
+        assert contents == [self.agents[0]]
+        self.space.move_agent(self.agents[1], 0)
+        assert contents == [self.agents[0], self.agents[1]]
+        assert contents[0] is self.agents[0]
+
+        self.space.G.add_node(20)
+        self.space.G.remove_node(9)
+        self.space.refresh()
+        assert self.space.G.nodes[0]["agent"] is contents
+        assert self.space.is_cell_empty(20)
+        self.space.move_agent(self.agents[2], 20)
+        assert self.space.G.nodes[20]["agent"] == [self.agents[2]]
+        assert self.space.get_all_cell_contents() == self.agents[:2] + [self.agents[2]]
+
+    def test_unpublished(self):
+        G = nx.path_graph(3)
+        space = NetworkGrid(G, publish_agents=False)
+        agent = MockAgent(0, None)
+        space.place_agent(agent, 1)
+        assert "agent" not in G.nodes[1]
+        assert space.get_cell_list_contents([0, 1]) == [agent]
+
 
 class TestMultipleNetworkGrid(unittest.TestCase):
     GRAPH_SIZE = 3
@@ -485,5 +910,63 @@ class TestMultipleNetworkGrid(unittest.TestCase):
         ]
 
 
+class TestNetworkPropagation(unittest.TestCase):
+    """
+    Testing the vectorized contagion helpers of NetworkGrid.
+    """
+
+    def setUp(self):
+        self.space = NetworkGrid(nx.path_graph(5))
+
+    def test_count_neighbors(self):
+        mask = np.array([True, False, False, False, True])
+        counts = self.space.count_neighbors(mask)
+        for node in range(5):
+            expected = sum(mask[n] for n in self.space.get_neighbors(node))
+            assert counts[node] == expected
+        assert list(self.space.sum_neighbors(np.arange(5.0))) == [1, 2, 4, 6, 3]
+
+    def test_sum_dtypes(self):
+        space = NetworkGrid(nx.path_graph(4))
+        sums = space.sum_neighbors(np.array([100] * 4, dtype=np.int8))
+        assert sums.dtype == np.int64
+        assert list(sums) == [100, 200, 200, 100]
+        sums = space.sum_neighbors(np.array([1e17, 1, 3, 1]))
+        assert list(sums[2:]) == [2, 3]
+        space.add_node(4)
+        assert list(space.count_neighbors([True] * 5)) == [1, 2, 2, 1, 0]
+
+    def test_directed(self):
+        space = NetworkGrid(nx.DiGraph([(0, 1), (1, 2)]))
+        assert list(space.count_neighbors([True, True, True])) == [1, 1, 0]
+
+    def test_exposure_probability(self):
+        exposure = self.space.get_exposure_probability(
+            [True, False, True, False, False], 0.5
+        )
+        assert np.allclose(exposure, [0, 0.75, 0, 0.5, 0])
+        exposure = self.space.get_exposure_probability(
+            [True, False, True, False, False], [0, 0.1, 0, 1, 0]
+        )
+        assert np.allclose(exposure, [0, 0.19, 0, 1, 0])
+
+    def test_spread(self):
+        states = np.array([1, 0, 2, 0, 0])
+        new_states = self.space.spread(states, 1, 0, 1.0, random.Random(0))
+        assert list(new_states) == [1, 1, 2, 0, 0]
+        assert list(states) == [1, 0, 2, 0, 0]
+        new_states = self.space.spread(states, 1, 0, 0.0, random.Random(0))
+        assert list(new_states) == list(states)
+
+    def test_reproducible(self):
+        space = NetworkGrid(nx.erdos_renyi_graph(200, 0.05, seed=1))
+        states = np.zeros(200, dtype=int)
+        states[:10] = 1
+        first = space.spread(states, 1, 0, 0.3, random.Random(42))
+        second = space.spread(states, 1, 0, 0.3, random.Random(42))
+        assert (first == second).all()
+        assert (first == 1).sum() > 10
+
+
 if __name__ == "__main__":
     unittest.main()
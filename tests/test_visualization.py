@@ -2,10 +2,11 @@ from unittest import TestCase
 from collections import defaultdict
 
 from mesa.model import Model
-from mesa.space import Grid
+from mesa.space import Grid, MultiGrid
 from mesa.time import SimultaneousActivation
 from mesa.visualization.ModularVisualization import ModularServer
 from mesa.visualization.modules import CanvasGrid, TextElement
+from mesa.visualization.TextVisualization import TextGrid
 from mesa.visualization.UserParam import UserSettableParameter
 
 from tests.test_batchrunner import MockAgent
@@ -88,3 +89,19 @@ class TestModularServer(TestCase):
                 "slider", "Test Parameter", 200, 0, 300, 10
             ).json,
         }
+
+
+class TestTextGrid(TestCase):
+    """Test the ASCII grid"""
+
+    def test_render(self):
+        grid = Grid(3, 3, torus=False)
+        grid.place_agent(MockAgent(1, None, 0), (0, 2))
+        grid.place_agent(MockAgent(2, None, 0), (2, 1))
+        assert TextGrid(grid, lambda agent: "X").render() == "  X\n   \n X \n"
+
+        grid = MultiGrid(3, 3, torus=False)
+        grid.place_agent(MockAgent(1, None, 0), (1, 1))
+        grid.place_agent(MockAgent(2, None, 0), (1, 1))
+        text = TextGrid(grid, lambda agents: str(len(agents))).render()
+        assert text == "000\n020\n000\n"